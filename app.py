@@ -1,18 +1,17 @@
-import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
-from src.network_explorer.data_loader import load_similarity_matrix
-from src.network_explorer.network import create_protein_network, get_protein_neighbors
-from src.network_explorer.visualization import visualize_protein_neighborhood
-
-# Import Response Explorer modules
-from src.response_explorer.data_loader import load_response_explorer_data
-from src.response_explorer.analysis import compare_receptor_to_chemicals
-from src.response_explorer.vis_table_match import format_results_table, display_results_table
-from src.response_explorer.vis_linechart import create_line_chart_visualization
-from src.response_explorer.vis_feature_images import display_top_features_images
-from src.response_explorer.vis_clustering import create_clustering_visualization
+
+# Figures are only ever rendered to images; set before anything imports pyplot
+# unless the environment already chose a backend
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import streamlit as st
+
+# Per-stage timing (opt-in, see the Performance panel in the sidebar)
+from src import perf
+
+# View modules and their heavy dependencies (matplotlib, scipy, networkx)
+# are imported inside the branch of the view that uses them, so a
+# session only pays for the views it opens. Later reruns find them in sys.modules.
 
 st.set_page_config(page_title="AROMA", layout="centered")
 
@@ -52,290 +51,522 @@ if st.session_state.get('needs_rerun'):
     # No need to call rerun here as it will naturally rerun
 
 # Use a sidebar radio to control the tab
-tab = st.sidebar.radio("Select view", ["Structural Network Explorer", "Predicted Response Explorer", "Feature Catalog"])
-
-if tab == "Structural Network Explorer":
-    st.title("AROMA")
-    st.markdown("""
-    **AROMA (Analysis of Receptor Organization for Molecular Activity)** is an application intended to provide guidance for deorphanization experimentation planning, ligand predictions, and rational repellent design. 
-    AROMA is based on a Semi-supervised label propagation (diffusion) model of currently deorphanized Dipteran Odorant Receptors.
-  """)
-    st.subheader("Structural Network Explorer")
-    
-    # Create an expander for the explorer description (keep AROMA description unchanged)
-    with st.expander("About Structural Network Explorer", expanded=False):
+tab = st.sidebar.radio("Select view", ["Structural Network Explorer", "Predicted Response Explorer", "Chemical Lookup", "Feature Catalog"], key="view")
+# Wall time of the whole page, recorded even if the page raises or reruns
+with perf.stage(f"app.page.{tab}"):
+    if tab == "Structural Network Explorer":
+        st.title("AROMA")
         st.markdown("""
-        **Structural Network Explorer** allows for the visualization of a protein structure similarity networks by selected OR neighborhood. 
-        The nodes are olfactory receptors and edges are structural similarity scores of Alphafold2 proteins evaluated using Local-Global Alignment (LGA) method.
-        """)
-
-    similarity_path = "data/AllvsAll.csv"
-    if os.path.exists(similarity_path):
-        similarity_df = load_similarity_matrix(similarity_path)
-        G = create_protein_network(similarity_df, 85)
-        proteins = sorted(list(G.nodes()))
-
-        # Sidebar widgets ONLY for this tab
-        receptor_options = [""] + proteins
-        
-        # Get saved receptor from session state
-        selected_receptor = st.sidebar.selectbox(
-            "Select Receptor", 
-            options=receptor_options,
-            index=receptor_options.index(st.session_state.shared_receptor) if st.session_state.shared_receptor in receptor_options else 0,
-            format_func=lambda x: "Select a receptor..." if x == "" else x,
-            key="receptor_select"
+        **AROMA (Analysis of Receptor Organization for Molecular Activity)** is an application intended to provide guidance for deorphanization experimentation planning, ligand predictions, and rational repellent design. 
+        AROMA is based on a Semi-supervised label propagation (diffusion) model of currently deorphanized Dipteran Odorant Receptors.
+      """)
+        st.subheader("Structural Network Explorer")
+    
+        # Create an expander for the explorer description (keep AROMA description unchanged)
+        with st.expander("About Structural Network Explorer", expanded=False):
+            st.markdown("""
+            **Structural Network Explorer** allows for the visualization of a protein structure similarity networks by selected OR neighborhood. 
+            The nodes are olfactory receptors and edges are structural similarity scores of Alphafold2 proteins evaluated using Local-Global Alignment (LGA) method.
+            """)
+
+        import numpy as np
+        import pandas as pd
+        from src.network_explorer.network import (
+            DEFAULT_MAX_NODES, get_neighborhood, get_top_k_neighborhood, neighborhood_summary
         )
-        st.session_state.shared_receptor = selected_receptor
+        from src.network_explorer.interactive import RENDERERS, render_interactive_neighborhood
+        from src.data_cache import cached_edge_index, cached_neighborhood_layout, cached_similarity_matrix
+
+        similarity_path = "data/AllvsAll.csv"
+        if os.path.exists(similarity_path):
+            # min_threshold matches the lowest value of the Similarity Threshold slider
+            edge_index = cached_edge_index(similarity_path, min_threshold=75)
+            proteins = sorted(edge_index.proteins.tolist())
+
+            # Sidebar widgets ONLY for this tab
+            receptor_options = [""] + proteins
         
-        # Update ALL receptor states when selection changes
-        if selected_receptor != st.session_state.shared_receptor:
-            sync_receptor_selection(selected_receptor)
+            # Get saved receptor from session state
+            selected_receptor = st.sidebar.selectbox(
+                "Select Receptor", 
+                options=receptor_options,
+                index=receptor_options.index(st.session_state.shared_receptor) if st.session_state.shared_receptor in receptor_options else 0,
+                format_func=lambda x: "Select a receptor..." if x == "" else x,
+                key="receptor_select"
+            )
+            st.session_state.shared_receptor = selected_receptor
         
-        # Use saved threshold
-        similarity_threshold = st.sidebar.slider(
-            "Similarity Threshold", 
-            min_value=75, 
-            max_value=95,
-            value=st.session_state.similarity_threshold,
-            step=5,
-            key="network_threshold_slider"
-        )
+            # Update ALL receptor states when selection changes
+            if selected_receptor != st.session_state.shared_receptor:
+                sync_receptor_selection(selected_receptor)
         
-        # Save threshold to session state
-        st.session_state.similarity_threshold = similarity_threshold
+            # Use saved threshold
+            similarity_threshold = st.sidebar.slider(
+                "Similarity Threshold", 
+                min_value=75, 
+                max_value=95,
+                value=st.session_state.similarity_threshold,
+                step=5,
+                key="network_threshold_slider"
+            )
         
-        G = create_protein_network(similarity_df, similarity_threshold)
-        st.sidebar.info(f"Network has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
-        proteins = sorted(list(G.nodes()))
-
-        if selected_receptor == "":
-            st.info("Please type or select a receptor from the sidebar to build and view the network.")
-        else:
-            radius = 1
-            ego_graph, neighbors = get_protein_neighbors(G, selected_receptor)
-            node_size = 100
-            central_node_size = 200
-            fig = visualize_protein_neighborhood(
-                ego_graph, 
-                selected_receptor, 
-                node_size=node_size, 
-                central_node_size=central_node_size
+            # Save threshold to session state
+            st.session_state.similarity_threshold = similarity_threshold
+        
+            # Static PNG (server-side) or interactive canvas (pan/zoom/hover in the browser)
+            renderer = st.sidebar.radio("Network Renderer", RENDERERS, key="network_renderer")
+        
+            # Neighborhood by hop radius, or the k most similar receptors at any similarity
+            neighborhood_mode = st.sidebar.radio(
+                "Neighborhood Mode", ["Radius", "Top-k most similar"], key="neighborhood_mode"
             )
-            st.pyplot(fig)
-            
-            # DYNAMIC NEIGHBORHOOD BUTTONS - REPLACE THE EXPANDER
-            st.subheader("Neighborhood Navigation")
-            st.write("Click any receptor to navigate to its neighborhood:")
-            
-            # Create a DataFrame with protein names and similarity scores
-            neighbor_data = []
-            for protein, _ in neighbors:
-                if selected_receptor in G and protein in G[selected_receptor]:
-                    similarity_score = G[selected_receptor][protein]['weight']
-                    neighbor_data.append({"Protein": protein, "Similarity Score": similarity_score})
+            if neighborhood_mode == "Radius":
+                radius = st.sidebar.slider("Neighborhood Radius (hops)", min_value=1, max_value=3,
+                                           value=1, key="network_radius")
+            else:
+                top_k = st.sidebar.slider("Number of Neighbors", min_value=5, max_value=50,
+                                          value=20, step=5, key="network_top_k")
+        
+            st.sidebar.info(
+                f"Network has {edge_index.number_of_nodes()} nodes and "
+                f"{edge_index.number_of_edges(similarity_threshold)} edges"
+            )
+
+            if selected_receptor == "":
+                st.info("Please type or select a receptor from the sidebar to build and view the network.")
+            else:
+                # One bounded BFS over the sparse adjacency (or a top-k row selection)
+                if neighborhood_mode == "Radius":
+                    ego_graph, neighbors, truncated = get_neighborhood(
+                        edge_index, similarity_threshold, selected_receptor, radius=radius
+                    )
+                    view = ("radius", radius)
+                else:
+                    ego_graph, neighbors, truncated = get_top_k_neighborhood(
+                        edge_index, cached_similarity_matrix(similarity_path),
+                        similarity_threshold, selected_receptor, k=top_k
+                    )
+                    view = ("top_k", top_k)
+                if truncated:
+                    st.warning(f"Neighborhood limited to the {DEFAULT_MAX_NODES} closest receptors.")
+                node_size = 100
+                central_node_size = 200
+                # Coordinates come from the precomputed layout of the whole network
+                pos = cached_neighborhood_layout(similarity_path, similarity_threshold,
+                                                 selected_receptor, ego_graph, view=view,
+                                                 edge_index=edge_index)
+                # Rendered once per receptor, threshold and view, then served from the render cache
+                from src.network_explorer.visualization import visualize_protein_neighborhood
+                from src.render_cache import render_view
+                render_args = (
+                    "neighborhood", selected_receptor, (similarity_threshold, view, node_size, central_node_size),
+                    (similarity_path,),
+                    lambda: visualize_protein_neighborhood(
+                        ego_graph, 
+                        selected_receptor, 
+                        node_size=node_size, 
+                        central_node_size=central_node_size,
+                        pos=pos
+                    )
+                )
+                if renderer == RENDERERS[0]:
+                    with perf.stage("app.st_image"):
+                        st.image(render_view(*render_args), width="stretch")
                 else:
-                    neighbor_data.append({"Protein": protein, "Similarity Score": 0})
+                    render_interactive_neighborhood(ego_graph, selected_receptor, pos=pos)
+                
+                    # The matplotlib figure is only rendered when an export is requested
+                    if st.button("Prepare PNG/SVG export", key="export_network_png"):
+                        st.download_button("Download PNG", render_view(*render_args, fmt="png", savefig_options={}),
+                                           file_name=f"{selected_receptor}_neighborhood.png", mime="image/png")
+                        st.download_button("Download SVG", render_view(*render_args, fmt="svg", savefig_options={}),
+                                           file_name=f"{selected_receptor}_neighborhood.svg", mime="image/svg+xml")
+            
+                # DYNAMIC NEIGHBORHOOD BUTTONS - REPLACE THE EXPANDER
+                st.subheader("Neighborhood Navigation")
+                st.write("Click any receptor to navigate to its neighborhood:")
             
-            # Create DataFrame with both columns and sort by similarity
-            neighbors_df = pd.DataFrame(neighbor_data)
-            neighbors_df = neighbors_df.sort_values("Similarity Score", ascending=False)
+                # Sorted (receptor, similarity, hops) rows straight from the similarity matrix row
+                summary = neighborhood_summary(
+                    cached_similarity_matrix(similarity_path), selected_receptor, neighbors
+                )
             
-            # Create dynamic buttons using columns (3 buttons per row)
-            MAX_BUTTONS_PER_ROW = 3
+                # Only one page of buttons is created per rerun (3 buttons per row)
+                MAX_BUTTONS_PER_ROW = 3
+                BUTTONS_PER_PAGE = 30
+                n_pages = max(1, -(-len(summary) // BUTTONS_PER_PAGE))
+                page = 1
+                if n_pages > 1:
+                    page = st.number_input(
+                        f"Page (of {n_pages}, {len(summary)} receptors)", min_value=1, max_value=n_pages,
+                        value=1, step=1, key=f"neighbor_page_{selected_receptor}_{view}"
+                    )
+                page_rows = summary[(page - 1) * BUTTONS_PER_PAGE:page * BUTTONS_PER_PAGE]
             
-            for i in range(0, len(neighbors_df), MAX_BUTTONS_PER_ROW):
-                # Create columns for this row
-                cols = st.columns(MAX_BUTTONS_PER_ROW)
+                for i in range(0, len(page_rows), MAX_BUTTONS_PER_ROW):
+                    # Create columns for this row
+                    cols = st.columns(MAX_BUTTONS_PER_ROW)
                 
-                # Add buttons to columns
-                for j in range(MAX_BUTTONS_PER_ROW):
-                    idx = i + j
-                    if idx < len(neighbors_df):
-                        protein = neighbors_df.iloc[idx]["Protein"]
-                        similarity = neighbors_df.iloc[idx]["Similarity Score"]
-                        
+                    # Add buttons to columns
+                    for col, row in zip(cols, page_rows[i:i + MAX_BUTTONS_PER_ROW]):
+                        protein = str(row['receptor'])
+                    
                         # Create button with similarity info
-                        if cols[j].button(f"{protein} ({similarity:.2f})", key=f"btn_{protein}"):
+                        if col.button(f"{protein} ({row['similarity']:.2f})", key=f"btn_{protein}"):
                             # When button is clicked, set flags for next rerun
                             st.session_state.needs_rerun = True
                             st.session_state.target_receptor = protein
             
-            # Optionally keep the table view inside an expander
-            with st.expander("Neighborhood Details", expanded=False):
-                # Convert to HTML with full width styling
-                neighbors_df["Similarity Score"] = neighbors_df["Similarity Score"].apply(lambda x: f"{x:.2f}")
-                html = neighbors_df.to_html(index=False, classes="table table-striped")
-                st.markdown(f"""
-                <div style="height: 300px; overflow-y: auto; overflow-x: auto; border: 1px solid #e1e4e8; border-radius: 6px; padding: 0;">
-                    {html}
-                </div>
-                """, unsafe_allow_html=True)
-    else:
-        st.error(f"File not found: {similarity_path}")
-        st.info("Please provide a valid path to the similarity matrix.")
-
-elif tab == "Predicted Response Explorer":
-    st.title("Predicted Response Explorer")
-
-    try:
-        # Load response data
-        data_dict = load_response_explorer_data(data_dir="data")
-        label_df = data_dict['label_df']
-        cas_df = data_dict['cas_df']
-        predicted_df = data_dict['predicted_df']
-        
-        # Get list of receptors for the dropdown
-        receptor_options = [""] + sorted(predicted_df.index.tolist())
-        
-        # Use the session state value as default
-        selected_receptor = st.sidebar.selectbox(
-            "Select Receptor", 
-            options=receptor_options,
-            index=receptor_options.index(st.session_state.shared_receptor) if st.session_state.shared_receptor in receptor_options else 0,
-            format_func=lambda x: "Select a receptor..." if x == "" else x,
-            key="receptor_select"  # Same key for both tabs
-        )
-        st.session_state.shared_receptor = selected_receptor
-
-        # Update ALL receptor states when selection changes
-        if selected_receptor != st.session_state.shared_receptor:
-            sync_receptor_selection(selected_receptor)
-
-        # MOVED UP: Features to display slider
-        n_features = st.sidebar.slider(
-            "Features to display", 
-            min_value=0,
-            max_value=30,
-            value=st.session_state.n_features,  # Use saved value
-            step=5,
-            key="n_features_slider"
+                # Optionally keep the table view inside an expander
+                with st.expander("Neighborhood Details", expanded=False):
+                    # Convert to HTML with full width styling
+                    neighbors_df = pd.DataFrame({
+                        "Protein": summary['receptor'],
+                        "Similarity Score": np.char.mod("%.2f", summary['similarity']),
+                        "Hops": summary['distance']
+                    })
+                    html = neighbors_df.to_html(index=False, classes="table table-striped")
+                    st.markdown(f"""
+                    <div style="height: 300px; overflow-y: auto; overflow-x: auto; border: 1px solid #e1e4e8; border-radius: 6px; padding: 0;">
+                        {html}
+                    </div>
+                    """, unsafe_allow_html=True)
+        else:
+            st.error(f"File not found: {similarity_path}")
+            st.info("Please provide a valid path to the similarity matrix.")
+
+    elif tab == "Predicted Response Explorer":
+        st.title("Predicted Response Explorer")
+
+        from src.response_explorer.analysis import compare_receptor_to_chemicals
+        from src.response_explorer.ann_index import DEFAULT_PROBES, MIN_INDEXED_CHEMICALS
+        from src.data_cache import (
+            RESPONSE_FILENAMES, cached_ann_index, cached_chemical_tree, cached_fingerprint_store,
+            cached_response_explorer_data
         )
+
+        try:
+            # Load response data
+            data_dict = cached_response_explorer_data(data_dir="data")
+            label_df = data_dict['label_df']
+            cas_df = data_dict['cas_df']
+            predicted_df = data_dict['predicted_df']
         
-        # Save the value to session state
-        st.session_state.n_features = n_features
+            # Get list of receptors for the dropdown
+            receptor_options = [""] + sorted(predicted_df.index.tolist())
         
-        # MOVED DOWN: Number of top chemicals slider
-        top_n = st.sidebar.slider(
-            "Number of top chemicals to display", 
-            min_value=0, 
-            max_value=30,
-            value=st.session_state.top_chemicals,  # Use saved value as default
-            step=5,
-            key="top_chemicals_slider"  # Add a unique key
-        )
+            # Use the session state value as default
+            selected_receptor = st.sidebar.selectbox(
+                "Select Receptor", 
+                options=receptor_options,
+                index=receptor_options.index(st.session_state.shared_receptor) if st.session_state.shared_receptor in receptor_options else 0,
+                format_func=lambda x: "Select a receptor..." if x == "" else x,
+                key="receptor_select"  # Same key for both tabs
+            )
+            st.session_state.shared_receptor = selected_receptor
+
+            # Update ALL receptor states when selection changes
+            if selected_receptor != st.session_state.shared_receptor:
+                sync_receptor_selection(selected_receptor)
+
+            # MOVED UP: Features to display slider
+            n_features = st.sidebar.slider(
+                "Features to display", 
+                min_value=0,
+                max_value=30,
+                value=st.session_state.n_features,  # Use saved value
+                step=5,
+                key="n_features_slider"
+            )
         
-        # Save slider value to session state
-        st.session_state.top_chemicals = top_n
+            # Save the value to session state
+            st.session_state.n_features = n_features
         
-        # Check if a receptor is selected before running analysis
-        if selected_receptor == "":
-            st.info("Please select a receptor from the sidebar to view chemical predictions.")
-        else:
-            # Only run analysis if a receptor is selected
-            results, error_message = compare_receptor_to_chemicals(
-                receptor_name=selected_receptor,
-                predicted_df=predicted_df,
-                cas_df=cas_df,
-                label_df=label_df,
-                top_n=top_n
+            # MOVED DOWN: Number of top chemicals slider
+            top_n = st.sidebar.slider(
+                "Number of top chemicals to display", 
+                min_value=0, 
+                max_value=30,
+                value=st.session_state.top_chemicals,  # Use saved value as default
+                step=5,
+                key="top_chemicals_slider"  # Add a unique key
             )
-            
-            # Reorder the visualizations and table in the Response Explorer section
-            if error_message:
-                st.error(error_message)
+        
+            # Save slider value to session state
+            st.session_state.top_chemicals = top_n
+
+            # Cosine on the full profile, or Tanimoto/Dice on its thresholded fingerprint
+            metric = st.sidebar.selectbox(
+                "Similarity metric",
+                options=["cosine", "tanimoto", "dice"],
+                format_func=str.capitalize,
+                key="similarity_metric"
+            )
+            response_threshold = 0.5
+            if metric != "cosine":
+                response_threshold = st.sidebar.slider(
+                    "Response threshold",
+                    min_value=0.05,
+                    max_value=0.95,
+                    value=0.5,
+                    step=0.05,
+                    key="response_threshold",
+                    help="Scaled predicted responses at or above this count as features of the receptor"
+                )
+
+            # Large screening libraries may opt into the approximate index; exact is the default
+            approximate = False
+            probes = DEFAULT_PROBES
+            if metric == "cosine" and len(cas_df) >= MIN_INDEXED_CHEMICALS:
+                approximate = st.sidebar.checkbox(
+                    "Approximate search",
+                    value=False,
+                    key="approximate_search",
+                    help="Search an index of the library: much faster, but may miss some of the true top matches"
+                )
+                if approximate:
+                    probes = st.sidebar.slider(
+                        "Index cells probed",
+                        min_value=1,
+                        max_value=256,
+                        value=DEFAULT_PROBES,
+                        key="ann_probes",
+                        help="More cells: higher recall, slower search"
+                    )
+        
+            # Check if a receptor is selected before running analysis
+            if selected_receptor == "":
+                st.info("Please select a receptor from the sidebar to view chemical predictions.")
             else:
-                # Move this line inside the expander when results are available
-                with st.expander("About Response Explorer", expanded=False):
-                    st.markdown("""
-                    **Response Explorer** lets you analyze the predicted responses of olfactory receptors to various chemicals, identifying the best chemical matches for any receptor based on cosine similarity of propagated features. 
-                    Current visualization include **Profile Comparison** and **Clustering Analysis** of chemicals, along with **Top Matching Chemicals** by overall cosine similairity.
+                # Plotting modules (matplotlib, scipy.cluster) are needed from here on
+                from src.response_explorer.vis_table_match import format_results_table, display_results_table
+                from src.response_explorer.vis_linechart import create_line_chart_visualization
+                from src.response_explorer.vis_feature_images import display_top_features_images
+                from src.response_explorer.vis_clustering import create_clustering_visualization
+                from src.render_cache import render_view
+                response_paths = tuple(os.path.join("data", filename) for filename in RESPONSE_FILENAMES)
+            
+                ann_index = None
+                fingerprints = None
+                if metric != "cosine":
+                    fingerprints = cached_fingerprint_store(data_dir="data")
+                elif approximate:
+                    ann_index = cached_ann_index(data_dir="data")
+                    st.caption(f"Approximate search over {len(cas_df):,} chemicals ({probes} cells probed)")
+
+                # Only run analysis if a receptor is selected
+                results, error_message = compare_receptor_to_chemicals(
+                    receptor_name=selected_receptor,
+                    predicted_df=predicted_df,
+                    cas_df=cas_df,
+                    label_df=label_df,
+                    top_n=top_n,
+                    ann_index=ann_index,
+                    probes=probes,
+                    metric=metric,
+                    fingerprints=fingerprints,
+                    response_threshold=response_threshold
+                )
+            
+                # Reorder the visualizations and table in the Response Explorer section
+                if error_message:
+                    st.error(error_message)
+                else:
+                    # Move this line inside the expander when results are available
+                    with st.expander("About Response Explorer", expanded=False):
+                        st.markdown("""
+                        **Response Explorer** lets you analyze the predicted responses of olfactory receptors to various chemicals, identifying the best chemical matches for any receptor based on cosine similarity of propagated features. 
+                        Current visualization include **Profile Comparison** and **Clustering Analysis** of chemicals, along with **Top Matching Chemicals** by overall cosine similairity.
                     
-                    Data is divided into:
-                    - **NEWLY LABELED**: Receptors that received labels through propagation
-                    - **ORIGINALLY LABELED**: Receptors that provided the seed labels
-                    """)
+                        Data is divided into:
+                        - **NEWLY LABELED**: Receptors that received labels through propagation
+                        - **ORIGINALLY LABELED**: Receptors that provided the seed labels
+                        """)
                     
-                    # Add receptor status if results are available
-                    if selected_receptor != "" and 'results' in locals() and not error_message and 'status' in results:
-                        st.write(f"**Receptor Status:** {results['status']}")
+                        # Add receptor status if results are available
+                        if selected_receptor != "" and 'results' in locals() and not error_message and 'status' in results:
+                            st.write(f"**Receptor Status:** {results['status']}")
                 
-                # Only show visualizations if there are non-zero predictions
-                if results.get('warning') and "all zero predictions" in results['warning']:
-                    # Show one warning that applies to all visualizations
-                    st.warning("Visualizations not displayed for receptors with all zero predictions.")
-                else:
-                    # MOVED LINE CHART TO TOP: Feature Profile first
-                    st.subheader(f"Feature Profile for {selected_receptor}")
-                    # Pass both normalized and raw data
-                    line_chart_fig = create_line_chart_visualization(
-                        results,
-                        raw_data=predicted_df.loc[selected_receptor] if selected_receptor in predicted_df.index else None
-                    )   
-                    if line_chart_fig:
-                        st.pyplot(line_chart_fig)
+                    # Only show visualizations if there are non-zero predictions
+                    if results.get('warning') and "all zero predictions" in results['warning']:
+                        # Show one warning that applies to all visualizations
+                        st.warning("Visualizations not displayed for receptors with all zero predictions.")
                     else:
-                        st.info("Could not generate feature profile visualization for this receptor.")
+                        # MOVED LINE CHART TO TOP: Feature Profile first
+                        st.subheader(f"Feature Profile for {selected_receptor}")
+                        # Pass both normalized and raw data
+                        line_chart_png = render_view(
+                            "feature_profile", selected_receptor, (), response_paths,
+                            lambda: create_line_chart_visualization(
+                                results,
+                                raw_data=predicted_df.loc[selected_receptor] if selected_receptor in predicted_df.index else None
+                            )
+                        )
+                        if line_chart_png:
+                            with perf.stage("app.st_image"):
+                                st.image(line_chart_png, width="stretch")
+                        else:
+                            st.info("Could not generate feature profile visualization for this receptor.")
                     
-                    # FEATURE IMAGES SECOND
-                    display_top_features_images(selected_receptor, predicted_df, n_features)
+                        # FEATURE IMAGES SECOND
+                        display_top_features_images(selected_receptor, predicted_df, n_features)
                     
-                    # CLUSTERING VISUALIZATION THIRD
-                    st.subheader("Chemical Clustering Analysis")
-                    st.write("Hierarchical clustering of top chemical matches based on feature similarity.")
-                    clustering_fig = create_clustering_visualization(results)
-                    if clustering_fig:
-                        st.pyplot(clustering_fig)
-                    else:
-                        st.info("Could not generate clustering visualization for this receptor.")
+                        # CLUSTERING VISUALIZATION THIRD
+                        st.subheader("Chemical Clustering Analysis")
+                        st.write("Hierarchical clustering of top chemical matches based on feature similarity, "
+                                 "taken from the dendrogram of the whole chemical library.")
+                        # The top chemicals determine the dendrogram, whichever metric picked them
+                        clustering_png = render_view(
+                            "chemical_clustering", selected_receptor, (tuple(results['top_chems']),), response_paths,
+                            lambda: create_clustering_visualization(
+                                results, tree=cached_chemical_tree(data_dir="data")
+                            )
+                        )
+                        if clustering_png:
+                            with perf.stage("app.st_image"):
+                                st.image(clustering_png, width="stretch")
+                        else:
+                            st.info("Could not generate clustering visualization for this receptor.")
                         
-                    # MOVED INSIDE: Table now only shows for non-zero predictions
-                    st.subheader("Top Chemical Matches")
-                    formatted_results, table_info = format_results_table(results)
-                    display_results_table(formatted_results, table_info)
+                        # MOVED INSIDE: Table now only shows for non-zero predictions
+                        st.subheader("Top Chemical Matches")
+                        formatted_results, table_info = format_results_table(results)
+                        display_results_table(formatted_results, table_info)
                 
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        st.info("Please ensure all required data files are in the correct location.")
+        except Exception as e:
+            st.error(f"Error loading data: {str(e)}")
+            st.info("Please ensure all required data files are in the correct location.")
+
+    elif tab == "Chemical Lookup":
+        st.title("Chemical Lookup")
+
+        with st.expander("About Chemical Lookup", expanded=False):
+            st.markdown("""
+            **Chemical Lookup** answers the reverse question of the Response Explorer: which olfactory receptors are predicted
+            to respond to a given chemical. Receptors are ranked by cosine similarity between the chemical's features and
+            each receptor's propagated feature profile.
+            """)
 
-elif tab == "Feature Catalog":
-    st.title("Feature Catalog")
+        from src.response_explorer.reverse_lookup import query_receptors_for_chemical
+        from src.data_cache import cached_reverse_index
+
+        try:
+            reverse_index = cached_reverse_index(data_dir="data")
+
+            # Chemicals are listed by name with their CAS number, and looked up by CAS when present
+            chemical_keys = {
+                f"{name} ({cas})" if cas else name: cas or name
+                for name, cas in zip(reverse_index['chemical_names'], reverse_index['cas_numbers'])
+            }
+            chemical_options = [""] + sorted(chemical_keys)
+            selected_chemical = st.sidebar.selectbox(
+                "Select Chemical",
+                options=chemical_options,
+                format_func=lambda x: "Select a chemical..." if x == "" else x,
+                key="chemical_select"
+            )
+
+            top_receptors = st.sidebar.slider(
+                "Number of top receptors to display",
+                min_value=5,
+                max_value=30,
+                value=10,
+                step=5,
+                key="top_receptors_slider"
+            )
+
+            if selected_chemical == "":
+                st.info("Please select a chemical from the sidebar to view predicted receptors.")
+            else:
+                receptors_df = query_receptors_for_chemical(
+                    reverse_index, chemical_keys[selected_chemical], top_n=top_receptors
+                )
+
+                st.subheader(f"Top Receptors for {selected_chemical}")
+                receptors_df["Similarity"] = receptors_df["Similarity"].map(lambda x: f"{x:.4f}")
+                receptors_df = receptors_df.rename(columns={"Similarity": "Similarity Score"})
+                html = receptors_df.to_html(index=False, classes="table table-striped")
+                st.markdown(f"""
+                <div style="height: 400px; overflow-y: auto; overflow-x: auto; border: 1px solid #e1e4e8; border-radius: 6px; padding: 0;">
+                    {html}
+                </div>
+                """, unsafe_allow_html=True)
+                st.caption(f"Showing top {len(receptors_df)} receptor matches for {selected_chemical}.")
+
+        except Exception as e:
+            st.error(f"Error loading data: {str(e)}")
+            st.info("Please ensure all required data files are in the correct location.")
+
+    elif tab == "Feature Catalog":
+        st.title("Feature Catalog")
+
+        from src.response_explorer.vis_feature_images import display_image
     
-    # Create an expander for the Feature Catalog description
-    with st.expander("About Feature Catalog", expanded=False):
-        st.markdown("""
-        Features used for label propagation are divided into two groups; Functional Groups and Maximum common substructure (MCS) fragments. 
-        Functional groups labels that were unused in chemical dataset were removed before propagation. Maximum common substructures were 
-        computed through multiple iteration of clustering and from sparse to densely packed clusters looking for the MCS at each clustering level. 
-        """)
+        # Create an expander for the Feature Catalog description
+        with st.expander("About Feature Catalog", expanded=False):
+            st.markdown("""
+            Features used for label propagation are divided into two groups; Functional Groups and Maximum common substructure (MCS) fragments. 
+            Functional groups labels that were unused in chemical dataset were removed before propagation. Maximum common substructures were 
+            computed through multiple iteration of clustering and from sparse to densely packed clusters looking for the MCS at each clustering level. 
+            """)
     
-    # Helper function to convert image to base64 (MOVED HERE)
-    def get_image_as_base64(image_path):
-        import base64
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode()
+        # Add sliders to control image width
+        col1, col2 = st.columns(2)
+        with col1:
+            groups_width = 800
+        with col2:
+            fragments_width = 800
     
-    # Add sliders to control image width
-    col1, col2 = st.columns(2)
-    with col1:
-        groups_width = 800
-    with col2:
-        fragments_width = 800
+        # Display the images with controlled size (resized once, served as cached files)
+        st.subheader("Functional Groups")
+        display_image('images/groups.png', groups_width,
+                      style="max-width: 100%; image-rendering: high-quality;")
+
+        st.subheader("MCS Fragments")
+        display_image('images/fragments.png', fragments_width,
+                      style="max-width: 100%; image-rendering: high-quality;")
+
+# Opt-in performance panel. Recording is process-wide: the checkboxes show the
+# shared setting and only change it when a user clicks them. Memory tracing slows
+# every session, so it is only offered when the operator set AROMA_PERF=memory.
+def apply_perf_settings():
+    memory = perf.memory_allowed() and st.session_state.get("perf_memory", False)
+    perf.set_enabled(st.session_state.perf_enabled, memory=st.session_state.perf_enabled and memory)
+
+
+st.session_state.perf_enabled = perf.is_enabled()
+with st.sidebar.expander("Performance", expanded=False):
+    record_timings = st.checkbox("Record stage timings", key="perf_enabled", on_change=apply_perf_settings)
+    if perf.memory_allowed():
+        st.session_state.perf_memory = perf.memory_enabled()
+        st.checkbox("Trace peak memory (slower)", key="perf_memory", on_change=apply_perf_settings,
+                    disabled=not record_timings)
     
-    # Display the images with controlled size
-    st.subheader("Functional Groups")
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <img src="data:image/png;base64,{get_image_as_base64('images/groups.png')}" 
-             width="{groups_width}" style="max-width: 100%; image-rendering: high-quality;">
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.subheader("MCS Fragments")
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <img src="data:image/png;base64,{get_image_as_base64('images/fragments.png')}" 
-             width="{fragments_width}" style="max-width: 100%; image-rendering: high-quality;">
-    </div>
-    """, unsafe_allow_html=True)
+    stage_summary = perf.summarize()
+    if stage_summary:
+        import pandas as pd
+        summary_df = pd.DataFrame(stage_summary)[["stage", "calls", "total_s", "mean_ms", "max_ms", "peak_mb"]]
+        st.dataframe(summary_df.round(3), hide_index=True)
+        st.download_button("Export JSON lines", perf.to_jsonl(), file_name="aroma_timings.jsonl",
+                           mime="application/x-ndjson")
+        if st.button("Clear timings", key="perf_clear"):
+            perf.clear_records()
+    elif record_timings:
+        st.caption("Timings appear after the next interaction.")
+    else:
+        st.caption("Enable recording to time each loader, analysis and rendering stage.")
 
+    # Rendered views are cached regardless of the recording setting
+    from src.render_cache import figure_memory, get_render_cache
+    render_stats = get_render_cache().stats()
+    worker = figure_memory()
+    rss = f"{worker['rss_bytes'] / 1e6:.0f} MB" if worker['rss_bytes'] is not None else "n/a"
+    st.caption(
+        f"Render cache: {render_stats['hit_rate']:.0%} hit rate "
+        f"({render_stats['memory_hits']} memory, {render_stats['disk_hits']} disk, "
+        f"{render_stats['misses']} rendered), {render_stats['memory_bytes'] / 1e6:.1f} MB in memory, "
+        f"{render_stats['disk_bytes'] / 1e6:.1f} MB on disk. "
+        f"Worker {worker['pid']}: {worker['open_figures']} open figures "
+        f"({worker['open_figure_bytes'] / 1e6:.1f} MB), largest render "
+        f"{render_stats['peak_figure_bytes'] / 1e6:.1f} MB, RSS {rss}."
+    )
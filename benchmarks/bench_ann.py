@@ -0,0 +1,70 @@
+"""
+Recall@k and latency of the ANN chemical index against the exact scan.
+
+The queries are the shipped receptor profiles, max-scaled as in
+compare_receptor_to_chemicals. They are run against a synthetic library
+in the shipped feature schema. It has no cluster structure, so it is a
+worst case for recall. For each cell count, every probes setting is timed
+per query, and its top-k is compared with the exact top-k.
+
+Run from the repository root:
+    python -m benchmarks.bench_ann --chemicals 200000 --cells 256 1024 --probes 4 16 64
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import feature_columns, synthetic_chemicals
+from src.response_explorer.analysis import cosine_scores, find_common_columns, prepare_chemical_library, top_k_indices
+from src.response_explorer.ann_index import ann_candidates, ann_top_k, build_ann_index
+from src.response_explorer.batch_scoring import max_scale_rows
+
+
+def exact_top_k(queries, values, norms, k):
+    """Exact top-k rows per query and the mean seconds per query."""
+    start_time = time.perf_counter()
+    top = [top_k_indices(cosine_scores(query, values, norms), k) for query in queries]
+    return top, (time.perf_counter() - start_time) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall@k and latency against the exact scan.")
+    parser.add_argument("--chemicals", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=100, help="Receptor profiles used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--cells", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    predicted_df = pd.read_csv("data/propagated_labels_complete.csv", index_col=0)
+    predicted_df = predicted_df[predicted_df.sum(axis=1) > 0].head(args.queries)
+    cas_df = synthetic_chemicals(args.chemicals, feature_columns())
+    common_cols = find_common_columns(predicted_df, cas_df)
+    library = prepare_chemical_library(cas_df, common_cols)
+    values, norms = library['values'], library['norms']
+    queries = max_scale_rows(predicted_df[common_cols].to_numpy(dtype=float))
+
+    exact, exact_seconds = exact_top_k(queries, values, norms, args.k)
+    print(f"{len(values)} chemicals, {len(queries)} queries, k={args.k}")
+    print(f"exact scan: {exact_seconds * 1000:.2f} ms/query")
+    print(f"{'cells':>6} {'build_s':>7} {'probes':>6} {'candidates':>10} "
+          f"{'ms/query':>8} {'speedup':>7} {'recall@k':>8}")
+
+    for n_cells in args.cells:
+        start_time = time.perf_counter()
+        index = build_ann_index(values, n_cells=n_cells)
+        build_seconds = time.perf_counter() - start_time
+        for probes in args.probes:
+            start_time = time.perf_counter()
+            approx = [ann_top_k(index, query, values, norms, args.k, probes=probes)[0] for query in queries]
+            seconds = (time.perf_counter() - start_time) / len(queries)
+            candidates = np.mean([len(ann_candidates(index, query, probes)) for query in queries])
+            recall = np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(approx, exact)])
+            print(f"{n_cells:>6} {build_seconds:>7.2f} {probes:>6} {candidates:>10.0f} "
+                  f"{seconds * 1000:>8.2f} {exact_seconds / seconds:>6.1f}x {recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+pytest-benchmark suite for the app's hot paths on shipped and synthetic data.
+
+Requires pytest and pytest-benchmark (see requirement-optional.txt). Run from
+the repository root:
+    python -m pytest benchmarks/bench_hot_paths.py
+    AROMA_BENCH_SCALE=medium python -m pytest benchmarks/bench_hot_paths.py
+
+Compare saved runs (e.g. before and after a change):
+    pytest-benchmark compare --group-by=name --sort=name
+    python -m pytest benchmarks/bench_hot_paths.py --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import networkx as nx
+import matplotlib.pyplot as plt
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from src.network_explorer.data_loader import convert_similarity_matrix, load_similarity_matrix
+from src.network_explorer.network import (
+    ThresholdEdgeIndex, create_protein_network, get_neighborhood, get_protein_neighbors
+)
+from src.network_explorer.visualization import visualize_protein_neighborhood
+from src.render_cache import RenderCache
+from src.response_explorer.analysis import compare_receptor_to_chemicals, find_common_columns
+from src.response_explorer.chemical_tree import build_chemical_tree, induced_linkage, load_chemical_tree
+from src.response_explorer.fingerprints import build_fingerprint_store
+from src.response_explorer.vis_clustering import create_clustering_visualization
+from src.response_explorer.vis_feature_images import display_top_features_images
+
+THRESHOLD = 85
+
+
+@pytest.fixture(scope="module")
+def similarity_df(similarity_path):
+    return load_similarity_matrix(similarity_path)
+
+
+@pytest.fixture(scope="module")
+def network(similarity_df):
+    G = create_protein_network(similarity_df, THRESHOLD)
+    hub = max(G.degree, key=lambda item: item[1])[0]
+    return G, hub
+
+
+@pytest.fixture(scope="module")
+def comparison(response_data):
+    """Results for the receptor with the most predicted signal."""
+    predicted_df = response_data['predicted_df']
+    receptor = predicted_df.sum(axis=1).idxmax()
+    results, _ = compare_receptor_to_chemicals(
+        receptor, predicted_df, response_data['cas_df'], response_data['label_df'], top_n=10
+    )
+    return receptor, results
+
+
+def test_load_similarity_csv(benchmark, similarity_path):
+    benchmark.pedantic(load_similarity_matrix, args=(similarity_path,),
+                       kwargs={'use_binary': False}, rounds=3, iterations=1)
+
+
+def test_load_similarity_binary(benchmark, similarity_path):
+    convert_similarity_matrix(similarity_path)
+    df = benchmark(load_similarity_matrix, similarity_path)
+    assert df.shape[0] == df.shape[1]
+
+
+def test_create_protein_network(benchmark, similarity_df):
+    G = benchmark.pedantic(create_protein_network, args=(similarity_df, THRESHOLD),
+                           rounds=3, iterations=1)
+    assert G.number_of_nodes() == len(similarity_df)
+
+
+def test_build_edge_index(benchmark, similarity_df):
+    benchmark.pedantic(ThresholdEdgeIndex, args=(similarity_df,),
+                       kwargs={'min_threshold': 75}, rounds=3, iterations=1)
+
+
+def test_get_protein_neighbors(benchmark, network):
+    G, hub = network
+    ego, neighbors = benchmark(get_protein_neighbors, G, hub, 2)
+    assert len(neighbors) == ego.number_of_nodes()
+
+
+def test_get_neighborhood_csr(benchmark, similarity_df, network):
+    _, hub = network
+    edge_index = ThresholdEdgeIndex(similarity_df, min_threshold=75)
+    edge_index.adjacency(THRESHOLD)
+    benchmark(get_neighborhood, edge_index, THRESHOLD, hub, 2, None)
+
+
+def test_visualize_protein_neighborhood(benchmark, network):
+    G, hub = network
+    ego = nx.ego_graph(G, hub)
+
+    def render():
+        plt.close(visualize_protein_neighborhood(ego, hub, node_size=100, central_node_size=200))
+
+    benchmark.pedantic(render, rounds=3, iterations=1)
+
+
+@pytest.mark.parametrize("warm", [False, True], ids=["render", "cached"])
+def test_render_view_neighborhood(benchmark, similarity_path, network, warm):
+    # A memory-only cache: 'render' draws, encodes and closes the figure, 'cached' is a lookup
+    G, hub = network
+    ego = nx.ego_graph(G, hub)
+    cache = RenderCache(64 * 1024 * 1024, 0, cache_dir=None)
+
+    def render():
+        if not warm:
+            cache.clear()
+        return cache.render("neighborhood", hub, (THRESHOLD,), (similarity_path,),
+                            lambda: visualize_protein_neighborhood(ego, hub, node_size=100, central_node_size=200))
+
+    assert benchmark.pedantic(render, rounds=3, iterations=1, warmup_rounds=int(warm))
+    assert not plt.get_fignums()
+
+
+@pytest.fixture(scope="module")
+def chemical_tree(response_data, tmp_path_factory):
+    # Built fresh into a temporary file, never reusing or replacing a persisted tree
+    tree_path = tmp_path_factory.mktemp("tree") / "chemical_tree.npz"
+    return load_chemical_tree(response_data['data_dir'], tree_path=str(tree_path))
+
+
+def test_compare_receptor_to_chemicals(benchmark, response_data, comparison):
+    receptor, _ = comparison
+    results, error = benchmark(
+        compare_receptor_to_chemicals, receptor, response_data['predicted_df'],
+        response_data['cas_df'], response_data['label_df'], 10
+    )
+    assert results is not None, error
+
+
+@pytest.fixture(scope="module")
+def fingerprint_store(response_data):
+    common_cols = find_common_columns(response_data['predicted_df'], response_data['cas_df'])
+    return build_fingerprint_store(response_data['cas_df'], common_cols)
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "dice"])
+def test_compare_receptor_to_chemicals_fingerprints(benchmark, response_data, comparison,
+                                                     fingerprint_store, metric):
+    receptor, _ = comparison
+    results, error = benchmark(
+        compare_receptor_to_chemicals, receptor, response_data['predicted_df'],
+        response_data['cas_df'], response_data['label_df'], 10,
+        metric=metric, fingerprints=fingerprint_store
+    )
+    assert results is not None, error
+
+
+def test_create_clustering_visualization(benchmark, comparison):
+    _, results = comparison
+
+    def render():
+        plt.close(create_clustering_visualization(results))
+
+    benchmark.pedantic(render, rounds=3, iterations=1)
+
+
+def test_build_chemical_tree(benchmark, response_data):
+    tree = benchmark.pedantic(build_chemical_tree, args=(response_data['cas_df'],),
+                              rounds=1, iterations=1)
+    assert len(tree['leaf_order']) == len(response_data['cas_df'])
+
+
+def test_induced_linkage(benchmark, chemical_tree, comparison):
+    _, results = comparison
+    Z = benchmark(induced_linkage, chemical_tree, results['top_chems'])
+    assert len(Z) == len(results['top_chems']) - 1
+
+
+def test_create_clustering_visualization_tree(benchmark, chemical_tree, comparison):
+    _, results = comparison
+
+    def render():
+        plt.close(create_clustering_visualization(results, tree=chemical_tree))
+
+    benchmark.pedantic(render, rounds=3, iterations=1)
+
+
+def test_display_top_features_images(benchmark, response_data, comparison):
+    # Streamlit calls run in bare mode; this times the manifest, thumbnails and HTML
+    receptor, _ = comparison
+    benchmark(display_top_features_images, receptor, response_data['predicted_df'], 10)
@@ -0,0 +1,85 @@
+"""
+Measure the bytes sent to the browser per page view for each image delivery mode.
+
+The modes are:
+- original: full-resolution PNG inlined as a base64 data URI (before thumbnails)
+- inline: 2x-width thumbnail inlined as a base64 data URI
+- media: st.image with the thumbnail bytes (no cache validators on /media)
+- static: <img> pointing at app/static/ with a versioned URL, reused from the
+  browser cache on repeat views
+
+The first view counts the HTML in the websocket delta plus every image download.
+Repeat views are reruns or revisits by the same browser.
+
+Run from the repository root:
+    python -m benchmarks.bench_image_payload --receptor AAEL000614
+"""
+import argparse
+import base64
+
+import pandas as pd
+
+from src.response_explorer.image_cache import get_image_manifest, get_thumbnail
+from src.response_explorer.vis_feature_images import TILE_WIDTH, image_html
+
+CATALOG_STYLE = "max-width: 100%; image-rendering: high-quality;"
+# Approximate size of an st.image element in the delta (URL plus width)
+MEDIA_ELEMENT_BYTES = 64
+
+
+def page_images(page, receptor, n_features=10):
+    """(image_path, display width, style) for every image on a page."""
+    if page == "catalog":
+        return [("images/groups.png", 800, CATALOG_STYLE), ("images/fragments.png", 800, CATALOG_STYLE)]
+    predicted_df = pd.read_csv("data/propagated_labels_complete.csv", index_col=0)
+    manifest = get_image_manifest()
+    top_features = predicted_df.loc[receptor].sort_values(ascending=False).head(n_features).index
+    return [(manifest[f], TILE_WIDTH, "image-rendering: high-quality;") for f in top_features if f in manifest]
+
+
+def page_bytes(images, mode):
+    """Bytes for the first view and for each repeat view of a page."""
+    first = repeat = 0
+    for image_path, width, style in images:
+        if mode == "original":
+            with open(image_path, "rb") as f:
+                src = "data:image/png;base64," + base64.b64encode(f.read()).decode()
+            html = len(image_html(src, width, style))
+            first += html
+            repeat += html
+            continue
+
+        thumbnail = get_thumbnail(image_path, 2 * width)
+        if mode == "inline":
+            html = len(image_html(f"data:{thumbnail['mime']};base64,{thumbnail['base64']}", width, style))
+            first += html
+            repeat += html
+        elif mode == "media":
+            first += MEDIA_ELEMENT_BYTES + len(thumbnail['bytes'])
+            repeat += MEDIA_ELEMENT_BYTES + len(thumbnail['bytes'])
+        else:
+            html = len(image_html(thumbnail['url'], width, style))
+            first += html + len(thumbnail['bytes'])
+            repeat += html
+    return first, repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--receptor", default="AAEL000614")
+    parser.add_argument("--features", type=int, default=10)
+    args = parser.parse_args()
+
+    pages = {
+        "Feature Catalog": page_images("catalog", args.receptor),
+        f"Top features ({args.receptor})": page_images("tiles", args.receptor, args.features)
+    }
+    print(f"{'page':<30}{'mode':<10}{'first view (KB)':>17}{'repeat view (KB)':>18}")
+    for name, images in pages.items():
+        for mode in ("original", "inline", "media", "static"):
+            first, repeat = page_bytes(images, mode)
+            print(f"{name:<30}{mode:<10}{first / 1024:>17.1f}{repeat / 1024:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
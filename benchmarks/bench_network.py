@@ -0,0 +1,82 @@
+"""
+Benchmark the vectorized create_protein_network against the original
+per-pair .loc loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_network
+"""
+import argparse
+import time
+
+import networkx as nx
+
+from benchmarks.synthetic import synthetic_similarity
+from src.network_explorer.data_loader import load_similarity_matrix
+from src.network_explorer.network import create_protein_network
+
+
+def create_protein_network_loop(similarity_df, threshold=85):
+    """Reference implementation: the original scalar .loc loop."""
+    G = nx.Graph()
+    for protein in similarity_df.index:
+        G.add_node(protein)
+    for i, protein1 in enumerate(similarity_df.index):
+        for j, protein2 in enumerate(similarity_df.columns):
+            if i < j:
+                try:
+                    score1 = float(similarity_df.loc[protein1, protein2])
+                    score2 = float(similarity_df.loc[protein2, protein1])
+                    max_score = max(score1, score2)
+                    if max_score >= threshold:
+                        G.add_edge(protein1, protein2, weight=max_score)
+                except Exception:
+                    continue
+    return G
+
+
+def same_graph(G1, G2):
+    """Check that two graphs have identical nodes, edges and weights."""
+    if set(G1.nodes()) != set(G2.nodes()) or G1.number_of_edges() != G2.number_of_edges():
+        return False
+    return all(G2.has_edge(u, v) and G2[u][v]['weight'] == w
+               for u, v, w in G1.edges(data='weight'))
+
+
+def time_call(func, *args, repeat=1):
+    """Return the best wall time over `repeat` calls and the last result."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 250, 500, 1000, 2000])
+    parser.add_argument("--threshold", type=float, default=85)
+    parser.add_argument("--loop-max", type=int, default=500,
+                        help="Largest size to run the slow loop on")
+    args = parser.parse_args()
+
+    cases = [("AllvsAll.csv", load_similarity_matrix("data/AllvsAll.csv"))]
+    cases += [(f"synthetic {n}x{n}", synthetic_similarity(n)) for n in args.sizes]
+
+    print(f"{'matrix':<22}{'edges':>10}{'loop (s)':>12}{'vector (s)':>12}{'speedup':>10}")
+    for name, df in cases:
+        vec_time, G_vec = time_call(create_protein_network, df, args.threshold, repeat=3)
+        if len(df) <= args.loop_max:
+            loop_time, G_loop = time_call(create_protein_network_loop, df, args.threshold)
+            if not same_graph(G_loop, G_vec):
+                raise AssertionError(f"Graphs differ for {name}")
+            loop_str = f"{loop_time:.3f}"
+            speedup = f"{loop_time / vec_time:.0f}x"
+        else:
+            loop_str, speedup = "-", "-"
+        print(f"{name:<22}{G_vec.number_of_edges():>10}{loop_str:>12}{vec_time:>12.4f}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
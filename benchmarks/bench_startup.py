@@ -0,0 +1,98 @@
+"""
+Cold-start report for app.py.
+
+Each view is opened as the first page of a new session in a fresh
+interpreter, using Streamlit's AppTest. The report lists the wall time of
+that first script run and the number of modules it imported. It also gives
+an import-time breakdown by top-level package from python -X importtime.
+The breakdown counts self time only, for the whole process, including
+Streamlit and AppTest.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --view "Feature Catalog" --top 15
+    python -m benchmarks.bench_startup --max-seconds 2.0   # exit code 1 if any view is slower
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+VIEWS = ("Structural Network Explorer", "Predicted Response Explorer", "Chemical Lookup", "Feature Catalog")
+
+
+def _child(view):
+    """Run one view of the app in this (fresh) interpreter and print a JSON report."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.session_state["view"] = view
+    modules_before = set(sys.modules)
+    start_time = time.perf_counter()
+    app.run()
+    seconds = time.perf_counter() - start_time
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    print(json.dumps({
+        'view': view,
+        'seconds': seconds,
+        'modules': len(set(sys.modules) - modules_before)
+    }))
+
+
+def parse_importtime(stderr):
+    """Self time in seconds per top-level package from -X importtime output."""
+    totals = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return totals
+
+
+def profile_view(view):
+    """Run a view in a fresh interpreter; return its report and import breakdown."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "benchmarks.bench_startup", "--child", view],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{view} failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time and import breakdown per app view.")
+    parser.add_argument("--view", choices=VIEWS, action="append", help="View(s) to profile (default: all)")
+    parser.add_argument("--top", type=int, default=10, help="Packages to list per view")
+    parser.add_argument("--max-seconds", type=float, help="Fail if a first run takes longer")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child)
+        return 0
+
+    slow = []
+    for view in args.view or VIEWS:
+        report, imports = profile_view(view)
+        print(f"{view}: first run {report['seconds']:.3f} s, {report['modules']} modules imported")
+        for package, seconds in imports.most_common(args.top):
+            print(f"    {package:<28} {seconds * 1000:8.1f} ms")
+        if args.max_seconds is not None and report['seconds'] > args.max_seconds:
+            slow.append(view)
+
+    if slow:
+        print(f"Slower than {args.max_seconds} s: {', '.join(slow)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
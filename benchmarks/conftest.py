@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the pytest-benchmark suite (benchmarks/bench_hot_paths.py).
+
+AROMA_BENCH_SCALE selects the synthetic sizes. Each scale also runs on the
+shipped data:
+    small  (default)  receptors 1k         chemicals 10k
+    medium            receptors 1k, 5k     chemicals 10k, 100k
+    full              receptors 1k, 5k, 20k chemicals 10k, 100k
+
+Results are saved automatically under .benchmarks/ and tagged with the commit.
+Run every suite with `python -m pytest benchmarks/` (pytest and pytest-benchmark
+are listed in requirement-optional.txt).
+"""
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import ensure_response_data, ensure_similarity
+
+SCALES = {
+    'small': {'receptors': [1000], 'chemicals': [10000]},
+    'medium': {'receptors': [1000, 5000], 'chemicals': [10000, 100000]},
+    'full': {'receptors': [1000, 5000, 20000], 'chemicals': [10000, 100000]},
+}
+SCALE = SCALES[os.environ.get("AROMA_BENCH_SCALE", "small")]
+
+
+# pytest-benchmark suites here; the other bench_*.py files are scripts
+SUITES = ("bench_hot_paths.py",)
+
+
+def pytest_collect_file(file_path, parent):
+    # The suites do not match pytest's test_*.py pattern; collect them for `pytest benchmarks/`
+    # (a file named on the command line is already collected)
+    if file_path.name in SUITES and not parent.session.isinitpath(file_path):
+        return pytest.Module.from_parent(parent, path=file_path)
+
+
+def pytest_configure(config):
+    # Keep every run so regressions between commits can be compared
+    if config.pluginmanager.hasplugin("benchmark") and hasattr(config.option, "benchmark_autosave"):
+        config.option.benchmark_autosave = True
+
+
+@pytest.fixture(scope="module", params=["shipped"] + SCALE['receptors'],
+                ids=lambda p: p if p == "shipped" else f"r{p}")
+def similarity_path(request):
+    """Path of an AllvsAll-style similarity CSV."""
+    if request.param == "shipped":
+        return "data/AllvsAll.csv"
+    return ensure_similarity(request.param)
+
+
+@pytest.fixture(scope="module", params=["shipped"] + SCALE['chemicals'],
+                ids=lambda p: p if p == "shipped" else f"c{p}")
+def response_data(request):
+    """label_df, cas_df and predicted_df in the Response Explorer schema, and their data_dir."""
+    data_dir = "data" if request.param == "shipped" else ensure_response_data(request.param)
+    return {
+        'label_df': pd.read_csv(os.path.join(data_dir, "receptor_fragment_ligand_matrix_filtered.csv"), index_col=0),
+        'cas_df': pd.read_csv(os.path.join(data_dir, "cas_features_filtered.csv")),
+        'predicted_df': pd.read_csv(os.path.join(data_dir, "propagated_labels_complete.csv"), index_col=0),
+        'data_dir': data_dir
+    }
@@ -0,0 +1,128 @@
+"""
+Synthetic datasets with the same schema as the shipped data files.
+
+Receptors come in families of about 20. Similarity is high (75-99) within a
+family and low (40-75) between families. Edge counts therefore grow linearly
+with the number of receptors, as in AllvsAll.csv, rather than quadratically.
+Chemicals carry the shipped GroupN/FragmentN feature columns as sparse 0/1
+flags.
+
+Datasets are written once to benchmarks/.data/ and reused by later runs:
+    python -m benchmarks.synthetic --receptors 1000 5000 --chemicals 10000
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DATA_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+FAMILY_SIZE = 20
+
+
+def feature_columns(cas_path="data/cas_features_filtered.csv"):
+    """GroupN/FragmentN feature columns of the shipped chemical file."""
+    columns = pd.read_csv(cas_path, nrows=0).columns
+    return [c for c in columns if c not in ('cas', 'name', 'smiles')]
+
+
+def receptor_ids(n):
+    return [f"OR{i:05d}" for i in range(n)]
+
+
+def synthetic_similarity(n, seed=0, dtype=np.float64):
+    """Generate an asymmetric LGA-like similarity matrix with n receptors."""
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(40, 75, size=(n, n)).astype(dtype)
+    family = np.arange(n) // FAMILY_SIZE
+    for start in range(0, n, FAMILY_SIZE):
+        stop = min(start + FAMILY_SIZE, n)
+        values[start:stop, start:stop] = rng.uniform(75, 99, size=(stop - start, stop - start))
+    # A few cross-family links so neighborhoods span more than one family
+    links = rng.integers(0, n, size=(n // 2, 2))
+    links = links[family[links[:, 0]] != family[links[:, 1]]]
+    values[links[:, 0], links[:, 1]] = rng.uniform(80, 95, size=len(links))
+    np.fill_diagonal(values, 100.0)
+    labels = receptor_ids(n)
+    return pd.DataFrame(values.round(3), index=labels, columns=labels)
+
+
+def synthetic_chemicals(n, features, density=0.05, seed=0):
+    """Chemical table with cas, name, smiles and 0/1 feature columns."""
+    rng = np.random.default_rng(seed)
+    flags = (rng.random((n, len(features))) < density).astype(np.int8)
+    # Every chemical has at least one feature
+    flags[np.arange(n), rng.integers(0, len(features), size=n)] = 1
+    df = pd.DataFrame(flags, columns=features)
+    df.insert(0, 'smiles', "C")
+    df.insert(0, 'name', [f"chemical_{i}" for i in range(n)])
+    df.insert(0, 'cas', [f"{100000 + i}-00-{i % 10}" for i in range(n)])
+    return df
+
+
+def synthetic_predictions(n, features, zero_fraction=0.13, seed=0):
+    """Propagated predictions (max-scaled rows, some all-zero) for n receptors."""
+    rng = np.random.default_rng(seed)
+    values = rng.random((n, len(features))) ** 4
+    values[rng.random(n) < zero_fraction] = 0
+    df = pd.DataFrame(values.round(5), index=receptor_ids(n), columns=features)
+    df.index.name = 'Receptor_ID'
+    return df
+
+
+def synthetic_labels(predicted_df, seed_fraction=0.25, seed=0):
+    """Seed label matrix: a subset of receptors with values in 0.2 steps."""
+    rng = np.random.default_rng(seed)
+    seeds = predicted_df.index[rng.random(len(predicted_df)) < seed_fraction]
+    values = (rng.integers(0, 6, size=(len(seeds), predicted_df.shape[1])) * 0.2).round(1)
+    return pd.DataFrame(values, index=seeds, columns=predicted_df.columns)
+
+
+def _write_csv(df, path, **kwargs):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp_path, **kwargs)
+    os.replace(tmp_path, path)
+
+
+def ensure_similarity(n, root=DATA_ROOT):
+    """Path of a synthetic AllvsAll-style CSV with n receptors, generating it if needed."""
+    path = os.path.join(root, f"similarity_{n}", "AllvsAll.csv")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_csv(synthetic_similarity(n, dtype=np.float32), path, float_format="%.3f")
+    return path
+
+
+def ensure_response_data(n_chemicals, n_receptors=1000, root=DATA_ROOT):
+    """
+    Directory with synthetic Response Explorer files, generating them if needed.
+
+    Contains cas_features_filtered.csv, propagated_labels_complete.csv and
+    receptor_fragment_ligand_matrix_filtered.csv in the shipped schema.
+    """
+    directory = os.path.join(root, f"response_r{n_receptors}_c{n_chemicals}")
+    marker = os.path.join(directory, "receptor_fragment_ligand_matrix_filtered.csv")
+    if not os.path.exists(marker):
+        os.makedirs(directory, exist_ok=True)
+        features = feature_columns()
+        predicted_df = synthetic_predictions(n_receptors, features)
+        _write_csv(synthetic_chemicals(n_chemicals, features),
+                   os.path.join(directory, "cas_features_filtered.csv"), index=False)
+        _write_csv(predicted_df, os.path.join(directory, "propagated_labels_complete.csv"))
+        _write_csv(synthetic_labels(predicted_df), marker)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark datasets.")
+    parser.add_argument("--receptors", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--chemicals", type=int, nargs="+", default=[10000])
+    args = parser.parse_args()
+    for n in args.receptors:
+        print(ensure_similarity(n))
+    for n in args.chemicals:
+        print(ensure_response_data(n))
+
+
+if __name__ == "__main__":
+    main()
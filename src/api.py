@@ -0,0 +1,220 @@
+"""
+Headless access to AROMA's analyses for scripts, batch jobs and workers.
+
+Nothing here imports Streamlit. Datasets and derived structures are loaded
+through src.data_cache, so a long-running process that calls these functions
+repeatedly reuses them. Every function returns plain DataFrames or dicts.
+
+Example:
+    from src import api
+    neighbors_df, truncated = api.neighbors("AAEL000613", threshold=85, radius=2)
+    matches_df = api.rank("AAEL000613", top_n=20)
+
+The same functions are available from the command line (see src.cli).
+"""
+import os
+
+from src.data_cache import (
+    cached_ann_index, cached_edge_index, cached_fingerprint_store, cached_response_explorer_data,
+    cached_similarity_matrix
+)
+
+# Analysis modules (and pandas, networkx) are imported by the functions that use
+# them, so a command pays only for its own dependencies
+SIMILARITY_FILENAME = "AllvsAll.csv"
+LABEL_FILENAME = "receptor_fragment_ligand_matrix_filtered.csv"
+DEFAULT_MAX_NODES = 300  # src.network_explorer.network.DEFAULT_MAX_NODES
+
+
+def neighbors(receptor, threshold=85, radius=1, top_k=None, max_nodes=DEFAULT_MAX_NODES,
+              data_dir="data"):
+    """
+    Structural neighbors of a receptor, most similar first.
+
+    Parameters:
+    -----------
+    receptor : str
+        Receptor ID
+    threshold : float, default=85
+        Similarity threshold for network edges
+    radius : int, default=1
+        Number of hops (ignored when top_k is given)
+    top_k : int, optional
+        Return the top_k most similar receptors instead of a radius neighborhood
+    max_nodes : int, optional
+        Node cap for the neighborhood (None for no cap)
+    data_dir : str, default="data"
+        Directory containing AllvsAll.csv
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Columns Receptor, Similarity and Hops
+    bool
+        Whether the neighborhood was truncated by max_nodes
+
+    Raises:
+    -------
+    ValueError
+        If the receptor is not in the network
+    """
+    import pandas as pd
+    from src.network_explorer.network import (
+        get_neighborhood, get_top_k_neighborhood, neighborhood_summary
+    )
+
+    similarity_path = os.path.join(data_dir, SIMILARITY_FILENAME)
+    similarity_df = cached_similarity_matrix(similarity_path)
+    edge_index = cached_edge_index(similarity_path)
+
+    if top_k is not None:
+        _, neighbor_list, truncated = get_top_k_neighborhood(
+            edge_index, similarity_df, threshold, receptor, k=top_k, max_nodes=max_nodes
+        )
+    else:
+        _, neighbor_list, truncated = get_neighborhood(
+            edge_index, threshold, receptor, radius=radius, max_nodes=max_nodes
+        )
+
+    summary = neighborhood_summary(similarity_df, receptor, neighbor_list)
+    neighbors_df = pd.DataFrame({
+        'Receptor': summary['receptor'],
+        'Similarity': summary['similarity'],
+        'Hops': summary['distance']
+    })
+    return neighbors_df, truncated
+
+
+def rank(receptor, top_n=10, data_dir="data", approximate=False, probes=None, metric="cosine",
+         response_threshold=0.5):
+    """
+    Chemicals best matching a receptor's predicted response profile.
+
+    Parameters:
+    -----------
+    receptor : str
+        Receptor ID
+    top_n : int, default=10
+        Number of chemical matches
+    data_dir : str, default="data"
+        Directory containing the Response Explorer files
+    approximate : bool, default=False
+        Search through the ANN index of the library (built on first use)
+    probes : int, optional
+        Index cells scanned when approximate (more: higher recall, slower)
+    metric : str, default="cosine"
+        'cosine', or 'tanimoto'/'dice' on the packed fingerprint store
+    response_threshold : float, default=0.5
+        Scaled responses at or above this form the receptor fingerprint
+        (tanimoto and dice only)
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Columns Rank, Chemical_Name, CAS_Number and Similarity. The full
+        results dict used by the visualizations is in .attrs['results_data'].
+
+    Raises:
+    -------
+    ValueError
+        If the receptor is unknown, the metric is invalid or the data files
+        share no feature columns
+    """
+    from src.response_explorer.analysis import compare_receptor_to_chemicals
+
+    data_dict = cached_response_explorer_data(data_dir)
+    ann_index = cached_ann_index(data_dir) if approximate and metric == "cosine" else None
+    fingerprints = cached_fingerprint_store(data_dir) if metric in ("tanimoto", "dice") else None
+    results_data, error = compare_receptor_to_chemicals(
+        receptor, data_dict['predicted_df'], data_dict['cas_df'], data_dict['label_df'], top_n=top_n,
+        ann_index=ann_index, probes=probes, metric=metric, fingerprints=fingerprints,
+        response_threshold=response_threshold
+    )
+    if results_data is None:
+        raise ValueError(error)
+
+    matches_df = results_data['results'].copy()
+    matches_df.insert(0, 'Rank', range(1, len(matches_df) + 1))
+    matches_df.attrs['results_data'] = results_data
+    return matches_df
+
+
+def propagate(data_dir="data", **kwargs):
+    """
+    Propagate the seed labels over the structural network.
+
+    Parameters:
+    -----------
+    data_dir : str, default="data"
+        Directory containing AllvsAll.csv and the seed label matrix
+    **kwargs
+        Options of src.propagation.label_propagation.propagate_labels
+        (alpha, cutoff, method, knn, ...)
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Propagated labels in the layout of propagated_labels_complete.csv
+    dict
+        Solver report (method, iterations, converged, residual, seconds, edges)
+    """
+    import pandas as pd
+    from src.propagation.label_propagation import propagate_labels
+
+    similarity_df = cached_similarity_matrix(os.path.join(data_dir, SIMILARITY_FILENAME))
+    label_df = pd.read_csv(os.path.join(data_dir, LABEL_FILENAME), index_col=0)
+    return propagate_labels(similarity_df, label_df, **kwargs)
+
+
+def export_edges(threshold=85, data_dir="data"):
+    """
+    Edge list of the protein network at a threshold, strongest edges first.
+
+    Parameters:
+    -----------
+    threshold : float, default=85
+        Similarity threshold for network edges
+    data_dir : str, default="data"
+        Directory containing AllvsAll.csv
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Columns Source, Target and Similarity
+    """
+    import pandas as pd
+
+    edge_index = cached_edge_index(os.path.join(data_dir, SIMILARITY_FILENAME))
+    m = edge_index.number_of_edges(threshold)
+    return pd.DataFrame({
+        'Source': edge_index.proteins[edge_index.rows[:m]],
+        'Target': edge_index.proteins[edge_index.cols[:m]],
+        'Similarity': edge_index.weights[:m]
+    })
+
+
+def export_matches(top_k=10, data_dir="data", workers=1):
+    """
+    Top-k chemical matches for every receptor.
+
+    Parameters:
+    -----------
+    top_k : int, default=10
+        Matches to keep per receptor
+    data_dir : str, default="data"
+        Directory containing the Response Explorer files
+    workers : int, default=1
+        Parallel worker threads
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Columns Receptor, Rank, Chemical_Name, CAS_Number and Similarity
+    dict
+        Throughput report (see score_all_receptors)
+    """
+    from src.response_explorer.batch_scoring import score_all_receptors
+
+    data_dict = cached_response_explorer_data(data_dir)
+    return score_all_receptors(data_dict['predicted_df'], data_dict['cas_df'],
+                               top_k=top_k, workers=workers)
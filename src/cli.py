@@ -0,0 +1,168 @@
+"""
+Command line interface to the headless API (src.api), for pipelines and batch jobs.
+
+Usage (from the repository root):
+    python -m src.cli neighbors AAEL000613 --threshold 85 --radius 2
+    python -m src.cli neighbors AAEL000613 --top-k 20 --format json
+    python -m src.cli rank AAEL000613 --top-n 20 --output matches.csv
+    python -m src.cli rank AAEL000613 --approximate --probes 32
+    python -m src.cli rank AAEL000613 --metric tanimoto --response-threshold 0.4
+    python -m src.cli propagate --method cg --output propagated.csv
+    python -m src.cli export edges --threshold 90 --output edges.csv
+    python -m src.cli export matches --top-k 10 --output top_matches.csv
+
+Tables go to stdout unless --output is given. --format (table, csv or json)
+defaults to the --output extension, or to a plain-text table on stdout.
+JSON is a list of row objects. Errors are printed to stderr with exit code 1.
+
+Only argparse is imported until a command runs, so --help is instant and
+Streamlit is never loaded.
+"""
+import argparse
+import sys
+import time
+
+OUTPUT_FORMATS = ("table", "csv", "json")
+
+
+def _output_format(args):
+    if args.format:
+        return args.format
+    if args.output and args.output.lower().endswith(".json"):
+        return "json"
+    if args.output:
+        return "csv"
+    return "table"
+
+
+def write_table(df, output=None, fmt="table", index=False):
+    """
+    Write a DataFrame to a file or stdout.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Table to write
+    output : str, optional
+        Destination file (stdout if None)
+    fmt : str, default="table"
+        'table' (aligned text), 'csv' or 'json' (list of row objects)
+    index : bool, default=False
+        Include the index (used for receptor x feature matrices)
+    """
+    if fmt == "csv":
+        text = df.to_csv(index=index)
+    elif fmt == "json":
+        text = (df.reset_index() if index else df).to_json(orient="records", indent=1) + "\n"
+    elif fmt == "table":
+        text = df.to_string(index=index) + "\n"
+    else:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of {OUTPUT_FORMATS}")
+
+    if output is None:
+        sys.stdout.write(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text)
+
+
+def _run_neighbors(api, args):
+    neighbors_df, truncated = api.neighbors(
+        args.receptor, threshold=args.threshold, radius=args.radius, top_k=args.top_k,
+        max_nodes=args.max_nodes or None, data_dir=args.data_dir
+    )
+    if truncated:
+        print(f"Neighborhood truncated at {args.max_nodes} nodes", file=sys.stderr)
+    return neighbors_df, False
+
+
+def _run_rank(api, args):
+    return api.rank(args.receptor, top_n=args.top_n, data_dir=args.data_dir,
+                    approximate=args.approximate, probes=args.probes, metric=args.metric,
+                    response_threshold=args.response_threshold), False
+
+
+def _run_propagate(api, args):
+    predicted_df, report = api.propagate(
+        data_dir=args.data_dir, alpha=args.alpha, cutoff=args.cutoff,
+        method=args.method, knn=args.knn
+    )
+    status = "converged" if report['converged'] else "did not converge"
+    print(f"{report['method']}: {status} after {report['iterations']} iterations "
+          f"in {report['seconds']:.3f} s", file=sys.stderr)
+    return predicted_df, True
+
+
+def _run_export(api, args):
+    if args.what == "edges":
+        return api.export_edges(threshold=args.threshold, data_dir=args.data_dir), False
+    matches_df, report = api.export_matches(top_k=args.top_k, data_dir=args.data_dir,
+                                            workers=args.workers)
+    print(f"Scored {report['receptors']} receptors x {report['chemicals']} chemicals "
+          f"in {report['seconds']:.3f} s", file=sys.stderr)
+    return matches_df, False
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Headless AROMA analyses.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    parser.add_argument("--output", help="Write the result to this file instead of stdout")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="Output format")
+    parser.add_argument("--timing", action="store_true", help="Print the wall time to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    neighbors = commands.add_parser("neighbors", help="Structural neighbors of a receptor")
+    neighbors.add_argument("receptor")
+    neighbors.add_argument("--threshold", type=float, default=85)
+    neighbors.add_argument("--radius", type=int, default=1)
+    neighbors.add_argument("--top-k", type=int, help="The k most similar receptors instead of a radius")
+    neighbors.add_argument("--max-nodes", type=int, default=300, help="Node cap (0 = no cap)")
+    neighbors.set_defaults(run=_run_neighbors)
+
+    rank = commands.add_parser("rank", help="Chemicals best matching a receptor")
+    rank.add_argument("receptor")
+    rank.add_argument("--top-n", type=int, default=10)
+    rank.add_argument("--approximate", action="store_true", help="Search through the ANN index")
+    rank.add_argument("--probes", type=int, help="Index cells scanned (with --approximate)")
+    rank.add_argument("--metric", choices=["cosine", "tanimoto", "dice"], default="cosine")
+    rank.add_argument("--response-threshold", type=float, default=0.5,
+                      help="Receptor fingerprint threshold (tanimoto, dice)")
+    rank.set_defaults(run=_run_rank)
+
+    propagate = commands.add_parser("propagate", help="Propagate seed labels over the network")
+    propagate.add_argument("--alpha", type=float, default=0.9)
+    propagate.add_argument("--cutoff", type=float, default=85)
+    propagate.add_argument("--method", choices=["iterative", "cg", "direct"], default="iterative")
+    propagate.add_argument("--knn", type=int, help="Keep only the k most similar neighbors per receptor")
+    propagate.set_defaults(run=_run_propagate)
+
+    export = commands.add_parser("export", help="Export the network edge list or all top matches")
+    export.add_argument("what", choices=["edges", "matches"])
+    export.add_argument("--threshold", type=float, default=85, help="Edge threshold (edges)")
+    export.add_argument("--top-k", type=int, default=10, help="Matches per receptor (matches)")
+    export.add_argument("--workers", type=int, default=1, help="Worker threads (matches)")
+    export.set_defaults(run=_run_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start_time = time.perf_counter()
+
+    # Heavy imports happen only once a command actually runs
+    from src import api
+
+    try:
+        df, index = args.run(api, args)
+    except (ValueError, FileNotFoundError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    write_table(df, args.output, _output_format(args), index=index)
+
+    if args.timing:
+        print(f"{args.command}: {time.perf_counter() - start_time:.3f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
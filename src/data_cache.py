@@ -0,0 +1,354 @@
+"""
+Central, process-wide cache for the datasets and derived structures used by the app.
+
+Every entry is keyed by the source file paths and their modification times,
+so editing a data file invalidates the entries built from it. Entries share a
+memory budget (AROMA_CACHE_MB, default 1024 MB) with least-recently-used
+eviction, and the cache keeps hit/miss counters.
+
+Inside a running Streamlit app the cache object is held by st.cache_resource,
+so it is shared by all sessions. Elsewhere (scripts, CLIs, workers) it is a
+plain module-level instance.
+
+Cached objects are shared between callers and must be treated as read-only.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from src.perf import stage
+
+# Loaders are imported by the functions that use them, so importing this module
+# (e.g. for the image manifest) does not pull in pandas, scipy or networkx.
+
+DEFAULT_BUDGET_MB = 1024
+
+RESPONSE_FILENAMES = (
+    "receptor_fragment_ligand_matrix_filtered.csv",
+    "cas_features_filtered.csv",
+    "propagated_labels_complete.csv"
+)
+
+
+def estimate_size(obj):
+    """
+    Rough in-memory size of a cached object in bytes.
+
+    Parameters:
+    -----------
+    obj : object
+        DataFrame, array, graph, dict of those, or any object with array attributes
+
+    Returns:
+    --------
+    int
+        Estimated size in bytes
+    """
+    # A cached DataFrame, array or graph means its library is already imported
+    pd = sys.modules.get("pandas")
+    np = sys.modules.get("numpy")
+    nx = sys.modules.get("networkx")
+    if pd is not None and isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(index=True, deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    if np is not None and isinstance(obj, np.memmap):
+        return 0  # Paged in from disk on demand, not held by the cache
+    if np is not None and isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(estimate_size(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_size(value) for value in obj)
+    if nx is not None and isinstance(obj, nx.Graph):
+        # dict-of-dicts storage, a few hundred bytes per node and edge
+        return 300 * (obj.number_of_nodes() + 2 * obj.number_of_edges())
+    if hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + estimate_size(vars(obj))
+    return sys.getsizeof(obj)
+
+
+class DataCache:
+    """
+    Thread-safe LRU cache with a memory budget and hit/miss counters.
+
+    Parameters:
+        budget_bytes (int): Total estimated size above which the least recently
+            used entries are evicted. The newest entry is always kept.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._latest = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._counts = {}
+
+    def get_or_build(self, name, paths, params, builder):
+        """
+        Return the cached value for (name, paths, params), building it on a miss.
+
+        Parameters:
+            name (str): Kind of object, e.g. 'similarity_matrix'
+            paths (tuple): Source files; their mtimes are part of the key
+            params (tuple): Any other hashable parameters of the builder
+            builder (callable): Zero-argument function that creates the value
+
+        Returns:
+            object: The cached or newly built value
+        """
+        abs_paths = tuple(os.path.abspath(p) for p in paths)
+        mtimes = tuple(os.stat(p).st_mtime_ns for p in abs_paths)
+        slot = (name, abs_paths, params)
+        key = slot + (mtimes,)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._count(name, hit=True)
+                return entry[0]
+            self._count(name, hit=False)
+
+        # Build outside the lock so slow loads don't block other datasets
+        with stage(f"cache.build.{name}"):
+            value = builder()
+        size = estimate_size(value)
+
+        with self._lock:
+            # Drop the entry built from an older version of the same files
+            stale_key = self._latest.get(slot)
+            if stale_key is not None and stale_key != key:
+                self._remove(stale_key)
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self._total_bytes += size
+            self._latest[slot] = key
+            self._evict()
+        return value
+
+    def clear(self):
+        """Remove every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: hits, misses, evictions, hit_rate, entries, total_bytes,
+            budget_bytes and per-name {'hits', 'misses'} under 'by_name'
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'budget_bytes': self.budget_bytes,
+                'by_name': {name: dict(counts) for name, counts in self._counts.items()}
+            }
+
+    def _count(self, name, hit):
+        counts = self._counts.setdefault(name, {'hits': 0, 'misses': 0})
+        if hit:
+            self.hits += 1
+            counts['hits'] += 1
+        else:
+            self.misses += 1
+            counts['misses'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def _evict(self):
+        while self._total_bytes > self.budget_bytes and len(self._entries) > 1:
+            key, (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            slot = key[:3]
+            if self._latest.get(slot) == key:
+                del self._latest[slot]
+
+
+def _new_cache():
+    budget_mb = float(os.environ.get("AROMA_CACHE_MB", DEFAULT_BUDGET_MB))
+    return DataCache(int(budget_mb * 1024 * 1024))
+
+
+_PROCESS_CACHE = None
+_STREAMLIT_FACTORY = None
+
+
+def _streamlit_cache(st):
+    """The DataCache held by Streamlit's resource cache."""
+    global _STREAMLIT_FACTORY
+    if _STREAMLIT_FACTORY is None:
+        _STREAMLIT_FACTORY = st.cache_resource(show_spinner=False)(_new_cache)
+    return _STREAMLIT_FACTORY()
+
+
+def get_data_cache():
+    """
+    Return the process-wide DataCache.
+
+    Inside a running Streamlit app the instance is created through
+    st.cache_resource, so it is shared across sessions and cleared together
+    with Streamlit's resource cache.
+    """
+    global _PROCESS_CACHE
+    st = sys.modules.get("streamlit")
+    if st is not None and st.runtime.exists():
+        return _streamlit_cache(st)
+    if _PROCESS_CACHE is None:
+        _PROCESS_CACHE = _new_cache()
+    return _PROCESS_CACHE
+
+
+def cached_similarity_matrix(file_path):
+    """Cached load_similarity_matrix."""
+    from src.network_explorer.data_loader import load_similarity_matrix
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    return get_data_cache().get_or_build(
+        'similarity_matrix', (file_path,), (),
+        lambda: load_similarity_matrix(file_path)
+    )
+
+
+def cached_edge_index(file_path, min_threshold=None):
+    """Cached ThresholdEdgeIndex for a similarity matrix file."""
+    from src.network_explorer.network import ThresholdEdgeIndex
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    return get_data_cache().get_or_build(
+        'edge_index', (file_path,), (min_threshold,),
+        lambda: ThresholdEdgeIndex(cached_similarity_matrix(file_path), min_threshold=min_threshold)
+    )
+
+
+def cached_protein_network(file_path, threshold=85):
+    """Cached protein network at a threshold, built from the cached edge index."""
+    return get_data_cache().get_or_build(
+        'protein_network', (file_path,), (threshold,),
+        lambda: cached_edge_index(file_path).create_network(threshold)
+    )
+
+
+def cached_global_layout(file_path, threshold, method="stress", edge_index=None):
+    """
+    Cached load_global_layout (persisted to disk, computed once per threshold).
+
+    A layout already on disk is read without building the network. On a miss
+    the network is built from edge_index (pass the caller's cached index so no
+    second one is created), or from a new index bounded at the threshold.
+    """
+    from src.network_explorer.layout import load_global_layout
+
+    return get_data_cache().get_or_build(
+        'global_layout', (file_path,), (threshold, method),
+        lambda: load_global_layout(file_path, threshold, method=method, edge_index=edge_index)
+    )
+
+
+def cached_neighborhood_layout(file_path, threshold, central_protein, ego, view=1, method="stress",
+                               edge_index=None):
+    """
+    Cached layout of a protein's neighborhood, keyed by (protein, threshold, view).
+
+    view is any hashable description of which neighborhood ego is, e.g. a
+    radius or ('top_k', 20).
+
+    The layout reuses the global coordinates. Neighborhoods too crowded to read are
+    re-laid out locally, and that result stays in the LRU cache for later reruns.
+    edge_index is passed to cached_global_layout.
+    """
+    from src.network_explorer.layout import neighborhood_layout
+
+    return get_data_cache().get_or_build(
+        'neighborhood_layout', (file_path,), (threshold, method, central_protein, view),
+        lambda: neighborhood_layout(
+            ego, cached_global_layout(file_path, threshold, method, edge_index=edge_index)
+        )[0]
+    )
+
+
+def cached_response_explorer_data(data_dir="data"):
+    """Cached load_response_explorer_data."""
+    from src.response_explorer.data_loader import load_response_explorer_data
+
+    paths = tuple(os.path.join(data_dir, filename) for filename in RESPONSE_FILENAMES)
+    for filepath in paths:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Required file not found: {filepath}")
+    return get_data_cache().get_or_build(
+        'response_explorer_data', paths, (),
+        lambda: load_response_explorer_data(data_dir=data_dir)
+    )
+
+
+def cached_reverse_index(data_dir="data"):
+    """Cached load_reverse_index, rebuilt when either of its input files changes."""
+    from src.response_explorer.reverse_lookup import CAS_FILENAME, PREDICTED_FILENAME, load_reverse_index
+
+    paths = tuple(os.path.join(data_dir, filename) for filename in (PREDICTED_FILENAME, CAS_FILENAME))
+    for filepath in paths:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Required file not found: {filepath}")
+    return get_data_cache().get_or_build(
+        'reverse_index', paths, (),
+        lambda: load_reverse_index(data_dir=data_dir)
+    )
+
+
+def cached_chemical_tree(data_dir="data"):
+    """Cached load_chemical_tree (persisted to disk, built once per chemical file)."""
+    from src.response_explorer.chemical_tree import CAS_FILENAME, load_chemical_tree
+
+    cas_path = os.path.join(data_dir, CAS_FILENAME)
+    if not os.path.exists(cas_path):
+        raise FileNotFoundError(f"Required file not found: {cas_path}")
+    return get_data_cache().get_or_build(
+        'chemical_tree', (cas_path,), (),
+        lambda: load_chemical_tree(data_dir=data_dir)
+    )
+
+
+def cached_ann_index(data_dir="data"):
+    """Cached load_ann_index (persisted to disk, built once per chemical file)."""
+    from src.response_explorer.ann_index import CAS_FILENAME, load_ann_index
+
+    cas_path = os.path.join(data_dir, CAS_FILENAME)
+    if not os.path.exists(cas_path):
+        raise FileNotFoundError(f"Required file not found: {cas_path}")
+    return get_data_cache().get_or_build(
+        'ann_index', (cas_path,), (),
+        lambda: load_ann_index(data_dir=data_dir)
+    )
+
+
+def cached_fingerprint_store(data_dir="data"):
+    """Cached load_fingerprint_store (memory-mapped, built once per chemical file)."""
+    from src.response_explorer.fingerprints import CAS_FILENAME, load_fingerprint_store
+
+    cas_path = os.path.join(data_dir, CAS_FILENAME)
+    if not os.path.exists(cas_path):
+        raise FileNotFoundError(f"Required file not found: {cas_path}")
+    return get_data_cache().get_or_build(
+        'fingerprint_store', (cas_path,), (),
+        lambda: load_fingerprint_store(data_dir=data_dir)
+    )
@@ -1,20 +1,141 @@
-import pandas as pd
+import json
 import os
 
-def load_similarity_matrix(file_path):
+import numpy as np
+import pandas as pd
+
+from src.perf import timed
+
+def get_binary_paths(file_path):
+    """
+    Get the paths of the binary similarity store that belongs to a CSV file.
+    
+    Parameters:
+        file_path (str): Path to the CSV file containing the similarity matrix
+        
+    Returns:
+        tuple: (path of the float32 .npy matrix, path of the receptor-ID sidecar)
+    """
+    base, _ = os.path.splitext(file_path)
+    return base + ".npy", base + ".ids.json"
+
+@timed
+def convert_similarity_matrix(file_path):
+    """
+    Convert a CSV similarity matrix into a float32 .npy file plus a JSON sidecar
+    holding the receptor IDs and the modification time of the source CSV.
+    
+    Files are written to temporary names and moved into place, so processes
+    reading the store never see a partially written matrix.
+    
+    Parameters:
+        file_path (str): Path to the CSV file containing the similarity matrix
+        
+    Returns:
+        str: Path to the written .npy matrix
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    matrix_path, ids_path = get_binary_paths(file_path)
+    source_stat = os.stat(file_path)
+    
+    # Non-numeric cells become NaN, which the network builders skip
+    similarity_df = pd.read_csv(file_path, index_col=0)
+    values = similarity_df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+    
+    # Write the matrix first; the sidecar marks the store as complete
+    tmp_matrix_path = f"{matrix_path}.{os.getpid()}.tmp"
+    with open(tmp_matrix_path, "wb") as f:
+        np.save(f, values)
+    os.replace(tmp_matrix_path, matrix_path)
+    
+    sidecar = {
+        'source_mtime_ns': source_stat.st_mtime_ns,
+        'source_size': source_stat.st_size,
+        'index_name': similarity_df.index.name,
+        'index': similarity_df.index.astype(str).tolist(),
+        'columns': similarity_df.columns.astype(str).tolist()
+    }
+    tmp_ids_path = f"{ids_path}.{os.getpid()}.tmp"
+    with open(tmp_ids_path, "w") as f:
+        json.dump(sidecar, f)
+    os.replace(tmp_ids_path, ids_path)
+    
+    return matrix_path
+
+def _read_current_sidecar(file_path):
+    """Return the sidecar dict if the binary store matches the CSV, otherwise None."""
+    matrix_path, ids_path = get_binary_paths(file_path)
+    if not (os.path.exists(matrix_path) and os.path.exists(ids_path)):
+        return None
+    try:
+        with open(ids_path) as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    source_stat = os.stat(file_path)
+    if (sidecar.get('source_mtime_ns') != source_stat.st_mtime_ns
+            or sidecar.get('source_size') != source_stat.st_size):
+        return None
+    return sidecar
+
+def load_binary_similarity_matrix(file_path):
+    """
+    Open the memory-mapped binary store for a CSV similarity matrix,
+    (re)building it when it is missing or older than the CSV.
+    
+    The matrix is opened read-only with mmap, so processes on the same machine
+    share the operating system's page cache instead of each parsing the CSV.
+    
+    Parameters:
+        file_path (str): Path to the CSV file containing the similarity matrix
+        
+    Returns:
+        pandas.DataFrame or None: Read-only similarity matrix backed by the memmap,
+        or None if the store could not be built (e.g. read-only data directory)
+    """
+    sidecar = _read_current_sidecar(file_path)
+    if sidecar is None:
+        try:
+            convert_similarity_matrix(file_path)
+        except OSError:
+            return None
+        sidecar = _read_current_sidecar(file_path)
+        if sidecar is None:
+            return None
+    
+    matrix_path, _ = get_binary_paths(file_path)
+    values = np.load(matrix_path, mmap_mode='r')
+    index = pd.Index(sidecar['index'], name=sidecar['index_name'])
+    return pd.DataFrame(values, index=index, columns=sidecar['columns'], copy=False)
+
+@timed
+def load_similarity_matrix(file_path, use_binary=True):
     """
     Load the similarity matrix from a CSV file.
     
+    By default the matrix is served from a memory-mapped float32 copy of the CSV,
+    which is created on first use and rebuilt whenever the CSV changes. The CSV is
+    parsed directly if the binary store cannot be written.
+    
     Parameters:
         file_path (str): Path to the CSV file containing the similarity matrix
+        use_binary (bool): Use the memory-mapped binary store when possible
         
     Returns:
         pandas.DataFrame: The loaded similarity matrix
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
+    
+    if use_binary:
+        similarity_df = load_binary_similarity_matrix(file_path)
+        if similarity_df is not None:
+            return similarity_df
         
     # Load the similarity matrix
     similarity_df = pd.read_csv(file_path, index_col=0)
     
-    return similarity_df
\ No newline at end of file
+    return similarity_df
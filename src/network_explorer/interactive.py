@@ -0,0 +1,187 @@
+"""
+Interactive, browser-side rendering of a protein neighborhood.
+
+The neighborhood is sent to the browser as compact JSON: node names, rounded
+coordinates, and edges as a flat index array with their weights. A small
+self-contained canvas renderer draws it and handles pan, zoom and hover on
+the client. The server does no rasterization, and nothing is loaded from a
+CDN.
+"""
+import json
+
+import networkx as nx
+
+from src.perf import timed
+
+RENDERERS = ("Static (matplotlib)", "Interactive (browser)")
+
+_TEMPLATE = """
+<div id="aroma-net" style="position:relative;width:100%;height:__HEIGHT__px;border:1px solid #e1e4e8;border-radius:6px;">
+  <canvas id="aroma-canvas" style="width:100%;height:100%;cursor:grab;"></canvas>
+  <div id="aroma-tip" style="position:absolute;display:none;pointer-events:none;background:rgba(255,255,255,0.95);
+       border:1px solid #ccc;border-radius:4px;padding:4px 8px;font:12px sans-serif;white-space:nowrap;"></div>
+  <div style="position:absolute;right:8px;bottom:6px;font:11px sans-serif;color:#888;">
+    scroll to zoom &middot; drag to pan &middot; double-click to reset</div>
+</div>
+<script>
+(function() {
+  const data = __DATA__;
+  const canvas = document.getElementById("aroma-canvas");
+  const tip = document.getElementById("aroma-tip");
+  const ctx = canvas.getContext("2d");
+  const n = data.n.length, m = data.w.length;
+  const degree = new Array(n).fill(0), centerWeight = new Array(n).fill(null);
+  for (let k = 0; k < m; k++) {
+    const i = data.e[2 * k], j = data.e[2 * k + 1];
+    degree[i]++; degree[j]++;
+    if (i === data.c) centerWeight[j] = data.w[k];
+    if (j === data.c) centerWeight[i] = data.w[k];
+  }
+  let width = 0, height = 0, scale = 1, tx = 0, ty = 0, hover = -1, drag = null;
+
+  function resize() {
+    const dpr = window.devicePixelRatio || 1;
+    width = canvas.clientWidth; height = canvas.clientHeight;
+    canvas.width = width * dpr; canvas.height = height * dpr;
+    ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+  }
+  function reset() { scale = 0.45 * Math.min(width, height); tx = width / 2; ty = height / 2; }
+  function sx(i) { return tx + scale * data.x[i]; }
+  function sy(i) { return ty - scale * data.y[i]; }
+
+  function draw() {
+    ctx.clearRect(0, 0, width, height);
+    ctx.lineWidth = 1;
+    for (let k = 0; k < m; k++) {
+      const i = data.e[2 * k], j = data.e[2 * k + 1];
+      const active = hover >= 0 && (i === hover || j === hover);
+      ctx.strokeStyle = active ? "rgba(255,99,71,0.9)" : "rgba(160,160,160,0.35)";
+      ctx.beginPath(); ctx.moveTo(sx(i), sy(i)); ctx.lineTo(sx(j), sy(j)); ctx.stroke();
+    }
+    const showLabels = n <= 60 || scale > 900;
+    ctx.font = "bold 10px sans-serif"; ctx.textAlign = "center";
+    for (let i = 0; i < n; i++) {
+      const r = i === data.c ? 8 : 5;
+      ctx.fillStyle = i === data.c ? "red" : (i === hover ? "tomato" : "blue");
+      ctx.beginPath(); ctx.arc(sx(i), sy(i), r, 0, 2 * Math.PI); ctx.fill();
+      if (showLabels || i === data.c || i === hover) {
+        ctx.fillStyle = "black"; ctx.fillText(data.n[i], sx(i), sy(i) - r - 3);
+      }
+    }
+  }
+
+  function nearest(px, py) {
+    let best = -1, bestDist = 100;
+    for (let i = 0; i < n; i++) {
+      const d = (sx(i) - px) ** 2 + (sy(i) - py) ** 2;
+      if (d < bestDist) { best = i; bestDist = d; }
+    }
+    return best;
+  }
+
+  canvas.addEventListener("wheel", function(ev) {
+    ev.preventDefault();
+    const f = Math.exp(-ev.deltaY * 0.0015);
+    tx = ev.offsetX - (ev.offsetX - tx) * f; ty = ev.offsetY - (ev.offsetY - ty) * f; scale *= f;
+    draw();
+  }, {passive: false});
+  canvas.addEventListener("mousedown", function(ev) {
+    drag = {x: ev.offsetX, y: ev.offsetY, tx: tx, ty: ty}; canvas.style.cursor = "grabbing";
+  });
+  window.addEventListener("mouseup", function() { drag = null; canvas.style.cursor = "grab"; });
+  canvas.addEventListener("mousemove", function(ev) {
+    if (drag) {
+      tx = drag.tx + ev.offsetX - drag.x; ty = drag.ty + ev.offsetY - drag.y; draw(); return;
+    }
+    const i = nearest(ev.offsetX, ev.offsetY);
+    if (i !== hover) {
+      hover = i; draw();
+      if (i < 0) { tip.style.display = "none"; return; }
+      let text = "<b>" + data.n[i] + "</b><br>neighbors shown: " + degree[i];
+      if (centerWeight[i] !== null) text += "<br>similarity to " + data.n[data.c] + ": " + centerWeight[i].toFixed(2);
+      tip.innerHTML = text; tip.style.display = "block";
+    }
+    if (i >= 0) { tip.style.left = (ev.offsetX + 12) + "px"; tip.style.top = (ev.offsetY + 12) + "px"; }
+  });
+  canvas.addEventListener("mouseleave", function() { hover = -1; tip.style.display = "none"; draw(); });
+  canvas.addEventListener("dblclick", function() { reset(); draw(); });
+  window.addEventListener("resize", function() { resize(); reset(); draw(); });
+
+  resize(); reset(); draw();
+})();
+</script>
+"""
+
+
+def neighborhood_payload(ego, central_protein, pos=None):
+    """
+    Compact JSON-ready arrays describing a neighborhood.
+
+    Parameters:
+        ego (networkx.Graph): Ego graph representing the neighborhood
+        central_protein (str): The central protein
+        pos (dict, optional): Node positions; a spring layout is computed when omitted
+
+    Returns:
+        dict: 'n' node names, 'x'/'y' coordinates, 'e' flat edge endpoint
+        indices, 'w' edge weights and 'c' the index of the central protein
+    """
+    if pos is None:
+        pos = nx.spring_layout(ego, seed=42)
+    nodes = list(ego.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+
+    edges, weights = [], []
+    for u, v, weight in ego.edges(data='weight', default=0):
+        edges += [position[u], position[v]]
+        weights.append(round(float(weight), 2))
+
+    return {
+        'n': [str(node) for node in nodes],
+        'x': [round(float(pos[node][0]), 4) for node in nodes],
+        'y': [round(float(pos[node][1]), 4) for node in nodes],
+        'e': edges,
+        'w': weights,
+        'c': position[central_protein]
+    }
+
+
+@timed
+def neighborhood_html(ego, central_protein, pos=None, height=650):
+    """
+    Self-contained HTML/JS page that renders a neighborhood on a canvas.
+
+    Parameters:
+        ego (networkx.Graph): Ego graph representing the neighborhood
+        central_protein (str): The central protein
+        pos (dict, optional): Node positions
+        height (int): Height of the canvas in pixels
+
+    Returns:
+        str: HTML to embed in an iframe (st.iframe)
+    """
+    payload = json.dumps(neighborhood_payload(ego, central_protein, pos), separators=(',', ':'))
+    # Keep "</script>" in node names from closing the script block
+    payload = payload.replace("</", "<\\/")
+    return _TEMPLATE.replace("__HEIGHT__", str(int(height))).replace("__DATA__", payload)
+
+
+def render_interactive_neighborhood(ego, central_protein, pos=None, height=650):
+    """
+    Render a neighborhood in the browser (pan, zoom and hover run client-side).
+
+    Parameters:
+        ego (networkx.Graph): Ego graph representing the neighborhood
+        central_protein (str): The central protein
+        pos (dict, optional): Node positions
+        height (int): Height of the canvas in pixels
+    """
+    import streamlit as st
+
+    html = neighborhood_html(ego, central_protein, pos, height=height)
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=height + 10)
+    else:
+        # Streamlit releases allowed by requirement.txt that predate st.iframe
+        import streamlit.components.v1 as components
+        components.html(html, height=height + 10)
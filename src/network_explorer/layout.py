@@ -0,0 +1,293 @@
+"""
+Precomputed node layouts for the protein network.
+
+One global layout of the full network is computed per similarity threshold and
+persisted next to the similarity matrix. A neighborhood plot reuses the global
+coordinates of its nodes and does no layout work. When those coordinates put
+too many nodes on top of each other, the neighborhood is re-laid out locally.
+Callers keep that result in an LRU cache (see
+src.data_cache.cached_neighborhood_layout), so it is computed once.
+
+The default 'stress' layout places every connected component by stress
+majorization of its hop distances, so nodes keep a readable spacing inside
+dense clusters. The command line reports how many neighborhoods still need
+the local re-layout (fallback_rate).
+
+Command line usage (from the repository root):
+    python -m src.network_explorer.layout --thresholds 75 80 85 90 95 --method stress
+"""
+import argparse
+import os
+import time
+
+import networkx as nx
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+
+from src.network_explorer.data_loader import load_similarity_matrix
+from src.network_explorer.network import ThresholdEdgeIndex, get_neighborhood
+from src.perf import timed
+
+LAYOUT_METHODS = ("stress", "spring", "spectral", "kamada_kawai")
+DEFAULT_METHOD = "stress"
+
+
+def _stress_component(G, iterations):
+    """
+    Stress majorization (SMACOF) of one connected graph on its hop distances.
+
+    Starts from classical MDS of the distances. Uses dense n x n matrices, so it
+    suits components of up to a few thousand nodes.
+    """
+    nodes = list(G)
+    n = len(nodes)
+    if n <= 2:
+        return {node: np.array([float(i), 0.0]) for i, node in enumerate(nodes)}
+    D = shortest_path(nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None),
+                      directed=False, unweighted=True)
+
+    # Classical MDS: top two eigenvectors of the double-centered squared distances
+    centering = np.eye(n) - 1.0 / n
+    values, vectors = np.linalg.eigh(-0.5 * centering @ (D ** 2) @ centering)
+    X = vectors[:, -2:] * np.sqrt(np.maximum(values[-2:], 1e-9))
+
+    # Guttman transform with weights 1 / d^2
+    W = np.divide(1.0, D ** 2, out=np.zeros_like(D), where=D > 0)
+    laplacian = np.diag(W.sum(axis=1)) - W
+    laplacian_pinv = np.linalg.pinv(laplacian)
+    for _ in range(iterations):
+        E = np.sqrt(((X[:, None, :] - X[None, :, :]) ** 2).sum(axis=-1))
+        Bz = np.divide(-W * D, E, out=np.zeros_like(D), where=E > 0)
+        np.fill_diagonal(Bz, 0.0)
+        np.fill_diagonal(Bz, -Bz.sum(axis=1))
+        X = laplacian_pinv @ (Bz @ X)
+    return dict(zip(nodes, X))
+
+
+@timed
+def stress_layout(G, iterations=100):
+    """
+    Stress-majorization layout, one connected component per grid cell.
+
+    Parameters:
+        G (networkx.Graph): Graph to lay out
+        iterations (int): SMACOF iterations per component
+
+    Returns:
+        dict: Node -> numpy array of (x, y), scaled to [-1, 1]
+    """
+    components = sorted(nx.connected_components(G), key=len, reverse=True)
+    side = max(1, int(np.ceil(np.sqrt(len(components)))))
+    pos = {}
+    for i, component in enumerate(components):
+        component_pos = _stress_component(G.subgraph(component), iterations)
+        if len(component) > 1:
+            component_pos = nx.rescale_layout_dict(component_pos, scale=0.45)
+        offset = np.array([i % side, i // side], dtype=float)
+        for node, xy in component_pos.items():
+            pos[node] = np.asarray(xy, dtype=float) + offset
+    return nx.rescale_layout_dict(pos, scale=1) if len(pos) > 1 else pos
+
+
+@timed
+def compute_layout(G, method="spring", seed=42):
+    """
+    Compute a 2D layout of a graph.
+
+    Parameters:
+        G (networkx.Graph): Graph to lay out
+        method (str): 'stress' (stress majorization of hop distances, best
+            spacing in dense clusters), 'spring' (Fruchterman-Reingold),
+            'spectral' (fastest) or 'kamada_kawai' (slowest)
+        seed (int): Random seed for the spring layout
+
+    Returns:
+        dict: Node -> numpy array of (x, y), scaled to [-1, 1]
+    """
+    if method == "stress":
+        return stress_layout(G)
+    if method == "spring":
+        return nx.spring_layout(G, seed=seed)
+    if method == "spectral":
+        return nx.spectral_layout(G)
+    if method == "kamada_kawai":
+        return nx.kamada_kawai_layout(G)
+    raise ValueError(f"Unknown layout method '{method}', expected one of {LAYOUT_METHODS}")
+
+
+def get_layout_path(file_path, threshold, method=DEFAULT_METHOD):
+    """Path of the persisted global layout for a similarity matrix, threshold and method."""
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.layout_t{threshold:g}_{method}.npz"
+
+
+def _source_stamp(file_path):
+    stat = os.stat(file_path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def save_layout(pos, layout_path, source_stamp):
+    """
+    Write a layout to an .npz file, replacing any existing file atomically.
+
+    Parameters:
+        pos (dict): Node -> (x, y)
+        layout_path (str): Destination .npz file
+        source_stamp (numpy.ndarray): (mtime_ns, size) of the similarity matrix
+    """
+    nodes = np.asarray([str(node) for node in pos], dtype=str)
+    coords = np.array([pos[node] for node in pos], dtype=float).reshape(-1, 2)
+    tmp_path = f"{layout_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, nodes=nodes, coords=coords, source_stamp=source_stamp)
+    os.replace(tmp_path, layout_path)
+
+
+def _read_layout(layout_path, source_stamp):
+    """Load a persisted layout, or return None if it is missing, unreadable or stale."""
+    if not os.path.exists(layout_path):
+        return None
+    try:
+        with np.load(layout_path, allow_pickle=False) as data:
+            if not np.array_equal(data['source_stamp'], source_stamp):
+                return None
+            return dict(zip(data['nodes'].tolist(), data['coords']))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+@timed
+def load_global_layout(file_path, threshold, method=DEFAULT_METHOD, edge_index=None, seed=42):
+    """
+    Load the global layout of the network at a threshold, computing it if needed.
+
+    Parameters:
+        file_path (str): Path to the similarity matrix CSV
+        threshold (float): Similarity threshold of the network
+        method (str): Layout algorithm (see compute_layout)
+        edge_index (ThresholdEdgeIndex, optional): Index covering the threshold, used
+            to build the network if the layout is not on disk (defaults to a new one
+            indexing only the pairs at or above the threshold)
+        seed (int): Random seed for the spring layout
+
+    Returns:
+        dict: Protein -> numpy array of (x, y)
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    layout_path = get_layout_path(file_path, threshold, method)
+    source_stamp = _source_stamp(file_path)
+
+    pos = _read_layout(layout_path, source_stamp)
+    if pos is not None:
+        return pos
+
+    if edge_index is None:
+        edge_index = ThresholdEdgeIndex(load_similarity_matrix(file_path), min_threshold=threshold)
+    pos = compute_layout(edge_index.create_network(threshold), method=method, seed=seed)
+
+    try:
+        save_layout(pos, layout_path, source_stamp)
+    except OSError:
+        pass  # Read-only data directory: keep the layout in memory only
+    return pos
+
+
+def overlap_fraction(pos, min_spacing=0.03):
+    """
+    Fraction of nodes whose nearest neighbor is closer than min_spacing.
+
+    Parameters:
+        pos (dict): Node -> (x, y), scaled to [-1, 1]
+        min_spacing (float): Minimum distance for nodes (and labels) to stay readable
+
+    Returns:
+        float: Fraction between 0 and 1
+    """
+    from scipy.spatial import cKDTree
+
+    if len(pos) < 2:
+        return 0.0
+    coords = np.array(list(pos.values()), dtype=float)
+    distances, _ = cKDTree(coords).query(coords, k=2)
+    return float(np.mean(distances[:, 1] < min_spacing))
+
+
+@timed
+def neighborhood_layout(ego, global_pos, spacing=0.25, max_overlap=0.2, seed=42):
+    """
+    Layout of a neighborhood taken from the global layout.
+
+    The global coordinates of the neighborhood's nodes are rescaled to fill
+    the plot. If too many nodes still crowd each other, the neighborhood is
+    laid out locally with the same spring layout the plot used before.
+
+    Parameters:
+        ego (networkx.Graph): Neighborhood graph
+        global_pos (dict): Global layout of the full network
+        spacing (float): Minimum readable node distance as a fraction of the
+            typical spacing 1/sqrt(n) of n nodes in the plot
+        max_overlap (float): Largest acceptable fraction of crowded nodes
+        seed (int): Random seed for the local re-layout
+
+    Returns:
+        tuple: (dict of node -> (x, y), bool whether a local re-layout was done)
+    """
+    if any(node not in global_pos for node in ego):
+        return compute_layout(ego, seed=seed), True
+
+    pos = {node: np.asarray(global_pos[node], dtype=float) for node in ego}
+    if len(pos) > 1:
+        pos = nx.rescale_layout_dict(pos, scale=1)
+    if overlap_fraction(pos, spacing / np.sqrt(len(pos))) <= max_overlap:
+        return pos, False
+
+    return compute_layout(ego, seed=seed), True
+
+
+def fallback_rate(edge_index, threshold, global_pos, radius=1):
+    """
+    Fraction of neighborhoods (3 or more nodes) that need a local re-layout.
+
+    Parameters:
+        edge_index (ThresholdEdgeIndex): Edge index of the network
+        threshold (float): Similarity threshold of the network
+        global_pos (dict): Global layout at that threshold
+        radius (int): Neighborhood radius
+
+    Returns:
+        float: Fraction between 0 and 1 (0 if no neighborhood has 3 nodes)
+    """
+    fallbacks = checked = 0
+    for protein in edge_index.proteins.tolist():
+        ego, _, _ = get_neighborhood(edge_index, threshold, protein, radius=radius)
+        if ego.number_of_nodes() < 3:
+            continue
+        checked += 1
+        fallbacks += neighborhood_layout(ego, global_pos)[1]
+    return fallbacks / checked if checked else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute global network layouts per similarity threshold.")
+    parser.add_argument("--similarity", default="data/AllvsAll.csv", help="Similarity matrix CSV")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[75, 80, 85, 90, 95])
+    parser.add_argument("--method", choices=LAYOUT_METHODS, default=DEFAULT_METHOD)
+    args = parser.parse_args(argv)
+
+    edge_index = ThresholdEdgeIndex(load_similarity_matrix(args.similarity),
+                                    min_threshold=min(args.thresholds))
+    for threshold in args.thresholds:
+        start_time = time.perf_counter()
+        G = edge_index.create_network(threshold)
+        pos = compute_layout(G, method=args.method)
+        save_layout(pos, get_layout_path(args.similarity, threshold, args.method),
+                    _source_stamp(args.similarity))
+        seconds = time.perf_counter() - start_time
+        print(f"threshold {threshold:g}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges, "
+              f"{seconds:.2f} s, local re-layout for "
+              f"{fallback_rate(edge_index, threshold, pos):.0%} of radius-1 neighborhoods")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,46 @@
-import networkx as nx
+import threading
+from collections import OrderedDict
+
+# networkx is imported by the functions that build graphs: the edge index and
+# bounded BFS work on numpy/scipy arrays alone
+import numpy as np
 import pandas as pd
+from scipy import sparse
+
+from src.perf import timed
 
+# Largest neighborhood returned by a BFS or top-k query, so a multi-hop view
+# of a hub at a low threshold cannot stall the worker
+DEFAULT_MAX_NODES = 300
+# CSR adjacency matrices kept per edge index (least recently used evicted);
+# the app's threshold slider has 5 steps
+MAX_CACHED_ADJACENCY = 8
+
+def symmetrize_similarity(similarity_df):
+    """
+    Convert a similarity matrix into a max-symmetrized NumPy array.
+    
+    Columns are aligned to the row order and non-numeric cells become NaN,
+    so they never pass a threshold comparison.
+    
+    Parameters:
+        similarity_df (pandas.DataFrame): Similarity matrix
+        
+    Returns:
+        tuple: (numpy.ndarray of protein labels, numpy.ndarray of max-symmetrized scores)
+    """
+    # Align columns to the row order; missing labels become NaN
+    aligned = similarity_df.reindex(columns=similarity_df.index)
+    
+    # Coerce non-numeric entries to NaN only when needed
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in aligned.dtypes):
+        aligned = aligned.apply(pd.to_numeric, errors='coerce')
+    values = aligned.to_numpy(dtype=float)
+    
+    # Use the max of both directions; NaN propagates so the pair is skipped
+    return similarity_df.index.to_numpy(), np.maximum(values, values.T)
+
+@timed
 def create_protein_network(similarity_df, threshold=85):
     """
     Create a protein similarity network where edges represent similarities above threshold.
@@ -12,31 +52,29 @@ def create_protein_network(similarity_df, threshold=85):
     Returns:
         networkx.Graph: The protein similarity network
     """
+    import networkx as nx
+
+    proteins, scores = symmetrize_similarity(similarity_df)
+    
     # Initialize an undirected graph
     G = nx.Graph()
     
     # Add nodes
-    for protein in similarity_df.index:
-        G.add_node(protein)
-    
-    # Add edges for pairs above the threshold, using the max of both directions
-    for i, protein1 in enumerate(similarity_df.index):
-        for j, protein2 in enumerate(similarity_df.columns):
-            if i < j:  # Only process each pair once
-                try:
-                    # Get similarity scores in both directions
-                    score1 = float(similarity_df.loc[protein1, protein2])
-                    score2 = float(similarity_df.loc[protein2, protein1])
-                    max_score = max(score1, score2)
-                    
-                    # Add edge if similarity is above threshold
-                    if max_score >= threshold:
-                        G.add_edge(protein1, protein2, weight=max_score)
-                except Exception:
-                    continue  # Handle missing or non-numeric entries
+    G.add_nodes_from(proteins)
+    
+    # Select each pair above the threshold once (upper triangle, no diagonal)
+    with np.errstate(invalid='ignore'):
+        mask = np.triu(scores >= threshold, k=1)
+    rows, cols = np.nonzero(mask)
+    
+    # Add all edges in bulk
+    G.add_weighted_edges_from(
+        zip(proteins[rows].tolist(), proteins[cols].tolist(), scores[rows, cols].tolist())
+    )
     
     return G
 
+@timed
 def get_protein_neighbors(G, central_protein, radius=1):
     """
     Extract the neighborhood of a protein within a specified radius.
@@ -49,17 +87,329 @@ def get_protein_neighbors(G, central_protein, radius=1):
     Returns:
         tuple: (ego graph, list of (node, distance) tuples)
     """
+    import networkx as nx
+
     # Check if protein exists in the graph
     if central_protein not in G:
         raise ValueError(f"Protein {central_protein} not found in the network")
     
-    # Extract ego graph (neighborhood)
-    ego = nx.ego_graph(G, central_protein, radius=radius)
-    
-    # Get shortest path lengths from the central protein to all nodes in the ego graph
+    # One bounded traversal gives both the distances and the ego graph's nodes
     lengths = nx.single_source_shortest_path_length(G, central_protein, cutoff=radius)
+    ego = G.subgraph(lengths).copy()
     
     # Sort nodes by distance
     sorted_neighbors = sorted(lengths.items(), key=lambda x: x[1])
     
-    return ego, sorted_neighbors
\ No newline at end of file
+    return ego, sorted_neighbors
+
+
+class ThresholdEdgeIndex:
+    """
+    Edges of the symmetrized similarity matrix sorted by weight (descending).
+    
+    The graph at any threshold is the prefix of edges whose weight is at least
+    the threshold, so edge counts are a binary search. Neighborhoods are read
+    from its CSR adjacency by bounded BFS (get_neighborhood). The adjacency
+    matrices of the last MAX_CACHED_ADJACENCY edge counts are memoized, so
+    thresholds selecting the same edges share one matrix. The index is
+    read-only and can be shared between sessions; the memo is updated under
+    a lock.
+    
+    Parameters:
+        similarity_df (pandas.DataFrame): Similarity matrix
+        min_threshold (float, optional): Lowest threshold that will be queried;
+            weaker pairs are not indexed. Defaults to indexing every pair.
+    """
+    
+    @timed
+    def __init__(self, similarity_df, min_threshold=None):
+        self.proteins, scores = symmetrize_similarity(similarity_df)
+        self.min_threshold = min_threshold
+        
+        # Candidate pairs in the upper triangle (NaN cells never qualify)
+        with np.errstate(invalid='ignore'):
+            if min_threshold is None:
+                mask = ~np.isnan(scores)
+            else:
+                mask = scores >= min_threshold
+        rows, cols = np.nonzero(np.triu(mask, k=1))
+        weights = scores[rows, cols]
+        
+        # Sort by weight descending; stable so ties keep matrix order
+        order = np.argsort(-weights, kind='stable')
+        self.rows = rows[order]
+        self.cols = cols[order]
+        self.weights = weights[order]
+        self._neg_weights = -self.weights
+        self._adjacency = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._positions = {protein: i for i, protein in enumerate(self.proteins.tolist())}
+    
+    def number_of_nodes(self):
+        """Return the number of proteins (every protein is a node at any threshold)."""
+        return len(self.proteins)
+    
+    def number_of_edges(self, threshold):
+        """Return the number of edges with weight >= threshold."""
+        if self.min_threshold is not None and threshold < self.min_threshold:
+            raise ValueError(
+                f"Threshold {threshold} is below the indexed minimum {self.min_threshold}"
+            )
+        return int(np.searchsorted(self._neg_weights, -threshold, side='right'))
+    
+    def edges(self, start, stop):
+        """Return (protein1, protein2, weight) tuples for index positions [start, stop)."""
+        return zip(
+            self.proteins[self.rows[start:stop]].tolist(),
+            self.proteins[self.cols[start:stop]].tolist(),
+            self.weights[start:stop].tolist()
+        )
+    
+    @timed
+    def create_network(self, threshold):
+        """Build a new graph at the given threshold from the index prefix."""
+        import networkx as nx
+
+        G = nx.Graph()
+        G.add_nodes_from(self.proteins)
+        G.add_weighted_edges_from(self.edges(0, self.number_of_edges(threshold)))
+        return G
+    
+    def position(self, protein):
+        """Return the row of a protein in the index, raising ValueError if it is unknown."""
+        i = self._positions.get(protein)
+        if i is None:
+            raise ValueError(f"Protein {protein} not found in the network")
+        return i
+    
+    @timed
+    def adjacency(self, threshold):
+        """
+        Return the symmetric CSR adjacency matrix at a threshold (memoized per edge count).
+        
+        Parameters:
+            threshold (float): Similarity threshold for edge creation
+            
+        Returns:
+            scipy.sparse.csr_matrix: Edge weights, rows and columns in protein order
+        """
+        m = self.number_of_edges(threshold)
+        with self._memo_lock:
+            # Looked up and built under the lock, so concurrent sessions build it once
+            matrix = self._adjacency.get(m)
+            if matrix is not None:
+                self._adjacency.move_to_end(m)
+                return matrix
+            n = len(self.proteins)
+            upper = sparse.coo_matrix(
+                (self.weights[:m], (self.rows[:m], self.cols[:m])), shape=(n, n)
+            )
+            matrix = (upper + upper.T).tocsr()
+            self._adjacency[m] = matrix
+            while len(self._adjacency) > MAX_CACHED_ADJACENCY:
+                self._adjacency.popitem(last=False)
+        return matrix
+    
+    def subgraph(self, nodes, threshold):
+        """
+        Build the graph induced by the given node positions at a threshold.
+        
+        Parameters:
+            nodes (numpy.ndarray): Protein positions; node order is preserved
+            threshold (float): Similarity threshold for edge creation
+            
+        Returns:
+            networkx.Graph: The induced subgraph
+        """
+        import networkx as nx
+
+        nodes = np.asarray(nodes, dtype=int)
+        sub = sparse.triu(self.adjacency(threshold)[nodes][:, nodes], k=1).tocoo()
+        labels = self.proteins[nodes]
+        G = nx.Graph()
+        G.add_nodes_from(labels.tolist())
+        G.add_weighted_edges_from(
+            zip(labels[sub.row].tolist(), labels[sub.col].tolist(), sub.data.tolist())
+        )
+        return G
+
+
+def bounded_bfs(adjacency, source, radius=1, max_nodes=None):
+    """
+    Breadth-first search over a CSR adjacency matrix, limited by depth and size.
+    
+    Each level is expanded with one sparse row slice. If adding a full level
+    would exceed max_nodes, the level's nodes are taken by their strongest edge
+    to the previous level until the cap is reached.
+    
+    Parameters:
+        adjacency (scipy.sparse.csr_matrix): Symmetric weighted adjacency matrix
+        source (int): Position of the start node
+        radius (int): Maximum number of hops
+        max_nodes (int, optional): Maximum number of nodes returned (including source)
+        
+    Returns:
+        tuple: (numpy.ndarray of node positions in BFS order, numpy.ndarray of
+            hop distances, bool whether the cap cut the search short)
+    """
+    distance = np.full(adjacency.shape[0], -1, dtype=int)
+    distance[source] = 0
+    order = [np.array([source])]
+    frontier = order[0]
+    count = 1
+    truncated = False
+    
+    for depth in range(1, radius + 1):
+        level = adjacency[frontier]
+        candidates, weights = level.indices, level.data
+        new = distance[candidates] < 0
+        candidates, weights = candidates[new], weights[new]
+        if len(candidates) == 0:
+            break
+        
+        # Unique new nodes, each with its strongest edge to the current frontier
+        by_weight = np.argsort(-weights, kind='stable')
+        candidates = candidates[by_weight]
+        _, first = np.unique(candidates, return_index=True)
+        frontier = candidates[np.sort(first)]
+        
+        if max_nodes is not None and count + len(frontier) > max_nodes:
+            frontier = frontier[:max(0, max_nodes - count)]
+            truncated = True
+        distance[frontier] = depth
+        order.append(frontier)
+        count += len(frontier)
+        if truncated:
+            break
+    
+    nodes = np.concatenate(order)
+    return nodes, distance[nodes], truncated
+
+
+@timed
+def get_neighborhood(edge_index, threshold, central_protein, radius=1, max_nodes=DEFAULT_MAX_NODES):
+    """
+    Extract a protein's neighborhood with a single bounded BFS.
+    
+    Parameters:
+        edge_index (ThresholdEdgeIndex): Shared edge index
+        threshold (float): Similarity threshold for edge creation
+        central_protein (str): The protein of interest
+        radius (int): Radius of neighborhood
+        max_nodes (int, optional): Node cap (see bounded_bfs)
+        
+    Returns:
+        tuple: (ego graph, list of (node, distance) tuples sorted by distance,
+            bool whether the node cap was reached)
+    """
+    source = edge_index.position(central_protein)
+    nodes, distances, truncated = bounded_bfs(
+        edge_index.adjacency(threshold), source, radius=radius, max_nodes=max_nodes
+    )
+    ego = edge_index.subgraph(nodes, threshold)
+    return ego, list(zip(edge_index.proteins[nodes].tolist(), distances.tolist())), truncated
+
+
+def similarity_row(similarity_df, protein):
+    """
+    Max-symmetrized similarities of one protein to every protein (in row order).
+    
+    Parameters:
+        similarity_df (pandas.DataFrame): Similarity matrix
+        protein (str): The protein of interest
+        
+    Returns:
+        numpy.ndarray: Scores aligned with similarity_df.index (NaN where missing)
+    """
+    if protein not in similarity_df.index:
+        raise ValueError(f"Protein {protein} not found in the network")
+    labels = similarity_df.index
+    row = pd.to_numeric(similarity_df.loc[protein].reindex(labels), errors='coerce')
+    if protein in similarity_df.columns:
+        col = pd.to_numeric(similarity_df[protein], errors='coerce')
+    else:
+        col = pd.Series(np.nan, index=labels)
+    return np.maximum(row.to_numpy(dtype=float), col.to_numpy(dtype=float))
+
+
+@timed
+def get_top_k_neighborhood(edge_index, similarity_df, threshold, central_protein, k=20,
+                           max_nodes=DEFAULT_MAX_NODES):
+    """
+    The k proteins most similar to a protein, regardless of the threshold.
+    
+    The central protein is connected to each of them with its similarity score.
+    Edges among the neighbors follow the threshold.
+    
+    Parameters:
+        edge_index (ThresholdEdgeIndex): Shared edge index
+        similarity_df (pandas.DataFrame): Similarity matrix the index was built from
+        threshold (float): Similarity threshold for edges among the neighbors
+        central_protein (str): The protein of interest
+        k (int): Number of neighbors
+        max_nodes (int, optional): Node cap (k is limited to max_nodes - 1)
+        
+    Returns:
+        tuple: (ego graph, list of (node, distance) tuples, bool whether k was capped)
+    """
+    source = edge_index.position(central_protein)
+    scores = similarity_row(similarity_df, central_protein)
+    scores = pd.Series(scores, index=similarity_df.index).reindex(edge_index.proteins).to_numpy(dtype=float, copy=True)
+    scores[source] = np.nan
+    
+    truncated = max_nodes is not None and k > max_nodes - 1
+    if truncated:
+        k = max_nodes - 1
+    candidates = np.flatnonzero(~np.isnan(scores))
+    k = min(k, len(candidates))
+    
+    # Partial selection of the k best, then an exact sort of just those
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    top = candidates[np.argsort(-scores[candidates], kind='stable')]
+    
+    nodes = np.concatenate([[source], top]).astype(int)
+    ego = edge_index.subgraph(nodes, threshold)
+    central = edge_index.proteins[source]
+    ego.add_weighted_edges_from(
+        (central, protein, weight)
+        for protein, weight in zip(edge_index.proteins[top].tolist(), scores[top].tolist())
+    )
+    neighbors = [(central, 0)] + [(protein, 1) for protein in edge_index.proteins[top].tolist()]
+    return ego, neighbors, truncated
+
+
+@timed
+def neighborhood_summary(similarity_df, central_protein, neighbors):
+    """
+    Neighbors of a protein with their similarity and hop distance, most similar first.
+    
+    Similarities come from the similarity matrix row, so neighbors more than
+    one hop away still get their actual score.
+    
+    Parameters:
+        similarity_df (pandas.DataFrame): Similarity matrix
+        central_protein (str): The protein of interest (excluded from the summary)
+        neighbors (list): (node, distance) tuples, e.g. from get_neighborhood
+        
+    Returns:
+        numpy.ndarray: Structured array with fields 'receptor', 'similarity'
+            and 'distance', sorted by similarity (descending), then distance
+    """
+    scores = similarity_row(similarity_df, central_protein)
+    labels = np.array([node for node, _ in neighbors], dtype=str)
+    distances = np.array([distance for _, distance in neighbors], dtype=int)
+    keep = labels != str(central_protein)
+    labels, distances = labels[keep], distances[keep]
+    
+    positions = similarity_df.index.get_indexer(labels)
+    similarities = np.where(positions >= 0, scores[positions], np.nan)
+    similarities = np.nan_to_num(similarities, nan=0.0)
+    
+    summary = np.empty(len(labels), dtype=[
+        ('receptor', labels.dtype), ('similarity', float), ('distance', int)
+    ])
+    summary['receptor'] = labels
+    summary['similarity'] = similarities
+    summary['distance'] = distances
+    return summary[np.lexsort((summary['distance'], -summary['similarity']))]
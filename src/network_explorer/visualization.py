@@ -1,7 +1,10 @@
 import networkx as nx
 import matplotlib.pyplot as plt
 
-def visualize_protein_neighborhood(ego, central_protein, node_size=50, central_node_size=200):
+from src.perf import timed
+
+@timed
+def visualize_protein_neighborhood(ego, central_protein, node_size=50, central_node_size=200, pos=None):
     """
     Visualize the neighborhood of a protein.
     
@@ -10,6 +13,8 @@ def visualize_protein_neighborhood(ego, central_protein, node_size=50, central_n
         central_protein (str): The central protein
         node_size (int): Size of regular nodes
         central_node_size (int): Size of the central protein node
+        pos (dict, optional): Precomputed node positions; a spring layout is
+            computed when omitted
         
     Returns:
         matplotlib.figure.Figure: The figure containing the visualization
@@ -18,7 +23,8 @@ def visualize_protein_neighborhood(ego, central_protein, node_size=50, central_n
     fig, ax = plt.subplots(figsize=(12, 9), dpi=100)
     
     # Create layout
-    pos = nx.spring_layout(ego, seed=42)
+    if pos is None:
+        pos = nx.spring_layout(ego, seed=42)
     
     # Draw all nodes
     nx.draw_networkx_nodes(ego, pos, node_color='blue', node_size=node_size, ax=ax)
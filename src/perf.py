@@ -0,0 +1,249 @@
+"""
+Lightweight per-stage timing for loaders, analysis and visualization functions.
+
+Functions are wrapped with @timed, or blocks with `with stage("name"):`. While
+recording is enabled, each call appends a record to a process-wide ring buffer:
+stage name, start time, wall time, thread and, optionally, peak traced memory.
+When recording is disabled, a wrapped call costs one extra function call and a
+flag check.
+
+Recording is enabled with AROMA_PERF=1 (AROMA_PERF=memory also traces memory)
+or at runtime with set_enabled(). Memory tracing uses tracemalloc, which slows
+allocation-heavy code noticeably. It is process-wide, so with concurrent
+sessions a stage's peak can include other threads' allocations, and it slows
+every session; the app only offers it when AROMA_PERF=memory (memory_allowed).
+"""
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+DEFAULT_CAPACITY = 5000
+
+_records = deque(maxlen=DEFAULT_CAPACITY)
+_records_lock = threading.Lock()
+_local = threading.local()
+_settings = {'enabled': False, 'memory': False}
+
+
+def set_enabled(enabled=True, memory=False):
+    """
+    Turn recording (and optionally memory tracing) on or off.
+
+    Parameters:
+    -----------
+    enabled : bool
+        Record stage timings
+    memory : bool
+        Also record peak traced memory per stage (starts tracemalloc)
+    """
+    memory = bool(enabled and memory)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memory and _settings['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _settings['enabled'] = bool(enabled)
+    _settings['memory'] = memory
+
+
+def is_enabled():
+    """Whether stage timings are being recorded."""
+    return _settings['enabled']
+
+
+def memory_enabled():
+    """Whether peak memory is being recorded."""
+    return _settings['memory']
+
+
+def memory_allowed():
+    """Whether the operator started the process with AROMA_PERF=memory."""
+    return _mode == "memory"
+
+
+def set_capacity(capacity):
+    """Resize the ring buffer, keeping the most recent records."""
+    global _records
+    with _records_lock:
+        _records = deque(_records, maxlen=capacity)
+
+
+class stage:
+    """
+    Context manager that records the wall time (and peak memory) of a block.
+
+    Parameters:
+    -----------
+    name : str
+        Stage name, e.g. 'network.create_protein_network'
+    """
+
+    __slots__ = ('name', '_start', '_active', '_mem_start', '_child_peak')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._active = _settings['enabled']
+        if not self._active:
+            return self
+        self._mem_start = None
+        if _settings['memory'] and tracemalloc.is_tracing():
+            # Track peaks per stage; nested stages report their peak to the parent
+            current, peak = tracemalloc.get_traced_memory()
+            self._mem_start = current
+            self._child_peak = 0
+            stack = _stack()
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+            tracemalloc.reset_peak()
+            stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def start(self):
+        """Start timing outside a with block; call stop() when done."""
+        return self.__enter__()
+
+    def stop(self):
+        """Stop timing a stage started with start()."""
+        self.__exit__(None, None, None)
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._active:
+            return False
+        seconds = time.perf_counter() - self._start
+        peak_bytes = None
+        if self._mem_start is not None:
+            peak = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            peak_bytes = max(0, peak - self._mem_start)
+            stack = _stack()
+            if stack and stack[-1] is self:
+                stack.pop()
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+        record = {
+            'stage': self.name,
+            'started': time.time() - seconds,
+            'seconds': seconds,
+            'peak_bytes': peak_bytes,
+            'thread': threading.current_thread().name,
+            'error': exc_type.__name__ if exc_type is not None else None
+        }
+        with _records_lock:
+            _records.append(record)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def timed(name=None):
+    """
+    Decorator that records every call of a function as a stage.
+
+    Can be used bare (@timed) or with a stage name (@timed("layout.spring")).
+    The default name is '<module>.<qualified name>' without the 'src.' prefix.
+    """
+    def decorate(func):
+        stage_name = name or f"{func.__module__}.{func.__qualname__}".removeprefix("src.")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings['enabled']:
+                return func(*args, **kwargs)
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    if callable(name):
+        func, name = name, None
+        return decorate(func)
+    return decorate
+
+
+def get_records():
+    """Return a copy of the recorded stages, oldest first."""
+    with _records_lock:
+        return list(_records)
+
+
+def clear_records():
+    """Empty the ring buffer."""
+    with _records_lock:
+        _records.clear()
+
+
+def summarize(records=None):
+    """
+    Aggregate records per stage.
+
+    Parameters:
+    -----------
+    records : list, optional
+        Records to aggregate (defaults to the ring buffer)
+
+    Returns:
+    --------
+    list
+        One dict per stage with calls, total_s, mean_ms, max_ms and peak_mb
+        (None without memory tracing), sorted by total time
+    """
+    if records is None:
+        records = get_records()
+    stages = {}
+    for record in records:
+        entry = stages.setdefault(record['stage'], {
+            'stage': record['stage'], 'calls': 0, 'total_s': 0.0, 'max_ms': 0.0, 'peak_mb': None
+        })
+        entry['calls'] += 1
+        entry['total_s'] += record['seconds']
+        entry['max_ms'] = max(entry['max_ms'], record['seconds'] * 1000)
+        if record['peak_bytes'] is not None:
+            peak_mb = record['peak_bytes'] / 1024 ** 2
+            entry['peak_mb'] = peak_mb if entry['peak_mb'] is None else max(entry['peak_mb'], peak_mb)
+    for entry in stages.values():
+        entry['mean_ms'] = entry['total_s'] * 1000 / entry['calls']
+    return sorted(stages.values(), key=lambda entry: entry['total_s'], reverse=True)
+
+
+def to_jsonl(records=None):
+    """Serialize records (defaults to the ring buffer) as JSON lines."""
+    if records is None:
+        records = get_records()
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def export_jsonl(path, records=None):
+    """
+    Append records to a JSON lines file for offline analysis.
+
+    Parameters:
+    -----------
+    path : str
+        Destination file
+    records : list, optional
+        Records to write (defaults to the ring buffer)
+
+    Returns:
+    --------
+    int
+        Number of records written
+    """
+    if records is None:
+        records = get_records()
+    with open(path, "a") as f:
+        f.write(to_jsonl(records))
+    return len(records)
+
+
+_mode = os.environ.get("AROMA_PERF", "").lower()
+if _mode in ("1", "true", "on", "memory"):
+    set_enabled(True, memory=_mode == "memory")
@@ -0,0 +1,533 @@
+"""
+Semi-supervised label propagation (diffusion) of seed receptor labels over the
+structural similarity network.
+
+Seeds come from receptor_fragment_ligand_matrix_filtered.csv. The graph is the
+max-symmetrized AllvsAll.csv matrix, kept sparse above a similarity cutoff.
+The output has the layout of propagated_labels_complete.csv.
+
+It is not a regeneration of the shipped propagated_labels_complete.csv,
+whose settings are not recorded. --reference reports the distance to a
+labels file such as that one.
+
+Command line usage (from the repository root):
+    python -m src.propagation.label_propagation --output propagated.csv \\
+        --reference data/propagated_labels_complete.csv
+
+After adding a few seed receptors, the previous output of the same settings
+is a good starting point:
+    python -m src.propagation.label_propagation --output propagated_new.csv \\
+        --method cg --warm-start propagated.csv
+"""
+import argparse
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from src.network_explorer.data_loader import load_similarity_matrix
+from src.perf import timed
+
+# LU factorizations kept per operator for method='direct' (one per alpha/clamp/seed set)
+MAX_CACHED_FACTORIZATIONS = 4
+
+
+def build_affinity_matrix(similarity_df, cutoff=85, weighting='similarity',
+                          self_loops=True, knn=None, block_size=2048):
+    """
+    Build a sparse affinity matrix from a similarity matrix.
+
+    Pairs use the max of both directions, as in create_protein_network, and
+    only pairs at or above the cutoff are kept. The matrix is processed in row
+    blocks, so no dense N x N intermediate is allocated.
+
+    Parameters:
+    -----------
+    similarity_df : pandas.DataFrame
+        Square similarity matrix (rows and columns are receptor IDs)
+    cutoff : float, default=85
+        Minimum similarity for an edge
+    weighting : str, default='similarity'
+        'similarity' uses score / 100 as edge weight, 'binary' uses 1
+    self_loops : bool, default=True
+        Keep the diagonal (every receptor is similar to itself)
+    knn : int, optional
+        Keep only each receptor's knn most similar neighbors above the cutoff.
+        The result is symmetrized: an edge is kept if either end selected it.
+    block_size : int, default=2048
+        Number of rows processed at a time
+
+    Returns:
+    --------
+    scipy.sparse.csr_matrix
+        Symmetric affinity matrix aligned with similarity_df.index
+    """
+    if weighting not in ('similarity', 'binary'):
+        raise ValueError(f"Unknown weighting '{weighting}'")
+
+    # Align columns to rows without copying when they already match
+    if similarity_df.columns.equals(similarity_df.index):
+        aligned = similarity_df
+    else:
+        aligned = similarity_df.reindex(columns=similarity_df.index)
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in aligned.dtypes):
+        aligned = aligned.apply(pd.to_numeric, errors='coerce')
+    values = aligned.to_numpy()
+
+    n = len(values)
+    rows, cols, data = [], [], []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = np.maximum(values[start:stop], values[:, start:stop].T)
+        with np.errstate(invalid='ignore'):
+            mask = block >= cutoff
+        diagonal = (np.arange(stop - start), np.arange(start, stop))
+        if knn is not None and knn < n - 1:
+            # Rank neighbors (excluding self) and keep the knn best above the cutoff
+            ranked = np.where(mask, block, -np.inf)
+            ranked[diagonal] = -np.inf
+            top = np.argpartition(-ranked, knn - 1, axis=1)[:, :knn] if knn > 0 else np.empty((len(block), 0), dtype=int)
+            keep = np.zeros_like(mask)
+            np.put_along_axis(keep, top, True, axis=1)
+            keep[diagonal] = mask[diagonal]
+            mask &= keep
+        if not self_loops:
+            mask[diagonal] = False
+        r, c = np.nonzero(mask)
+        rows.append(r + start)
+        cols.append(c)
+        # Weights are float64 even when the similarity store is float32
+        data.append(block[r, c].astype(float) / 100.0 if weighting == 'similarity' else np.ones(len(r)))
+
+    W = sp.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n, n)
+    )
+    if knn is not None:
+        W = W.maximum(W.T).tocsr()
+    return W
+
+
+def normalize_affinity(W):
+    """
+    Symmetrically normalize an affinity matrix: S = D^-1/2 W D^-1/2.
+    Isolated nodes (zero degree) get all-zero rows.
+
+    Parameters:
+    -----------
+    W : scipy.sparse matrix
+        Symmetric affinity matrix
+
+    Returns:
+    --------
+    scipy.sparse.csr_matrix
+        Normalized affinity matrix
+    """
+    degree = np.asarray(W.sum(axis=1)).ravel()
+    with np.errstate(divide='ignore'):
+        inv_sqrt = np.where(degree > 0, 1.0 / np.sqrt(degree), 0.0)
+    D = sp.diags(inv_sqrt)
+    return (D @ W @ D).tocsr()
+
+
+def seed_matrix(label_df, receptor_ids):
+    """
+    Place the seed labels into a matrix aligned with the network's receptors.
+
+    Parameters:
+    -----------
+    label_df : pandas.DataFrame
+        Seed label matrix (receptors x features)
+    receptor_ids : pandas.Index
+        Receptor order of the network
+
+    Returns:
+    --------
+    numpy.ndarray
+        Seed matrix with zero rows for unlabeled receptors
+    numpy.ndarray
+        Row positions of the seed receptors
+
+    Raises:
+    -------
+    ValueError
+        If a seed receptor is not in the network
+    """
+    missing = label_df.index.difference(receptor_ids)
+    if len(missing):
+        raise ValueError(f"Seed receptors not found in the similarity matrix: {', '.join(missing[:10])}")
+
+    seed_rows = receptor_ids.get_indexer(label_df.index)
+    Y = np.zeros((len(receptor_ids), label_df.shape[1]))
+    Y[seed_rows] = label_df.astype(float).fillna(0).to_numpy()
+    return Y, seed_rows
+
+
+def rescale_to_seed_max(F, Y):
+    """
+    Rescale every column of F so that its maximum equals the maximum seed label
+    of that column. All-zero columns are left unchanged.
+
+    This is a presentation step, not part of the diffusion model: it puts
+    every column on the scale of the seed labels, as in the shipped
+    propagated_labels_complete.csv.
+    """
+    column_max = F.max(axis=0)
+    factor = np.divide(Y.max(axis=0), column_max, out=np.ones_like(column_max), where=column_max > 0)
+    return F * factor
+
+
+@timed
+def build_propagation_operator(similarity_df, cutoff=85, weighting='similarity', self_loops=True,
+                               knn=None):
+    """
+    Build the normalized propagation operator once so it can be reused across runs.
+
+    Parameters:
+    -----------
+    similarity_df : pandas.DataFrame
+        Square structural similarity matrix
+    cutoff : float, default=85
+        Minimum similarity for an edge
+    weighting : str, default='similarity'
+        Edge weighting, see build_affinity_matrix
+    self_loops : bool, default=True
+        Keep the diagonal of the affinity matrix
+    knn : int, optional
+        Keep only each receptor's knn most similar neighbors, see build_affinity_matrix
+
+    Returns:
+    --------
+    dict
+        Dictionary containing:
+        - 'receptor_ids': receptor order of the operator
+        - 'S': normalized sparse affinity matrix
+        - 'edges': number of edges (excluding self-loops)
+        - 'factorizations': sparse LU factorizations of method='direct', the last
+          MAX_CACHED_FACTORIZATIONS (alpha, clamp, seeds) systems; they live
+          as long as the operator
+    """
+    W = build_affinity_matrix(similarity_df, cutoff=cutoff, weighting=weighting,
+                              self_loops=self_loops, knn=knn)
+    return {
+        'receptor_ids': similarity_df.index,
+        'S': normalize_affinity(W),
+        'edges': int((W.nnz - (W.diagonal() > 0).sum()) // 2),
+        'factorizations': OrderedDict()
+    }
+
+
+def _linear_system(S, Y, seed_rows, alpha, clamp):
+    """
+    The linear system A X = B whose solution is the diffusion fixed point.
+
+    Without clamping this is (I - alpha S) F = (1 - alpha) Y over all receptors.
+    With clamping only unlabeled rows are unknown:
+    (I - alpha S_uu) F_u = alpha S_ul Y_l.
+
+    Returns (A, B, unknown_rows).
+    """
+    n = S.shape[0]
+    if not clamp:
+        return (sp.identity(n, format='csr') - alpha * S).tocsr(), (1 - alpha) * Y, np.arange(n)
+
+    unknown = np.setdiff1d(np.arange(n), seed_rows)
+    S_uu = S[unknown][:, unknown]
+    S_ul = S[unknown][:, seed_rows]
+    A = (sp.identity(len(unknown), format='csr') - alpha * S_uu).tocsr()
+    return A, alpha * (S_ul @ Y[seed_rows]), unknown
+
+
+def relative_residual(A, X, B):
+    """
+    Relative residual ||A X - B|| / ||B|| (Frobenius norms) of the diffusion system.
+
+    Without clamping this is ||(I - alpha S) F - (1 - alpha) Y|| / ||(1 - alpha) Y||,
+    the same measure for every method. It is 0 when B is 0.
+    """
+    b_norm = np.linalg.norm(B)
+    if b_norm == 0:
+        return 0.0
+    return float(np.linalg.norm(A @ X - B) / b_norm)
+
+
+def _warm_start(A, B, initial, default):
+    """
+    Rescaled warm start, or the default start if the warm start fits the system worse.
+
+    Returns (X0, used). A starting point far from the fixed point, such as a
+    file produced by another model, would otherwise cost iterations.
+    """
+    X0 = _fit_column_scale(A, B, initial)
+    if relative_residual(A, X0, B) < relative_residual(A, default, B):
+        return X0, True
+    return default, False
+
+
+def _fit_column_scale(A, B, X0):
+    """
+    Rescale each column of a warm start X0 to minimize ||A (c X0) - B||.
+
+    This lets a previous output saved with rescale=True serve as a starting
+    point for the unscaled system.
+    """
+    AX = A @ X0
+    denominator = (AX * AX).sum(axis=0)
+    scale = np.divide((AX * B).sum(axis=0), denominator,
+                      out=np.zeros_like(denominator), where=denominator > 0)
+    return X0 * scale
+
+
+def _batched_cg(A, B, X0, tol, max_iter):
+    """
+    Conjugate gradient for a symmetric positive definite A with many right-hand sides.
+
+    All columns advance together, so each iteration is one sparse matrix product
+    with the whole block. A column stops updating once its residual is below
+    tol * ||b||.
+
+    Returns (X, iterations, converged).
+    """
+    X = X0.copy()
+    R = B - A @ X
+    P = R.copy()
+    rs = (R * R).sum(axis=0)
+    b_norm = np.linalg.norm(B, axis=0)
+    threshold = tol * np.where(b_norm > 0, b_norm, 1.0)
+    active = np.sqrt(rs) > threshold
+
+    iterations = 0
+    while active.any() and iterations < max_iter:
+        AP = A @ P
+        pAp = (P * AP).sum(axis=0)
+        step = np.divide(rs, pAp, out=np.zeros_like(rs), where=active & (pAp > 0))
+        X += step * P
+        R -= step * AP
+        rs_next = (R * R).sum(axis=0)
+        beta = np.divide(rs_next, rs, out=np.zeros_like(rs), where=active & (rs > 0))
+        P = R + beta * P
+        rs = rs_next
+        active = np.sqrt(rs) > threshold
+        iterations += 1
+
+    return X, iterations, not active.any()
+
+
+@timed
+def propagate_labels(similarity_df, label_df, alpha=0.9, cutoff=85, weighting='similarity',
+                     self_loops=True, clamp=False, tol=1e-6, max_iter=1000, rescale=False,
+                     method='iterative', initial=None, operator=None, knn=None):
+    """
+    Propagate seed labels over the network to the diffusion fixed point of
+    F <- alpha * S F + (1 - alpha) * Y.
+
+    Parameters:
+    -----------
+    similarity_df : pandas.DataFrame
+        Square structural similarity matrix (ignored when operator is given)
+    label_df : pandas.DataFrame
+        Seed label matrix (receptors x features)
+    alpha : float, default=0.9
+        Weight of the propagated signal against the seed labels (0 < alpha < 1)
+    cutoff : float, default=85
+        Minimum similarity for an edge
+    weighting : str, default='similarity'
+        Edge weighting, see build_affinity_matrix
+    self_loops : bool, default=True
+        Keep the diagonal of the affinity matrix
+    clamp : bool, default=False
+        Keep seed rows fixed at their labels (hard clamping)
+    tol : float, default=1e-6
+        'iterative': stop when the largest change between iterations is below tol.
+        'cg': stop when every column's residual is below tol * ||b||.
+    max_iter : int, default=1000
+        Maximum number of iterations
+    rescale : bool, default=False
+        Rescale each feature column to the maximum seed label of that column
+        (see rescale_to_seed_max)
+    method : str, default='iterative'
+        'iterative' runs the diffusion, 'cg' solves the linear system with
+        conjugate gradient, and 'direct' uses a sparse LU factorization
+        (cached on the operator, see build_propagation_operator). All feature
+        columns are solved together as one multi-RHS batch.
+    initial : pandas.DataFrame, optional
+        Warm start for method='cg', such as a previous output with the same
+        settings; used only if it fits the system better than zero (see _warm_start)
+    operator : dict, optional
+        Output of build_propagation_operator, to skip rebuilding the graph
+    knn : int, optional
+        Keep only each receptor's knn most similar neighbors, see build_affinity_matrix
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Propagated labels for every receptor in the network
+    dict
+        Report with 'method', 'iterations', 'converged', 'residual' (see
+        relative_residual, the same measure for every method), 'warm_start'
+        (whether initial was used), 'seconds' and 'edges'.
+    """
+    if not 0 < alpha < 1:
+        raise ValueError("alpha must be between 0 and 1")
+    if method not in ('iterative', 'cg', 'direct'):
+        raise ValueError(f"Unknown method '{method}'")
+    if initial is not None and method != 'cg':
+        raise ValueError(f"A warm start is only used by method='cg', not '{method}'")
+
+    start_time = time.perf_counter()
+    if operator is None:
+        operator = build_propagation_operator(similarity_df, cutoff=cutoff, weighting=weighting,
+                                              self_loops=self_loops, knn=knn)
+    receptor_ids = operator['receptor_ids']
+    S = operator['S']
+    Y, seed_rows = seed_matrix(label_df, receptor_ids)
+
+    if initial is not None:
+        initial = initial.reindex(index=receptor_ids, columns=label_df.columns)
+        initial = initial.astype(float).fillna(0).to_numpy()
+
+    A, B, unknown = _linear_system(S, Y, seed_rows, alpha, clamp)
+    warm_start = False
+    if method == 'iterative':
+        # Iterate the diffusion on all feature columns at once
+        F = Y.copy()
+        base = (1 - alpha) * Y
+        residual = np.inf
+        iterations = 0
+        while iterations < max_iter and residual >= tol:
+            F_next = alpha * (S @ F) + base
+            if clamp:
+                F_next[seed_rows] = Y[seed_rows]
+            residual = np.abs(F_next - F).max() if F.size else 0.0
+            F = F_next
+            iterations += 1
+        converged = bool(residual < tol)
+    else:
+        F = Y.copy()
+        if method == 'cg':
+            X0 = np.zeros_like(B)
+            if initial is not None:
+                X0, warm_start = _warm_start(A, B, initial[unknown], X0)
+            F[unknown], iterations, converged = _batched_cg(A, B, X0, tol, max_iter)
+        else:
+            key = (alpha, clamp, seed_rows.tobytes() if clamp else None)
+            factorizations = operator['factorizations']
+            lu = factorizations.get(key)
+            if lu is None:
+                lu = spla.splu(A.tocsc())
+                factorizations[key] = lu
+                if len(factorizations) > MAX_CACHED_FACTORIZATIONS:
+                    factorizations.popitem(last=False)
+            else:
+                factorizations.move_to_end(key)
+            F[unknown] = lu.solve(B)
+            iterations, converged = 1, True
+    residual = relative_residual(A, F[unknown], B)
+
+    if rescale:
+        F = rescale_to_seed_max(F, Y)
+
+    predicted_df = pd.DataFrame(F, index=receptor_ids, columns=label_df.columns)
+    predicted_df.index.name = 'receptor_id'
+    report = {
+        'method': method,
+        'iterations': iterations,
+        'converged': converged,
+        'residual': residual,
+        'warm_start': warm_start,
+        'seconds': time.perf_counter() - start_time,
+        'edges': operator['edges']
+    }
+    return predicted_df, report
+
+
+def compare_to_reference(predicted_df, reference_df):
+    """
+    Compare propagated labels with a reference file such as propagated_labels_complete.csv.
+
+    Parameters:
+    -----------
+    predicted_df : pandas.DataFrame
+        Propagated labels
+    reference_df : pandas.DataFrame
+        Reference labels
+
+    Returns:
+    --------
+    dict
+        'max_abs_diff', 'mean_abs_diff', 'mean_column_correlation' and
+        'zero_rows_match' (whether both mark the same receptors as unreachable)
+    """
+    reference = reference_df.reindex(index=predicted_df.index, columns=predicted_df.columns).fillna(0)
+    a = predicted_df.to_numpy(dtype=float)
+    b = reference.to_numpy(dtype=float)
+
+    correlations = [
+        np.corrcoef(a[:, c], b[:, c])[0, 1]
+        for c in range(a.shape[1]) if a[:, c].std() > 0 and b[:, c].std() > 0
+    ]
+    return {
+        'max_abs_diff': float(np.abs(a - b).max()),
+        'mean_abs_diff': float(np.abs(a - b).mean()),
+        'mean_column_correlation': float(np.mean(correlations)) if correlations else float('nan'),
+        'zero_rows_match': bool(np.array_equal(a.sum(axis=1) == 0, b.sum(axis=1) == 0))
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propagate seed receptor labels over the structural network.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    parser.add_argument("--output", required=True, help="Output CSV path")
+    parser.add_argument("--alpha", type=float, default=0.9)
+    parser.add_argument("--cutoff", type=float, default=85)
+    parser.add_argument("--weighting", choices=["similarity", "binary"], default="similarity")
+    parser.add_argument("--knn", type=int, help="Keep only the k most similar neighbors per receptor")
+    parser.add_argument("--no-self-loops", action="store_true")
+    parser.add_argument("--clamp", action="store_true", help="Hard-clamp seed labels")
+    parser.add_argument("--tol", type=float, default=1e-6)
+    parser.add_argument("--max-iter", type=int, default=1000)
+    parser.add_argument("--method", choices=["iterative", "cg", "direct"], default="iterative")
+    parser.add_argument("--warm-start", help="Previous output of the same settings to start from (cg only)")
+    parser.add_argument("--rescale", action="store_true",
+                        help="Scale each feature column to its maximum seed label")
+    parser.add_argument("--reference", help="Labels CSV to report the distance to, e.g. the shipped file")
+    args = parser.parse_args(argv)
+    if args.warm_start and args.method != "cg":
+        parser.error("--warm-start is only used by --method cg")
+
+    similarity_df = load_similarity_matrix(os.path.join(args.data_dir, "AllvsAll.csv"))
+    label_df = pd.read_csv(os.path.join(args.data_dir, "receptor_fragment_ligand_matrix_filtered.csv"), index_col=0)
+
+    initial = pd.read_csv(args.warm_start, index_col=0) if args.warm_start else None
+
+    predicted_df, report = propagate_labels(
+        similarity_df, label_df,
+        alpha=args.alpha, cutoff=args.cutoff, weighting=args.weighting,
+        self_loops=not args.no_self_loops, clamp=args.clamp,
+        tol=args.tol, max_iter=args.max_iter,
+        method=args.method, initial=initial, knn=args.knn, rescale=args.rescale
+    )
+    predicted_df.to_csv(args.output)
+
+    status = "converged" if report['converged'] else "did not converge"
+    print(f"Propagated {label_df.shape[1]} features over {len(predicted_df)} receptors with {report['method']} "
+          f"({report['edges']} edges): {status} after {report['iterations']} iterations "
+          f"in {report['seconds']:.3f} s (relative residual {report['residual']:.2e})")
+    if initial is not None and not report['warm_start']:
+        print(f"{args.warm_start} fits the system worse than the default start and was not used")
+
+    if args.reference:
+        reference_df = pd.read_csv(args.reference, index_col=0)
+        comparison = compare_to_reference(predicted_df, reference_df)
+        print(f"Against {args.reference}: max |diff| {comparison['max_abs_diff']:.4f}, "
+              f"mean |diff| {comparison['mean_abs_diff']:.4f}, "
+              f"mean column correlation {comparison['mean_column_correlation']:.4f}, "
+              f"zero rows match: {comparison['zero_rows_match']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Hyperparameter sweep for label propagation (alpha, similarity cutoff, kNN).
+
+Every grid point is scored by cross-validation over the seed receptors. The
+seeds of one fold are hidden, labels are propagated from the remaining seeds,
+and the held-out rows are compared with their true labels. Without clamping,
+the system matrix does not depend on which seeds are hidden. Each grid point
+therefore builds and factorizes its operator once and reuses it for every fold.
+
+Grid points run in a process pool. Workers load the data once in their
+initializer: the memory-mapped similarity store (shared page cache) and the
+seed labels. Tasks carry only the parameters.
+
+Command line usage (from the repository root):
+    python -m src.propagation.sweep --alphas 0.5 0.9 0.99 --cutoffs 80 85 90 \\
+        --knn 0 10 --folds 5 --workers 4 --output sweep.csv --min-score 0.6
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.network_explorer.data_loader import load_similarity_matrix
+from src.propagation.label_propagation import build_propagation_operator, propagate_labels
+from src.perf import timed
+
+# Data shared by every task in a worker process, set by _init_worker
+_SWEEP_DATA = {}
+
+
+def make_folds(receptor_ids, n_folds=5, random_state=0):
+    """
+    Split seed receptors into cross-validation folds.
+
+    Parameters:
+    -----------
+    receptor_ids : sequence
+        Seed receptor IDs
+    n_folds : int or str, default=5
+        Number of folds, or 'loo' for leave-one-out
+    random_state : int, default=0
+        Seed for the shuffle
+
+    Returns:
+    --------
+    list
+        One array of held-out receptor IDs per fold
+    """
+    receptor_ids = np.asarray(receptor_ids)
+    if n_folds == 'loo':
+        return [receptor_ids[[i]] for i in range(len(receptor_ids))]
+    if not 2 <= n_folds <= len(receptor_ids):
+        raise ValueError(f"n_folds must be between 2 and {len(receptor_ids)}, or 'loo'")
+    shuffled = np.random.default_rng(random_state).permutation(receptor_ids)
+    return np.array_split(shuffled, n_folds)
+
+
+def row_cosine(a, b):
+    """Cosine similarity between matching rows of a and b (0 when either row is zero)."""
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return np.divide((a * b).sum(axis=1), norms, out=np.zeros(len(a)), where=norms > 0)
+
+
+@timed
+def evaluate_config(similarity_df, label_df, folds, alpha, cutoff, knn=None, method='direct'):
+    """
+    Cross-validate one propagation configuration.
+
+    Parameters:
+    -----------
+    similarity_df : pandas.DataFrame
+        Square structural similarity matrix
+    label_df : pandas.DataFrame
+        Seed label matrix
+    folds : list
+        Held-out receptor IDs per fold (see make_folds)
+    alpha : float
+        Propagation weight
+    cutoff : float
+        Minimum similarity for an edge
+    knn : int, optional
+        kNN sparsification of the graph
+    method : str, default='direct'
+        Solver passed to propagate_labels
+
+    Returns:
+    --------
+    dict
+        Parameters plus 'score' (mean cosine between predicted and true held-out
+        profiles), 'score_std', 'mae', 'edges' and 'seconds'
+    """
+    start_time = time.perf_counter()
+    operator = build_propagation_operator(similarity_df, cutoff=cutoff, knn=knn)
+
+    scores, errors = [], []
+    for held_out in folds:
+        train_df = label_df.drop(index=held_out)
+        # Errors are measured on the scale of the seed labels
+        predicted_df, _ = propagate_labels(None, train_df, alpha=alpha, operator=operator, method=method,
+                                           rescale=True)
+        predicted = predicted_df.loc[held_out].to_numpy()
+        truth = label_df.loc[held_out].astype(float).fillna(0).to_numpy()
+        scores.append(row_cosine(predicted, truth))
+        errors.append(np.abs(predicted - truth).mean(axis=1))
+
+    scores = np.concatenate(scores)
+    return {
+        'alpha': alpha,
+        'cutoff': cutoff,
+        'knn': knn if knn is not None else 0,
+        'score': float(scores.mean()),
+        'score_std': float(scores.std()),
+        'mae': float(np.concatenate(errors).mean()),
+        'edges': operator['edges'],
+        'seconds': time.perf_counter() - start_time
+    }
+
+
+def _init_worker(similarity_path, label_path, folds, method):
+    """Load the read-only inputs once per worker process."""
+    _SWEEP_DATA['similarity_df'] = load_similarity_matrix(similarity_path)
+    _SWEEP_DATA['label_df'] = pd.read_csv(label_path, index_col=0)
+    _SWEEP_DATA['folds'] = folds
+    _SWEEP_DATA['method'] = method
+
+
+def _run_grid_point(params):
+    """Evaluate one (alpha, cutoff, knn) tuple with the worker's shared data."""
+    alpha, cutoff, knn = params
+    return evaluate_config(
+        _SWEEP_DATA['similarity_df'], _SWEEP_DATA['label_df'], _SWEEP_DATA['folds'],
+        alpha, cutoff, knn=knn or None, method=_SWEEP_DATA['method']
+    )
+
+
+def run_sweep(alphas, cutoffs, knns=(0,), data_dir="data", n_folds=5, workers=1,
+              method='direct', random_state=0):
+    """
+    Evaluate every combination of alpha, cutoff and kNN.
+
+    Parameters:
+    -----------
+    alphas : list
+        Propagation weights to try
+    cutoffs : list
+        Similarity cutoffs to try
+    knns : list, default=(0,)
+        kNN values to try (0 means no kNN sparsification)
+    data_dir : str
+        Path to the directory containing the data files
+    n_folds : int or str, default=5
+        Number of folds, or 'loo' for leave-one-out
+    workers : int, default=1
+        Number of worker processes (1 runs in the current process)
+    method : str, default='direct'
+        Solver passed to propagate_labels
+    random_state : int, default=0
+        Seed for the fold shuffle
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per configuration, ranked by score (best first)
+    """
+    similarity_path = os.path.join(data_dir, "AllvsAll.csv")
+    label_path = os.path.join(data_dir, "receptor_fragment_ligand_matrix_filtered.csv")
+    for filepath in (similarity_path, label_path):
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Required file not found: {filepath}")
+
+    # Build the binary similarity store up front so workers only memory-map it
+    load_similarity_matrix(similarity_path)
+    label_df = pd.read_csv(label_path, index_col=0)
+    folds = make_folds(label_df.index, n_folds=n_folds, random_state=random_state)
+    grid = list(itertools.product(alphas, cutoffs, knns))
+
+    init_args = (similarity_path, label_path, folds, method)
+    if workers <= 1:
+        _init_worker(*init_args)
+        results = [_run_grid_point(params) for params in grid]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as executor:
+            results = list(executor.map(_run_grid_point, grid))
+
+    results_df = pd.DataFrame(results)
+    results_df = results_df.sort_values(['score', 'seconds'], ascending=[False, True])
+    results_df.insert(0, 'rank', np.arange(1, len(results_df) + 1))
+    return results_df.reset_index(drop=True)
+
+
+def fastest_meeting_floor(results_df, min_score):
+    """
+    Pick the fastest configuration whose score is at least min_score.
+
+    Parameters:
+    -----------
+    results_df : pandas.DataFrame
+        Output of run_sweep
+    min_score : float
+        Accuracy floor
+
+    Returns:
+    --------
+    pandas.Series or None
+        The selected row, or None if no configuration meets the floor
+    """
+    eligible = results_df[results_df['score'] >= min_score]
+    if eligible.empty:
+        return None
+    return eligible.sort_values('seconds').iloc[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validated sweep of label propagation parameters.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    parser.add_argument("--alphas", type=float, nargs="+", default=[0.5, 0.7, 0.9, 0.95, 0.99])
+    parser.add_argument("--cutoffs", type=float, nargs="+", default=[80, 85, 90])
+    parser.add_argument("--knn", type=int, nargs="+", default=[0], help="kNN values (0 = off)")
+    parser.add_argument("--folds", default="5", help="Number of folds, or 'loo'")
+    parser.add_argument("--method", choices=["iterative", "cg", "direct"], default="direct")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="Fold shuffle seed")
+    parser.add_argument("--output", help="Write the ranked table to this CSV")
+    parser.add_argument("--min-score", type=float, help="Report the fastest config meeting this score")
+    args = parser.parse_args(argv)
+
+    n_folds = args.folds if args.folds == 'loo' else int(args.folds)
+    results_df = run_sweep(args.alphas, args.cutoffs, args.knn, data_dir=args.data_dir,
+                           n_folds=n_folds, workers=args.workers, method=args.method,
+                           random_state=args.seed)
+
+    print(results_df.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    if args.output:
+        results_df.to_csv(args.output, index=False)
+
+    if args.min_score is not None:
+        best = fastest_meeting_floor(results_df, args.min_score)
+        if best is None:
+            print(f"No configuration reaches a score of {args.min_score}")
+        else:
+            print(f"Fastest configuration with score >= {args.min_score}: alpha={best['alpha']}, "
+                  f"cutoff={best['cutoff']}, knn={int(best['knn'])} "
+                  f"(score {best['score']:.4f}, {best['seconds']:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
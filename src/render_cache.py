@@ -0,0 +1,392 @@
+"""
+Cache of rendered matplotlib views as encoded PNG/SVG bytes.
+
+A view is rendered once per (view, receptor, parameters, dataset version):
+the figure is built, saved to bytes and closed before the bytes are returned,
+so no figure outlives a render, even one whose build fails. A view with
+nothing to draw is cached too, as empty bytes. The dataset version is the modification time
+and size of the files the view is drawn from, so editing a data file renders
+its views again.
+
+Rendered bytes are kept in memory (AROMA_RENDER_MEMORY_MB, default 64 MB) and
+on disk under AROMA_RENDER_CACHE_DIR (default .render_cache,
+AROMA_RENDER_DISK_MB, default 256 MB), both evicted least recently used
+first. The disk copy is shared across processes and restarts. Like the
+DataCache, the in-memory cache is held by st.cache_resource inside a running
+Streamlit app and is a module-level instance elsewhere.
+"""
+import hashlib
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from src.perf import stage
+
+DEFAULT_MEMORY_MB = 64
+DEFAULT_DISK_MB = 256
+DEFAULT_CACHE_DIR = ".render_cache"
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+# Same savefig options as st.pyplot, so cached views look like the figures they replace
+DISPLAY_OPTIONS = {"bbox_inches": "tight", "dpi": 200}
+# Cached result of a build that returned None, and what it counts against the memory budget
+NOTHING_TO_DRAW = b""
+EMPTY_ENTRY_BYTES = 256
+
+
+def dataset_version(paths):
+    """(mtime_ns, size) of every source file, the dataset part of a render key."""
+    version = []
+    for path in paths:
+        stat = os.stat(path)
+        version.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+
+def render_key(view, receptor, params, paths, fmt, savefig_options):
+    """
+    Hex digest identifying one rendering of a view.
+
+    Parameters:
+    -----------
+    view : str
+        View name, e.g. 'feature_profile'
+    receptor : str
+        Receptor the view is drawn for
+    params : tuple
+        Other parameters the figure depends on; their repr must be stable
+    paths : tuple
+        Source files of the figure (their versions are part of the key)
+    fmt : str
+        'png' or 'svg'
+    savefig_options : dict
+        Options passed to Figure.savefig
+
+    Returns:
+    --------
+    str
+        SHA-1 hex digest, also used as the disk file name
+    """
+    description = repr((view, receptor, params, dataset_version(paths), fmt,
+                        sorted(savefig_options.items())))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def figure_raster_bytes(fig, dpi=None):
+    """Size of the RGBA buffer Agg allocates to draw a figure at a dpi."""
+    width, height = fig.get_size_inches() * (dpi or fig.dpi)
+    return int(round(width)) * int(round(height)) * 4
+
+
+def _close_figure(fig):
+    import matplotlib.pyplot as plt
+
+    plt.close(fig)
+
+
+def _entry_bytes(data):
+    return len(data) or EMPTY_ENTRY_BYTES
+
+
+def _current_rss_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def figure_memory():
+    """
+    Figure memory of this worker process.
+
+    Returns:
+    --------
+    dict
+        'pid', 'open_figures' (pyplot figures not yet closed),
+        'open_figure_bytes' (their raster buffers at screen dpi) and
+        'rss_bytes' (None where unavailable)
+    """
+    plt = sys.modules.get("matplotlib.pyplot")
+    figures = [plt.figure(num) for num in plt.get_fignums()] if plt is not None else []
+    return {
+        'pid': os.getpid(),
+        'open_figures': len(figures),
+        'open_figure_bytes': sum(figure_raster_bytes(fig) for fig in figures),
+        'rss_bytes': _current_rss_bytes()
+    }
+
+
+class RenderCache:
+    """
+    Thread-safe two-level LRU cache of rendered figures.
+
+    Parameters:
+        memory_budget_bytes (int): Total size of the in-memory renders above
+            which the least recently used are evicted.
+        disk_budget_bytes (int): Total size of the files in cache_dir above
+            which the least recently used are deleted.
+        cache_dir (str): Directory of the disk cache; None keeps renders in memory only.
+    """
+
+    def __init__(self, memory_budget_bytes, disk_budget_bytes, cache_dir=DEFAULT_CACHE_DIR):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.RLock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.figures_closed = 0
+        self.peak_figure_bytes = 0
+        self._counts = {}
+
+    def render(self, view, receptor, params, paths, build_figure, fmt="png", savefig_options=None):
+        """
+        Return the encoded bytes of a view, building and saving its figure on a miss.
+
+        Parameters:
+            view (str): View name, e.g. 'neighborhood'
+            receptor (str): Receptor the view is drawn for
+            params (tuple): Other parameters the figure depends on
+            paths (tuple): Source files; their versions are part of the key
+            build_figure (callable): Zero-argument function returning a
+                matplotlib Figure, or None when there is nothing to draw
+            fmt (str): 'png' or 'svg'
+            savefig_options (dict, optional): Figure.savefig options
+                (defaults to DISPLAY_OPTIONS)
+
+        Returns:
+            bytes: The encoded image, or None if build_figure returned None
+                (cached like an image, so the build is not repeated)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported render format '{fmt}', expected one of {tuple(FORMATS)}")
+        if savefig_options is None:
+            savefig_options = DISPLAY_OPTIONS
+        key = render_key(view, receptor, params, paths, fmt, savefig_options)
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._count(view, 'memory_hits')
+                return data or None
+
+        data = self._read_disk(key, fmt)
+        if data is not None:
+            with self._lock:
+                self._count(view, 'disk_hits')
+                self._store(key, data)
+            return data or None
+
+        import matplotlib.pyplot as plt
+
+        with self._lock:
+            self._count(view, 'misses')
+        with stage(f"render.{view}"):
+            open_before = set(plt.get_fignums())
+            fig = None
+            try:
+                fig = build_figure()
+                if fig is None:
+                    data = NOTHING_TO_DRAW
+                else:
+                    buffer = io.BytesIO()
+                    fig.savefig(buffer, format=fmt, **savefig_options)
+                    data = buffer.getvalue()
+                    raster_bytes = figure_raster_bytes(fig, savefig_options.get('dpi'))
+            finally:
+                # Closing releases the canvas; pyplot otherwise keeps every figure alive.
+                # Figures the build opened and did not return (or opened before failing)
+                # are closed as well; closing only unregisters them, savefig still works.
+                if fig is not None:
+                    _close_figure(fig)
+                for number in set(plt.get_fignums()) - open_before:
+                    plt.close(number)
+        with self._lock:
+            if fig is not None:
+                self.figures_closed += 1
+                self.peak_figure_bytes = max(self.peak_figure_bytes, raster_bytes)
+            self._store(key, data)
+        self._write_disk(key, fmt, data)
+        return data or None
+
+    def clear(self, disk=False):
+        """Remove every in-memory render, and the disk cache too if disk is True (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+            if disk and self.cache_dir is not None:
+                for path, _, _ in self._disk_files():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self._disk_bytes = None
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: memory_hits, disk_hits, misses, hit_rate, evictions,
+            entries, memory_bytes, disk_bytes, budgets, figures_closed,
+            peak_figure_bytes (largest raster drawn) and per-view counters
+            under 'by_view'
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'memory_bytes': self._memory_bytes,
+                'memory_budget_bytes': self.memory_budget_bytes,
+                'disk_bytes': self._disk_bytes or 0,
+                'disk_budget_bytes': self.disk_budget_bytes,
+                'figures_closed': self.figures_closed,
+                'peak_figure_bytes': self.peak_figure_bytes,
+                'by_view': {view: dict(counts) for view, counts in self._counts.items()}
+            }
+
+    def _count(self, view, kind):
+        counts = self._counts.setdefault(view, {'memory_hits': 0, 'disk_hits': 0, 'misses': 0})
+        counts[kind] += 1
+        setattr(self, kind, getattr(self, kind) + 1)
+
+    def _store(self, key, data):
+        if key not in self._entries:
+            self._entries[key] = data
+            self._memory_bytes += _entry_bytes(data)
+        # The newest render is always kept
+        while self._memory_bytes > self.memory_budget_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self._memory_bytes -= _entry_bytes(old)
+            self.evictions += 1
+
+    def _disk_path(self, key, fmt):
+        return os.path.join(self.cache_dir, f"{key}.{fmt}")
+
+    def _read_disk(self, key, fmt):
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # The mtime orders the disk LRU
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _disk_files(self):
+        """(path, size, mtime) of every cached render on disk."""
+        files = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return files
+        for name in names:
+            if os.path.splitext(name)[1][1:] not in FORMATS:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, stat.st_size, stat.st_mtime_ns))
+        return files
+
+    def _write_disk(self, key, fmt, data):
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(key, fmt)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # Read-only working directory: keep renders in memory only
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_budget_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Other processes share the directory, so sizes are re-read before evicting
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files[:-1]:
+            if total <= self.disk_budget_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
+
+
+def _new_cache():
+    memory_mb = float(os.environ.get("AROMA_RENDER_MEMORY_MB", DEFAULT_MEMORY_MB))
+    disk_mb = float(os.environ.get("AROMA_RENDER_DISK_MB", DEFAULT_DISK_MB))
+    cache_dir = os.environ.get("AROMA_RENDER_CACHE_DIR", DEFAULT_CACHE_DIR) or None
+    return RenderCache(int(memory_mb * 1024 * 1024), int(disk_mb * 1024 * 1024), cache_dir=cache_dir)
+
+
+_PROCESS_CACHE = None
+_STREAMLIT_FACTORY = None
+
+
+def _streamlit_cache(st):
+    """The RenderCache held by Streamlit's resource cache."""
+    global _STREAMLIT_FACTORY
+    if _STREAMLIT_FACTORY is None:
+        _STREAMLIT_FACTORY = st.cache_resource(show_spinner=False)(_new_cache)
+    return _STREAMLIT_FACTORY()
+
+
+def get_render_cache():
+    """
+    Return the process-wide RenderCache.
+
+    Inside a running Streamlit app the instance is created through
+    st.cache_resource, so it is shared across sessions.
+    """
+    global _PROCESS_CACHE
+    st = sys.modules.get("streamlit")
+    if st is not None and st.runtime.exists():
+        return _streamlit_cache(st)
+    if _PROCESS_CACHE is None:
+        _PROCESS_CACHE = _new_cache()
+    return _PROCESS_CACHE
+
+
+def render_view(view, receptor, params, paths, build_figure, fmt="png", savefig_options=None):
+    """RenderCache.render on the process-wide cache."""
+    return get_render_cache().render(view, receptor, params, paths, build_figure,
+                                     fmt=fmt, savefig_options=savefig_options)
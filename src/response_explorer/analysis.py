@@ -1,11 +1,177 @@
+import weakref
+
 import pandas as pd
 import numpy as np
-from scipy.spatial.distance import cosine
 
-def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df, top_n=10):
+from src.perf import timed
+
+# Chemical libraries prepared per (cas_df, feature columns), see get_chemical_library
+_LIBRARY_CACHE = {}
+_LIBRARY_CACHE_SIZE = 4
+
+def find_common_columns(predicted_df, cas_df):
+    """
+    Find the feature columns shared by the receptor predictions and the chemical features.
+    
+    Parameters:
+    -----------
+    predicted_df : pandas.DataFrame
+        DataFrame containing the complete propagated predictions
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features
+        
+    Returns:
+    --------
+    list
+        Common columns in prediction order, excluding 'cas' and 'smiles'
+    """
+    exclude_cols = {'cas', 'smiles'}
+    return [col for col in predicted_df.columns 
+            if col in cas_df.columns and col not in exclude_cols]
+
+@timed
+def prepare_chemical_library(cas_df, common_cols):
+    """
+    Precompute everything the chemical ranking needs that does not depend on the receptor.
+    
+    Parameters:
+    -----------
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features, indexed by or with a 'name' column
+    common_cols : list
+        Feature columns shared with the receptor predictions
+        
+    Returns:
+    --------
+    dict
+        Dictionary containing:
+        - 'names': numpy array of chemical names
+        - 'cas_numbers': numpy array of CAS numbers (None if no 'cas' column)
+        - 'chemical_matrix': float DataFrame of features indexed by name
+        - 'values': the same features as a 2D numpy array
+        - 'norms': L2 norm of every chemical feature vector
+    """
+    # Set 'name' as index for cas_df if not already
+    chem_df = cas_df if cas_df.index.name == 'name' else cas_df.set_index('name')
+    
+    # Row-major values, so gathering a subset of chemicals (ANN candidates) is cheap;
+    # the DataFrame is a view of the same memory
+    values = np.ascontiguousarray(chem_df[common_cols].astype(float).fillna(0).to_numpy())
+    chemical_matrix = pd.DataFrame(values, index=chem_df.index, columns=common_cols, copy=False)
+    
+    # Name -> CAS mapping, aligned with the rows of the feature matrix
+    if 'cas' in chem_df.columns:
+        cas_numbers = chem_df['cas'].to_numpy(dtype=object)
+    else:
+        cas_numbers = np.full(len(chem_df), None, dtype=object)
+    
+    return {
+        'names': chem_df.index.to_numpy(dtype=object),
+        'cas_numbers': cas_numbers,
+        'chemical_matrix': chemical_matrix,
+        'values': values,
+        'norms': np.linalg.norm(values, axis=1)
+    }
+
+def get_chemical_library(cas_df, common_cols):
+    """
+    Return the prepared chemical library for cas_df, building it on first use.
+    
+    Libraries are cached per DataFrame object and feature columns, so cas_df
+    must not be modified in place after it has been ranked against.
+    
+    Parameters:
+    -----------
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features
+    common_cols : list
+        Feature columns shared with the receptor predictions
+        
+    Returns:
+    --------
+    dict
+        The output of prepare_chemical_library
+    """
+    key = (id(cas_df), tuple(common_cols))
+    entry = _LIBRARY_CACHE.get(key)
+    if entry is not None and entry[0]() is cas_df:
+        return entry[1]
+    
+    library = prepare_chemical_library(cas_df, common_cols)
+    if len(_LIBRARY_CACHE) >= _LIBRARY_CACHE_SIZE:
+        _LIBRARY_CACHE.pop(next(iter(_LIBRARY_CACHE)))
+    _LIBRARY_CACHE[key] = (weakref.ref(cas_df), library)
+    return library
+
+def cosine_scores(receptor_vec, values, norms):
+    """
+    Cosine similarity between one receptor vector and every row of a chemical matrix.
+    
+    Zero vectors (on either side) get a similarity of 0.
+    
+    Parameters:
+    -----------
+    receptor_vec : numpy.ndarray
+        Receptor feature vector
+    values : numpy.ndarray
+        Chemical feature matrix (n_chemicals x n_features)
+    norms : numpy.ndarray
+        L2 norms of the rows of values
+        
+    Returns:
+    --------
+    numpy.ndarray
+        Similarity of each chemical to the receptor
+    """
+    receptor_norm = np.linalg.norm(receptor_vec)
+    if receptor_norm == 0:
+        return np.zeros(len(values))
+    
+    denominator = norms * receptor_norm
+    scores = np.divide(values @ receptor_vec, denominator,
+                       out=np.zeros(len(values)), where=denominator > 0)
+    return np.clip(scores, -1.0, 1.0)
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, sorted descending.
+    
+    Uses np.argpartition instead of a full sort. Ties are broken by position,
+    matching a stable descending sort of the whole array.
+    
+    Parameters:
+    -----------
+    scores : numpy.ndarray
+        Scores to rank
+    k : int
+        Number of indices to return
+        
+    Returns:
+    --------
+    numpy.ndarray
+        Indices of the top k scores
+    """
+    n = len(scores)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.array([], dtype=int)
+    if k < n:
+        # Keep every score tied with the k-th best so ties resolve like a stable sort
+        kth_value = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= kth_value)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+@timed
+def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df, top_n=10,
+                                  ann_index=None, probes=None, metric="cosine",
+                                  fingerprints=None, response_threshold=0.5):
     """
     For a given receptor (gene), max-scale its full vector from complete predictions,
-    and search the chemical list for the best match using cosine similarity.
+    and search the chemical list for the best match using cosine similarity
+    (or Tanimoto/Dice on the thresholded profile, see fingerprints.py).
     
     Parameters:
     -----------
@@ -19,6 +185,21 @@ def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df,
         Original label matrix
     top_n : int, default=10
         Number of top chemical matches to return
+    ann_index : dict, optional
+        ANN index of cas_df (see ann_index.load_ann_index). Only the chemicals
+        of its probed cells are scored, so the matches are approximate.
+        Ignored if it was built for other feature columns or another library.
+    probes : int, optional
+        Number of index cells scanned (see ann_index.ann_candidates)
+    metric : str, default="cosine"
+        'cosine', or 'tanimoto'/'dice' between the thresholded receptor profile
+        and the chemical fingerprints
+    fingerprints : dict, optional
+        Packed fingerprint store of cas_df (see fingerprints.load_fingerprint_store)
+        used by 'tanimoto' and 'dice'; packed on the fly if missing or built
+        for another library
+    response_threshold : float, default=0.5
+        Scaled responses at or above this are set bits of the receptor fingerprint
         
     Returns:
     --------
@@ -27,10 +208,8 @@ def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df,
     str or None
         Error message or None if successful
     """
-    # Set 'name' as index for cas_df if not already
-    cas_df_copy = cas_df.copy()
-    if cas_df_copy.index.name != 'name':
-        cas_df_copy.set_index('name', inplace=True)
+    if metric not in ("cosine", "tanimoto", "dice"):
+        raise ValueError(f"Unknown metric '{metric}', expected 'cosine', 'tanimoto' or 'dice'")
 
     # Check receptor exists in predictions
     if receptor_name not in predicted_df.index:
@@ -45,16 +224,13 @@ def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df,
         warning = None
     
     # Find all columns in common (excluding 'cas', 'smiles')
-    exclude_cols = {'cas', 'smiles'}
-    common_cols = [col for col in predicted_df.columns 
-                   if col in cas_df_copy.columns and col not in exclude_cols]
+    common_cols = find_common_columns(predicted_df, cas_df)
     
     if not common_cols:
         return None, "No matching columns found between receptor and chemical data."
 
-    # Extract and align vectors
+    # Extract and align receptor vector
     receptor_vec = predicted_df.loc[receptor_name, common_cols].astype(float).values
-    chemical_matrix = cas_df_copy[common_cols].astype(float).fillna(0)
 
     # Max scaling
     max_value = np.max(receptor_vec)
@@ -63,30 +239,52 @@ def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df,
     else:
         receptor_vec_scaled = receptor_vec
 
-    # Compute cosine similarity for all chemicals
-    similarities = []
-    for chem_name, chem_row in chemical_matrix.iterrows():
-        chem_vec = chem_row.values
-        if np.all(receptor_vec_scaled == 0) or np.all(chem_vec == 0):
-            sim = 0
+    if metric != "cosine":
+        # Popcount Tanimoto/Dice over bit-packed fingerprints; the float library is never built
+        from src.response_explorer.fingerprints import build_fingerprint_store, fingerprint_top_k
+        if (fingerprints is None or len(fingerprints['counts']) != len(cas_df)
+                or fingerprints['columns'].tolist() != common_cols):
+            fingerprints = build_fingerprint_store(cas_df, common_cols)
+        top_idx, top_scores = fingerprint_top_k(
+            receptor_vec_scaled, fingerprints, top_n, metric=metric, threshold=response_threshold
+        )
+        names = fingerprints['names'][top_idx].astype(object)
+        cas_numbers = fingerprints['cas_numbers'][top_idx].astype(object)
+        cas_numbers[cas_numbers == ""] = None
+        # Features of the matches only, for the clustering view
+        chemical_matrix = prepare_chemical_library(cas_df.iloc[top_idx], common_cols)['chemical_matrix']
+    else:
+        # Chemical matrix, norms and CAS numbers are computed once per dataset
+        library = get_chemical_library(cas_df, common_cols)
+        if (ann_index is not None and len(ann_index['order']) == len(library['values'])
+                and ann_index['columns'].tolist() == common_cols):
+            # Approximate: exact cosine over the probed cells only
+            from src.response_explorer.ann_index import DEFAULT_PROBES, ann_top_k
+            top_idx, top_scores = ann_top_k(
+                ann_index, receptor_vec_scaled, library['values'], library['norms'], top_n,
+                probes=DEFAULT_PROBES if probes is None else probes
+            )
         else:
-            sim = 1 - cosine(receptor_vec_scaled, chem_vec)
-        
-        # Get CAS number from DataFrame
-        cas_number = cas_df_copy.loc[chem_name, 'cas'] if 'cas' in cas_df_copy.columns else None
-        similarities.append((chem_name, cas_number, sim))
-
-    # Sort and prepare results
-    similarities.sort(key=lambda x: x[2], reverse=True)
-    results_df = pd.DataFrame(similarities, columns=['Chemical_Name', 'CAS_Number', 'Similarity'])
-    actual_top_n = min(top_n, len(results_df))
+            # Cosine similarity for all chemicals as one matrix-vector product
+            scores = cosine_scores(receptor_vec_scaled, library['values'], library['norms'])
+            top_idx = top_k_indices(scores, top_n)
+            top_scores = scores[top_idx]
+        names = library['names'][top_idx]
+        cas_numbers = library['cas_numbers'][top_idx]
+        chemical_matrix = library['chemical_matrix']
+    actual_top_n = len(top_idx)
+    
+    top_results = pd.DataFrame({
+        'Chemical_Name': names,
+        'CAS_Number': cas_numbers,
+        'Similarity': top_scores
+    })
     
     # Note if this is a newly labeled receptor
     is_new = receptor_name not in label_df.index
     status = "NEWLY LABELED" if is_new else "ORIGINALLY LABELED"
     
     # Prepare data for visualization
-    top_results = results_df.head(actual_top_n)
     top_chems = top_results['Chemical_Name'].tolist()
     
     # Return analysis results
@@ -99,5 +297,6 @@ def compare_receptor_to_chemicals(receptor_name, predicted_df, cas_df, label_df,
         'common_cols': common_cols,
         'top_chems': top_chems,
         'actual_top_n': actual_top_n,
+        'metric': metric,
         'warning': warning
-    }, None
\ No newline at end of file
+    }, None
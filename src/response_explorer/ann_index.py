@@ -0,0 +1,284 @@
+"""
+Approximate nearest-neighbor search over the chemical library.
+
+Inverted-file (IVF) index for cosine similarity. Spherical k-means splits
+the unit chemical vectors into n_cells cells. A query ranks the cell
+centroids by cosine and re-ranks only the chemicals of its `probes` best
+cells with the exact cosine score.
+
+probes is the recall/latency knob, set per query: probing every cell is the
+exact scan. n_cells is fixed at build time and defaults to about sqrt(n).
+More cells make each probe cheaper but need more probes for the same recall.
+
+The index is persisted next to the chemical file and is only reused while
+that file and the feature columns are unchanged. Use it for libraries far
+larger than the shipped one; below tens of thousands of chemicals the exact
+scan is faster.
+
+Command line usage (from the repository root):
+    python -m src.response_explorer.ann_index --data-dir data --cells 1024
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.response_explorer.analysis import (
+    cosine_scores, find_common_columns, prepare_chemical_library, top_k_indices
+)
+from src.response_explorer.batch_scoring import normalize_rows
+from src.perf import timed
+
+CAS_FILENAME = "cas_features_filtered.csv"
+PREDICTED_FILENAME = "propagated_labels_complete.csv"
+INDEX_SUFFIX = ".ivf.npz"
+DEFAULT_PROBES = 16
+# Smallest library for which the app offers the index (exact search stays the
+# default): the exact scan takes about 100 ms per query at 1M chemicals
+MIN_INDEXED_CHEMICALS = 1000000
+TRAINING_ROWS_PER_CELL = 64
+
+
+def default_cells(n_chemicals):
+    """About sqrt(n) cells, the usual IVF balance between centroid and cell scans."""
+    return max(1, int(round(np.sqrt(n_chemicals))))
+
+
+def _assign(unit_values, centroids, block_size):
+    """Nearest centroid of every row, in blocks to bound the n x n_cells product."""
+    cells = np.empty(len(unit_values), dtype=np.int64)
+    for start in range(0, len(unit_values), block_size):
+        block = unit_values[start:start + block_size]
+        cells[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return cells
+
+
+@timed
+def build_ann_index(values, n_cells=None, iterations=10, seed=0, block_size=16384):
+    """
+    Build an IVF index over the rows of a feature matrix.
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Chemical feature matrix (n_chemicals x n_features); rows need not be normalized
+    n_cells : int, optional
+        Number of cells (defaults to default_cells(n_chemicals))
+    iterations : int, default=10
+        Spherical k-means iterations
+    seed : int, default=0
+        Seed of the centroid initialization and training sample
+    block_size : int, default=16384
+        Chemicals assigned to cells at a time
+
+    Returns:
+    --------
+    dict
+        Dictionary containing:
+        - 'centroids': unit cell centroids (n_cells x n_features)
+        - 'order': chemical rows grouped by cell
+        - 'bounds': cell j holds order[bounds[j]:bounds[j + 1]]
+    """
+    unit_values = normalize_rows(np.asarray(values, dtype=float))
+    n_chemicals = len(unit_values)
+    if n_chemicals == 0:
+        raise ValueError("Cannot index an empty chemical library")
+    n_cells = min(n_cells or default_cells(n_chemicals), n_chemicals)
+    rng = np.random.default_rng(seed)
+
+    # Train on a sample; assigning every chemical each iteration buys little
+    n_train = min(n_chemicals, n_cells * TRAINING_ROWS_PER_CELL)
+    train = unit_values[np.sort(rng.choice(n_chemicals, n_train, replace=False))]
+    centroids = train[rng.choice(n_train, n_cells, replace=False)].copy()
+    for _ in range(iterations):
+        cells = _assign(train, centroids, block_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, cells, train)
+        # Empty cells keep their previous centroid
+        filled = np.bincount(cells, minlength=n_cells) > 0
+        centroids[filled] = normalize_rows(sums[filled])
+
+    cells = _assign(unit_values, centroids, block_size)
+    order = np.argsort(cells, kind='stable').astype(np.int64)
+    return {
+        'centroids': centroids,
+        'order': order,
+        'bounds': np.searchsorted(cells[order], np.arange(n_cells + 1)).astype(np.int64)
+    }
+
+
+def ann_candidates(index, query, probes=DEFAULT_PROBES):
+    """
+    Rows of the chemicals in the cells closest to the query.
+
+    Parameters:
+    -----------
+    index : dict
+        Output of build_ann_index
+    query : numpy.ndarray
+        Query feature vector
+    probes : int, default=16
+        Number of cells scanned
+
+    Returns:
+    --------
+    numpy.ndarray
+        Chemical rows, grouped by cell
+    """
+    bounds, order = index['bounds'], index['order']
+    cells = top_k_indices(index['centroids'] @ np.asarray(query, dtype=float), max(probes, 1))
+    return np.concatenate([order[bounds[cell]:bounds[cell + 1]] for cell in cells])
+
+
+@timed
+def ann_top_k(index, query, values, norms, k, probes=DEFAULT_PROBES):
+    """
+    Approximate top-k chemicals by cosine similarity.
+
+    Candidates from the index are scored exactly. If there are fewer than k
+    candidates, the whole library is scanned instead.
+
+    Parameters:
+    -----------
+    index : dict
+        Output of build_ann_index over values
+    query : numpy.ndarray
+        Query feature vector
+    values : numpy.ndarray
+        Chemical feature matrix the index was built from
+    norms : numpy.ndarray
+        L2 norms of the rows of values
+    k : int
+        Number of chemicals to return
+    probes : int, default=16
+        Number of cells scanned
+
+    Returns:
+    --------
+    numpy.ndarray
+        Chemical rows, best first
+    numpy.ndarray
+        Their cosine similarities
+    """
+    candidates = ann_candidates(index, query, probes=probes)
+    if len(candidates) < k:
+        scores = cosine_scores(query, values, norms)
+        top_idx = top_k_indices(scores, k)
+        return top_idx, scores[top_idx]
+    scores = cosine_scores(query, values[candidates], norms[candidates])
+    best = top_k_indices(scores, k)
+    return candidates[best], scores[best]
+
+
+def get_index_path(cas_path):
+    """Path of the persisted ANN index for a chemical feature file."""
+    base, _ = os.path.splitext(cas_path)
+    return f"{base}{INDEX_SUFFIX}"
+
+
+def _source_stamp(file_path):
+    stat = os.stat(file_path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def save_ann_index(index, index_path):
+    """
+    Write an ANN index to an .npz file, replacing any existing file atomically.
+
+    Parameters:
+    -----------
+    index : dict
+        Output of build_ann_index (plus 'columns' and 'source_stamp')
+    index_path : str
+        Destination .npz file
+    """
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **index)
+    os.replace(tmp_path, index_path)
+
+
+def _read_index(index_path):
+    """Load a persisted index, or return None if it is missing or unreadable."""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with np.load(index_path, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+
+
+@timed
+def load_ann_index(data_dir="data", n_cells=None, seed=0, index_path=None):
+    """
+    Load the ANN index of a chemical library, building it if needed.
+
+    The index covers the feature columns shared with the receptor predictions,
+    in the row order of the chemical file, like compare_receptor_to_chemicals.
+
+    Parameters:
+    -----------
+    data_dir : str
+        Path to the directory containing the data files
+    n_cells, seed : int, optional
+        See build_ann_index; an index built with other settings is rebuilt
+    index_path : str, optional
+        Where the index is persisted (defaults to next to the chemical file)
+
+    Returns:
+    --------
+    dict
+        Output of build_ann_index plus 'columns' (the indexed feature columns)
+        and 'source_stamp'
+    """
+    cas_path = os.path.join(data_dir, CAS_FILENAME)
+    predicted_path = os.path.join(data_dir, PREDICTED_FILENAME)
+    for filepath in (cas_path, predicted_path):
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Required file not found: {filepath}")
+    if index_path is None:
+        index_path = get_index_path(cas_path)
+    source_stamp = _source_stamp(cas_path)
+
+    index = _read_index(index_path)
+    settings = np.array([n_cells or 0, seed], dtype=np.int64)
+    if (index is not None and np.array_equal(index.get('source_stamp'), source_stamp)
+            and np.array_equal(index.get('settings'), settings)):
+        return index
+
+    cas_df = pd.read_csv(cas_path)
+    # Only the header of the predictions is needed
+    common_cols = find_common_columns(pd.read_csv(predicted_path, index_col=0, nrows=0), cas_df)
+    library = prepare_chemical_library(cas_df, common_cols)
+
+    index = build_ann_index(library['values'], n_cells=n_cells, seed=seed)
+    index['columns'] = np.array(common_cols, dtype=str)
+    index['settings'] = settings
+    index['source_stamp'] = source_stamp
+    try:
+        save_ann_index(index, index_path)
+    except OSError:
+        pass  # Read-only data directory: keep the index in memory only
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the ANN index of the chemical library.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    parser.add_argument("--cells", type=int, help="Number of cells (default: about sqrt of the library size)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    index = load_ann_index(args.data_dir, n_cells=args.cells, seed=args.seed)
+    sizes = np.diff(index['bounds'])
+    print(f"Indexed {len(index['order'])} chemicals in {len(sizes)} cells "
+          f"(largest {sizes.max()}) in {time.perf_counter() - start_time:.2f} s "
+          f"-> {get_index_path(os.path.join(args.data_dir, CAS_FILENAME))}")
+
+
+if __name__ == "__main__":
+    main()
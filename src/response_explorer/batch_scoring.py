@@ -0,0 +1,327 @@
+"""
+Batch scoring of every receptor against every chemical.
+
+Uses the same max-scaling and cosine similarity as compare_receptor_to_chemicals.
+The score matrix is computed as chunked BLAS matrix products. Only a running
+top-k per receptor is kept, so memory stays bounded for large libraries.
+
+Command line usage (from the repository root):
+    python -m src.response_explorer.batch_scoring --output top_matches.csv
+
+Parquet output (--output top_matches.parquet) needs pyarrow, listed in
+requirement-optional.txt.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.response_explorer.analysis import find_common_columns, prepare_chemical_library
+from src.response_explorer.data_loader import load_response_explorer_data
+from src.perf import timed
+
+
+def normalize_rows(values):
+    """
+    Scale every row of a matrix to unit L2 norm, leaving zero rows at zero.
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        2D array to normalize
+
+    Returns:
+    --------
+    numpy.ndarray
+        Row-normalized copy of values
+    """
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return np.divide(values, norms, out=np.zeros_like(values, dtype=float), where=norms > 0)
+
+
+def max_scale_rows(values):
+    """
+    Divide every row by its maximum, as compare_receptor_to_chemicals does per receptor.
+    Rows whose maximum is not positive are left unchanged.
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        2D array of receptor predictions
+
+    Returns:
+    --------
+    numpy.ndarray
+        Max-scaled copy of values
+    """
+    max_values = values.max(axis=1, keepdims=True)
+    return np.divide(values, max_values, out=values.astype(float), where=max_values > 0)
+
+
+def receptor_unit_vectors(predicted_df, common_cols):
+    """
+    Max-scale and row-normalize receptor predictions for cosine scoring.
+
+    Parameters:
+    -----------
+    predicted_df : pandas.DataFrame
+        DataFrame containing the complete propagated predictions
+    common_cols : list
+        Feature columns shared with the chemical data
+
+    Returns:
+    --------
+    numpy.ndarray
+        Unit-length receptor vectors (zero rows stay zero)
+    """
+    receptor_values = predicted_df[common_cols].astype(float).to_numpy()
+    return normalize_rows(max_scale_rows(receptor_values))
+
+
+def select_top_k(scores, indices, k):
+    """
+    Keep the k best scores of every row, sorted descending.
+
+    Ties are broken by the lower target index, which matches the ordering of
+    compare_receptor_to_chemicals.
+
+    Parameters:
+    -----------
+    scores : numpy.ndarray
+        2D array of candidate scores (n_queries x n_candidates)
+    indices : numpy.ndarray
+        Target index of every candidate, same shape as scores
+    k : int
+        Number of candidates to keep per row
+
+    Returns:
+    --------
+    tuple
+        (scores, indices) arrays of shape (n_queries, min(k, n_candidates))
+    """
+    n_candidates = scores.shape[1]
+    if k <= 0:
+        return scores[:, :0], indices[:, :0]
+    if k < n_candidates:
+        partition = np.argpartition(-scores, k - 1, axis=1)
+        kth_values = np.take_along_axis(scores, partition[:, k - 1:k], axis=1)
+        selected = partition[:, :k]
+
+        # Rows with ties across the cut-off are resolved exactly, one by one
+        tied_rows = np.flatnonzero((scores >= kth_values).sum(axis=1) > k)
+        for row in tied_rows:
+            candidates = np.flatnonzero(scores[row] >= kth_values[row, 0])
+            order = np.lexsort((indices[row, candidates], -scores[row, candidates]))
+            selected[row] = candidates[order[:k]]
+
+        scores = np.take_along_axis(scores, selected, axis=1)
+        indices = np.take_along_axis(indices, selected, axis=1)
+
+    # Sort the kept candidates by score, then by target index
+    order = np.lexsort((indices, -scores), axis=-1)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+def _score_chunk(query_block, target_unit, start, stop, k):
+    """Score one query block against targets [start, stop) and keep its top k."""
+    scores = query_block @ target_unit[start:stop].T
+    np.clip(scores, -1.0, 1.0, out=scores)
+    indices = np.broadcast_to(np.arange(start, stop), scores.shape)
+    return select_top_k(scores, indices, k)
+
+
+@timed
+def chunked_top_k(query_unit, target_unit, k, chunk_size=4096,
+                  query_chunk_size=1024, workers=1):
+    """
+    Top-k cosine matches of every query row among the target rows.
+
+    Both inputs must already be row-normalized. The full score matrix is never
+    held: queries are processed in blocks of query_chunk_size, and each block is
+    multiplied against chunk_size targets at a time. Peak memory for scores is
+    about workers * query_chunk_size * chunk_size * 8 bytes.
+
+    Parameters:
+    -----------
+    query_unit : numpy.ndarray
+        Row-normalized query vectors (n_queries x n_features)
+    target_unit : numpy.ndarray
+        Row-normalized target vectors (n_targets x n_features)
+    k : int
+        Number of matches to keep per query
+    chunk_size : int, default=4096
+        Number of targets per matrix product
+    query_chunk_size : int, default=1024
+        Number of queries per matrix product
+    workers : int, default=1
+        Number of threads multiplying target chunks in parallel
+
+    Returns:
+    --------
+    tuple
+        (scores, indices) arrays of shape (n_queries, min(k, n_targets))
+    """
+    n_queries, n_targets = len(query_unit), len(target_unit)
+    k = max(0, min(k, n_targets))
+    chunk_size = max(1, chunk_size)
+    query_chunk_size = max(1, query_chunk_size)
+    chunk_starts = range(0, n_targets, chunk_size)
+
+    block_scores, block_indices = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for q_start in range(0, n_queries, query_chunk_size):
+            query_block = query_unit[q_start:q_start + query_chunk_size]
+            best_scores = np.empty((len(query_block), 0))
+            best_indices = np.empty((len(query_block), 0), dtype=int)
+
+            # NumPy releases the GIL inside the matrix product, so threads scale
+            chunk_results = executor.map(
+                lambda t_start: _score_chunk(query_block, target_unit, t_start,
+                                             min(t_start + chunk_size, n_targets), k),
+                chunk_starts
+            )
+            for chunk_scores, chunk_indices in chunk_results:
+                best_scores, best_indices = select_top_k(
+                    np.hstack([best_scores, chunk_scores]),
+                    np.hstack([best_indices, chunk_indices]),
+                    k
+                )
+            block_scores.append(best_scores)
+            block_indices.append(best_indices)
+
+    if not block_scores:
+        return np.empty((0, k)), np.empty((0, k), dtype=int)
+    return np.vstack(block_scores), np.vstack(block_indices)
+
+
+@timed
+def score_all_receptors(predicted_df, cas_df, top_k=10, chunk_size=4096,
+                        receptor_chunk_size=1024, workers=1):
+    """
+    Compute the top-k chemical matches for every receptor.
+
+    Parameters:
+    -----------
+    predicted_df : pandas.DataFrame
+        DataFrame containing the complete propagated predictions
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features
+    top_k : int, default=10
+        Number of chemical matches to keep per receptor
+    chunk_size : int, default=4096
+        Number of chemicals per matrix product
+    receptor_chunk_size : int, default=1024
+        Number of receptors per matrix product
+    workers : int, default=1
+        Number of threads multiplying chemical chunks in parallel
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Long-format table with columns Receptor, Rank, Chemical_Name,
+        CAS_Number and Similarity
+    dict
+        Throughput report with receptors, chemicals, pairs, seconds and pairs_per_sec
+    """
+    if top_k < 1:
+        raise ValueError(f"top_k must be at least 1, got {top_k}")
+    start_time = time.perf_counter()
+
+    common_cols = find_common_columns(predicted_df, cas_df)
+    if not common_cols:
+        raise ValueError("No matching columns found between receptor and chemical data.")
+
+    library = prepare_chemical_library(cas_df, common_cols)
+    chemical_unit = normalize_rows(library['values'])
+    receptor_unit = receptor_unit_vectors(predicted_df, common_cols)
+
+    scores, indices = chunked_top_k(
+        receptor_unit, chemical_unit, top_k,
+        chunk_size=chunk_size, query_chunk_size=receptor_chunk_size, workers=workers
+    )
+    n_receptors, n_chemicals = len(receptor_unit), len(chemical_unit)
+    k = scores.shape[1]
+
+    results_df = pd.DataFrame({
+        'Receptor': np.repeat(predicted_df.index.to_numpy(), k),
+        'Rank': np.tile(np.arange(1, k + 1), n_receptors),
+        'Chemical_Name': library['names'][indices.ravel()],
+        'CAS_Number': library['cas_numbers'][indices.ravel()],
+        'Similarity': scores.ravel()
+    })
+
+    seconds = time.perf_counter() - start_time
+    pairs = n_receptors * n_chemicals
+    report = {
+        'receptors': n_receptors,
+        'chemicals': n_chemicals,
+        'pairs': pairs,
+        'seconds': seconds,
+        'pairs_per_sec': pairs / seconds if seconds > 0 else float('inf')
+    }
+    return results_df, report
+
+
+def write_results(results_df, output_path):
+    """
+    Write batch results to Parquet (.parquet) or CSV (any other extension).
+
+    Parquet needs pyarrow; without it an ImportError names the package.
+
+    Parameters:
+    -----------
+    results_df : pandas.DataFrame
+        Output of score_all_receptors
+    output_path : str
+        Destination file
+    """
+    if os.path.splitext(output_path)[1].lower() in {'.parquet', '.pq'}:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow "
+                              "(or write a .csv file)") from None
+        results_df.to_parquet(output_path, index=False)
+    else:
+        results_df.to_csv(output_path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score every receptor against every chemical and write the top-k matches."
+    )
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    parser.add_argument("--output", default="top_matches.csv",
+                        help="Output file (.parquet or .csv)")
+    parser.add_argument("--top-k", type=int, default=10, help="Matches to keep per receptor")
+    parser.add_argument("--chunk-size", type=int, default=4096,
+                        help="Chemicals per matrix product")
+    parser.add_argument("--receptor-chunk-size", type=int, default=1024,
+                        help="Receptors per matrix product")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel worker threads")
+    args = parser.parse_args(argv)
+    if args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+
+    data_dict = load_response_explorer_data(data_dir=args.data_dir)
+    results_df, report = score_all_receptors(
+        data_dict['predicted_df'],
+        data_dict['cas_df'],
+        top_k=args.top_k,
+        chunk_size=args.chunk_size,
+        receptor_chunk_size=args.receptor_chunk_size,
+        workers=args.workers
+    )
+    write_results(results_df, args.output)
+
+    print(f"Scored {report['receptors']} receptors x {report['chemicals']} chemicals "
+          f"({report['pairs']} pairs) in {report['seconds']:.3f} s "
+          f"= {report['pairs_per_sec']:,.0f} pairs/sec")
+    print(f"Wrote {len(results_df)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
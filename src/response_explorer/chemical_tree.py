@@ -0,0 +1,372 @@
+"""
+Global hierarchical clustering of the chemical library.
+
+All chemicals in cas_features_filtered.csv are clustered once per dataset.
+The result is persisted next to the data file with its leaf order. Clustering
+uses Ward linkage on L2-normalized feature vectors; the squared distance
+between two unit vectors is twice their cosine distance. A receptor's
+dendrogram is the subtree induced by its top chemicals, so no distances or
+linkage are computed per receptor.
+
+Up to MAX_PDIST_CHEMICALS chemicals, scipy's linkage is used. For larger
+libraries the condensed distance matrix (n^2 / 2 doubles) does not fit in
+memory. Those use a nearest-neighbor-chain Ward linkage over cluster
+centroids, which needs O(n) memory. Identical feature vectors are merged
+first, at height 0.
+
+Command line usage (from the repository root):
+    python -m src.response_explorer.chemical_tree --data-dir data
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.cluster.hierarchy as sch
+
+from src.response_explorer.batch_scoring import normalize_rows
+from src.perf import timed
+
+CAS_FILENAME = "cas_features_filtered.csv"
+NON_FEATURE_COLUMNS = ('cas', 'name', 'smiles')
+# 5000 chemicals -> 100 MB condensed distance matrix
+MAX_PDIST_CHEMICALS = 5000
+
+
+def get_tree_path(cas_path):
+    """Path of the persisted chemical tree for a chemical feature file."""
+    base, _ = os.path.splitext(cas_path)
+    return f"{base}.tree_ward.npz"
+
+
+def _source_stamp(file_path):
+    stat = os.stat(file_path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def _label_merges(merges, n):
+    """
+    Turn (leaf_a, leaf_b, height) merges into a scipy linkage matrix.
+
+    Each merge names any leaf of each of the two clusters. Merges are sorted
+    by height (stably) and cluster ids are assigned with a union-find, as
+    scipy does for its own nearest-neighbor-chain output.
+    """
+    merges = sorted(merges, key=lambda merge: merge[2])
+    root = np.arange(n)
+    cluster_id = np.arange(n)
+    cluster_size = np.ones(n, dtype=int)
+
+    def find(i):
+        while root[i] != i:
+            root[i] = root[root[i]]
+            i = root[i]
+        return i
+
+    Z = np.empty((len(merges), 4))
+    for row, (a, b, height) in enumerate(merges):
+        ra, rb = find(a), find(b)
+        id_a, id_b = cluster_id[ra], cluster_id[rb]
+        Z[row] = (min(id_a, id_b), max(id_a, id_b), height, cluster_size[ra] + cluster_size[rb])
+        root[rb] = ra
+        cluster_id[ra] = n + row
+        cluster_size[ra] += cluster_size[rb]
+    return Z
+
+
+@timed
+def nn_chain_ward(values, sizes=None):
+    """
+    Ward linkage by nearest-neighbor chains, without a distance matrix.
+
+    Ward distances are computed from cluster centroids and sizes:
+    d(u, v) = sqrt(2 |u| |v| / (|u| + |v|)) * ||c_u - c_v||, as in scipy.
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Observations (n x d)
+    sizes : numpy.ndarray, optional
+        Number of observations each row stands for (defaults to 1)
+
+    Returns:
+    --------
+    list
+        (row_a, row_b, height) merges, in the order they were found
+    """
+    centroids = np.array(values, dtype=float)
+    n = len(centroids)
+    size = np.ones(n) if sizes is None else np.asarray(sizes, dtype=float).copy()
+    squared_norms = np.einsum('ij,ij->i', centroids, centroids)
+    # Row of every slot; slots of merged-away clusters are dropped now and then
+    rows = np.arange(n)
+    inactive = np.zeros(n, dtype=bool)
+
+    merges = []
+    chain = []
+    while len(merges) < n - 1:
+        if 2 * inactive.sum() > len(rows):
+            keep = np.flatnonzero(~inactive)
+            slot = np.cumsum(~inactive) - 1
+            chain = [int(slot[c]) for c in chain]
+            centroids, size, squared_norms, rows = centroids[keep], size[keep], squared_norms[keep], rows[keep]
+            inactive = np.zeros(len(rows), dtype=bool)
+        if not chain:
+            chain.append(int(np.argmin(inactive)))
+        a = chain[-1]
+
+        squared = np.maximum(squared_norms + squared_norms[a] - 2 * (centroids @ centroids[a]), 0)
+        ward = 2 * size * size[a] / (size + size[a]) * squared
+        ward[inactive] = np.inf
+        ward[a] = np.inf
+        b = int(np.argmin(ward))
+        # Prefer the previous chain element on ties so the chain terminates
+        if len(chain) > 1 and ward[chain[-2]] <= ward[b]:
+            b = chain[-2]
+
+        if len(chain) > 1 and b == chain[-2]:
+            chain.pop()
+            chain.pop()
+            merges.append((int(rows[a]), int(rows[b]), float(np.sqrt(ward[b]))))
+            # The merged cluster lives in slot a
+            total = size[a] + size[b]
+            centroids[a] = (size[a] * centroids[a] + size[b] * centroids[b]) / total
+            squared_norms[a] = centroids[a] @ centroids[a]
+            size[a] = total
+            inactive[b] = True
+        else:
+            chain.append(b)
+    return merges
+
+
+@timed
+def ward_linkage(values, max_pdist=MAX_PDIST_CHEMICALS):
+    """
+    Ward linkage matrix of the rows of values.
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Observations (n x d)
+    max_pdist : int, default=MAX_PDIST_CHEMICALS
+        Largest n clustered with scipy's linkage (O(n^2) memory); larger inputs
+        use nn_chain_ward on the distinct rows (O(n) memory)
+
+    Returns:
+    --------
+    numpy.ndarray
+        scipy linkage matrix ((n - 1) x 4)
+    """
+    n = len(values)
+    if n <= max_pdist:
+        return sch.linkage(values, method='ward')
+
+    # Identical rows are merged at height 0 before clustering the distinct rows
+    distinct, first, inverse, counts = np.unique(
+        values, axis=0, return_index=True, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.ravel()
+    duplicates = np.flatnonzero(first[inverse] != np.arange(n))
+    merges = [(int(first[inverse[i]]), int(i), 0.0) for i in duplicates]
+    merges += [
+        (int(first[a]), int(first[b]), height)
+        for a, b, height in nn_chain_ward(distinct, sizes=counts)
+    ]
+    return _label_merges(merges, n)
+
+
+def feature_columns(cas_df):
+    """Feature columns of a chemical table (everything except cas, name and smiles)."""
+    return [col for col in cas_df.columns if col not in NON_FEATURE_COLUMNS]
+
+
+@timed
+def build_chemical_tree(cas_df, max_pdist=MAX_PDIST_CHEMICALS):
+    """
+    Cluster every chemical of a library.
+
+    Parameters:
+    -----------
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features, with a 'name' column or index
+    max_pdist : int, default=MAX_PDIST_CHEMICALS
+        See ward_linkage
+
+    Returns:
+    --------
+    dict
+        Dictionary containing:
+        - 'names': chemical names in row order
+        - 'linkage': scipy linkage matrix over those rows
+        - 'leaf_order': rows in dendrogram leaf order
+    """
+    chem_df = cas_df if cas_df.index.name == 'name' else cas_df.set_index('name')
+    values = chem_df[feature_columns(chem_df)].astype(float).fillna(0).to_numpy()
+    linkage = ward_linkage(normalize_rows(values), max_pdist=max_pdist)
+    return {
+        'names': chem_df.index.to_numpy(dtype=str),
+        'linkage': linkage,
+        'leaf_order': sch.leaves_list(linkage)
+    }
+
+
+def save_chemical_tree(tree, tree_path):
+    """
+    Write a chemical tree to an .npz file, replacing any existing file atomically.
+
+    Parameters:
+    -----------
+    tree : dict
+        Output of build_chemical_tree (plus 'source_stamp')
+    tree_path : str
+        Destination .npz file
+    """
+    arrays = {key: tree[key] for key in ('names', 'linkage', 'leaf_order', 'source_stamp')}
+    tmp_path = f"{tree_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, tree_path)
+
+
+def _read_tree(tree_path, source_stamp):
+    """Load a persisted tree, or return None if it is missing, unreadable or stale."""
+    if not os.path.exists(tree_path):
+        return None
+    try:
+        with np.load(tree_path, allow_pickle=False) as data:
+            if not np.array_equal(data['source_stamp'], source_stamp):
+                return None
+            return {key: data[key] for key in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _attach_structure(tree):
+    """Add the name -> leaf mapping, parent pointers and leaf ranks used by queries."""
+    n = len(tree['names'])
+    linkage = tree['linkage']
+    parent = np.full(2 * n - 1, -1, dtype=np.int64)
+    children = linkage[:, :2].astype(np.int64)
+    parent[children[:, 0]] = np.arange(n, 2 * n - 1)
+    parent[children[:, 1]] = np.arange(n, 2 * n - 1)
+    leaf_rank = np.empty(n, dtype=np.int64)
+    leaf_rank[tree['leaf_order']] = np.arange(n)
+
+    tree['positions'] = {name: i for i, name in enumerate(tree['names'].tolist())}
+    tree['parent'] = parent
+    tree['children'] = children
+    tree['leaf_rank'] = leaf_rank
+    return tree
+
+
+@timed
+def load_chemical_tree(data_dir="data", tree_path=None):
+    """
+    Load the global chemical tree, building and persisting it if needed.
+
+    Parameters:
+    -----------
+    data_dir : str
+        Path to the directory containing cas_features_filtered.csv
+    tree_path : str, optional
+        Where the tree is persisted (defaults to next to the chemical file)
+
+    Returns:
+    --------
+    dict
+        Output of build_chemical_tree with 'positions' (name -> row),
+        'parent', 'children' and 'leaf_rank' (position of every row in leaf order)
+    """
+    cas_path = os.path.join(data_dir, CAS_FILENAME)
+    if not os.path.exists(cas_path):
+        raise FileNotFoundError(f"Required file not found: {cas_path}")
+    if tree_path is None:
+        tree_path = get_tree_path(cas_path)
+    source_stamp = _source_stamp(cas_path)
+
+    tree = _read_tree(tree_path, source_stamp)
+    if tree is None:
+        tree = build_chemical_tree(pd.read_csv(cas_path))
+        tree['source_stamp'] = source_stamp
+        try:
+            save_chemical_tree(tree, tree_path)
+        except OSError:
+            pass  # Read-only data directory: keep the tree in memory only
+    return _attach_structure(tree)
+
+
+def induced_linkage(tree, names):
+    """
+    Linkage matrix of the subtree of the global tree induced by some chemicals.
+
+    A global merge is kept when both of its sides contain selected chemicals,
+    at its global height. Only the ancestors of the selected leaves are visited.
+
+    Parameters:
+    -----------
+    tree : dict
+        Output of load_chemical_tree
+    names : list
+        Distinct chemical names (at least two)
+
+    Returns:
+    --------
+    numpy.ndarray
+        scipy linkage matrix ((len(names) - 1) x 4) whose leaf i is names[i]
+
+    Raises:
+    -------
+    ValueError
+        If a chemical is not in the tree
+    """
+    n = len(tree['names'])
+    k = len(names)
+    parent, children, linkage = tree['parent'], tree['children'], tree['linkage']
+
+    # Number of selected leaves below every ancestor of a selected leaf
+    below = {}
+    representative = {}
+    for i, name in enumerate(names):
+        leaf = tree['positions'].get(name)
+        if leaf is None:
+            raise ValueError(f"Chemical '{name}' not found in the chemical tree")
+        representative[leaf] = i
+        node = leaf
+        while node != -1:
+            below[node] = below.get(node, 0) + 1
+            node = parent[node]
+
+    Z = np.empty((k - 1, 4))
+    row = 0
+    # Global node ids increase with merge order, so children come before parents
+    for node in sorted(node for node in below if node >= n):
+        a, b = children[node - n]
+        if a in below and b in below:
+            ra, rb = representative[a], representative[b]
+            Z[row] = (min(ra, rb), max(ra, rb), linkage[node - n, 2], below[node])
+            representative[node] = k + row
+            row += 1
+        else:
+            representative[node] = representative[a if a in below else b]
+    return Z
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster the whole chemical library and persist the tree.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    parser.add_argument("--max-pdist", type=int, default=MAX_PDIST_CHEMICALS,
+                        help="Largest library clustered with scipy's O(n^2)-memory linkage")
+    args = parser.parse_args(argv)
+
+    cas_path = os.path.join(args.data_dir, CAS_FILENAME)
+    start_time = time.perf_counter()
+    tree = build_chemical_tree(pd.read_csv(cas_path), max_pdist=args.max_pdist)
+    tree['source_stamp'] = _source_stamp(cas_path)
+    save_chemical_tree(tree, get_tree_path(cas_path))
+    print(f"Clustered {len(tree['names'])} chemicals in {time.perf_counter() - start_time:.2f} s "
+          f"-> {get_tree_path(cas_path)}")
+
+
+if __name__ == "__main__":
+    main()
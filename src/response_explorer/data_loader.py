@@ -1,8 +1,10 @@
 import os
 import pandas as pd
-import streamlit as st
 
+from src.perf import timed
 
+
+@timed
 def load_response_explorer_data(data_dir="data"):
     """
     Load all required data files for the Response Explorer component.
@@ -0,0 +1,455 @@
+"""
+SMILES -> Group/Fragment featurization for new chemicals.
+
+Each input SMILES is parsed with RDKit, canonicalized, and matched against
+one SMARTS pattern per feature column of the chemical library. A feature is
+1 if the molecule contains the pattern, as in cas_features_filtered.csv.
+
+The functional groups drawn in images/groups_highdef have standard SMARTS
+definitions, which are built in (GROUP_SMARTS). The MCS fragments in
+images/fragments_highdef, Group8 and Group25 (Terpene) exist in the
+repository only as images. Their SMARTS must be supplied in a patterns CSV
+(columns 'feature' and 'smarts'), which also overrides built-in groups.
+Featurizing into a library whose columns lack a pattern is an error rather
+than a silent column of zeros. Without a patterns CSV, --available
+featurizes only the columns that have a pattern (the built-in groups).
+
+--check featurizes the `smiles` of the chemical file itself and reports
+every row whose flags differ from the shipped ones, column by column. Run
+it before trusting a pattern set, built-in or supplied.
+
+The input is streamed in chunks to a process pool. Every worker compiles
+the patterns once. Results are cached by canonical SMILES: molecules in the
+cache file and repeats within a chunk skip the substructure search. With
+one worker the cache also grows during the run, so every repeat is a hit.
+With several workers, each only gets the cache as it was at the start of
+the run, so a molecule repeated across chunks is featurized again.
+New rows can be appended straight to the chemical file. The packed
+fingerprint store is then rebuilt, and the other indexes rebuild on next
+use because the file's stamp changed.
+
+RDKit is only needed here (pip install rdkit, see requirement-optional.txt);
+nothing else imports this module.
+
+Command line usage (from the repository root):
+    python -m src.response_explorer.featurize --check
+    python -m src.response_explorer.featurize new_chemicals.csv --available --output groups.csv
+    python -m src.response_explorer.featurize new_chemicals.csv --patterns patterns.csv --output features.csv
+    python -m src.response_explorer.featurize new_chemicals.csv --patterns patterns.csv --append --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.response_explorer.chemical_tree import feature_columns
+from src.perf import timed
+
+CAS_FILENAME = "cas_features_filtered.csv"
+
+# Functional groups of images/groups_highdef, keyed by feature column
+GROUP_SMARTS = {
+    'Group1': "[OX2H][CX4]",                         # Alcohol
+    'Group2': "[CX3H1](=O)",                         # Aldehyde
+    'Group3': "[#6][CX3](=O)[#6]",                   # Ketone
+    'Group4': "[CX3](=O)[OX2H1]",                    # Carboxylic acid
+    'Group5': "[#6][CX3](=O)[OX2H0][#6]",            # Ester
+    'Group6': "[OD2]([#6])[#6]",                     # Ether
+    'Group7': "[OX2H]c",                             # Phenol
+    'Group9': "[NX3;H2;!$(NC=O)][#6]",               # Primary amine
+    'Group10': "[NX3;H1;!$(NC=O)]([#6])[#6]",        # Secondary amine
+    'Group11': "[NX3;H0;!$(NC=O)]([#6])([#6])[#6]",  # Tertiary amine
+    'Group12': "[NX3][CX3](=O)",                     # Amide
+    'Group13': "[NX1]#[CX2]",                        # Nitrile
+    'Group16': "[#16X2]([#6])[#6]",                  # Thioether
+    'Group17': "[#6][CX3](=O)[SX2][#6]",             # Thioester
+    'Group18': "[#6]F",                              # Fluoride
+    'Group19': "[#6]Cl",                             # Chloride
+    'Group20': "[#6]Br",                             # Bromide
+    'Group21': "[#6]I",                              # Iodide
+    'Group22': "[CX3]=[CX3]",                        # Alkene
+    'Group23': "[CX2]#[CX2]",                        # Alkyne
+    'Group24': "a",                                  # Aromatic ring
+}
+
+# Compiled patterns and feature cache of a worker process, set once by _init_worker
+_compiled = None
+_worker_cache = {}
+
+
+def _import_rdkit():
+    try:
+        from rdkit import Chem, RDLogger
+    except ImportError as e:
+        raise ImportError("SMILES featurization requires RDKit: pip install rdkit") from e
+    # Unparseable SMILES are reported per row, not logged by RDKit
+    RDLogger.DisableLog('rdApp.*')
+    return Chem
+
+
+def _read_patterns(patterns_path=None):
+    """GROUP_SMARTS updated with the patterns CSV, if any."""
+    patterns = dict(GROUP_SMARTS)
+    if patterns_path is not None:
+        if not os.path.exists(patterns_path):
+            raise FileNotFoundError(f"Required file not found: {patterns_path}")
+        patterns_df = pd.read_csv(patterns_path, dtype=str)
+        patterns.update(zip(patterns_df['feature'], patterns_df['smarts']))
+    return patterns
+
+
+def available_columns(columns, patterns_path=None):
+    """The columns that have a SMARTS pattern (built in or in the patterns CSV), in order."""
+    patterns = _read_patterns(patterns_path)
+    return [col for col in columns if col in patterns]
+
+
+def load_patterns(columns, patterns_path=None):
+    """
+    SMARTS pattern of every feature column.
+
+    Parameters:
+    -----------
+    columns : list
+        Feature columns to featurize, in output order
+    patterns_path : str, optional
+        CSV with 'feature' and 'smarts' columns; adds to and overrides GROUP_SMARTS
+
+    Returns:
+    --------
+    dict
+        Feature column -> SMARTS, in the order of columns
+
+    Raises:
+    -------
+    ValueError
+        If a column has no pattern
+    """
+    patterns = _read_patterns(patterns_path)
+
+    missing = [col for col in columns if col not in patterns]
+    if missing:
+        raise ValueError(f"No SMARTS pattern for {len(missing)} feature(s): {', '.join(missing)}. "
+                         f"Add them to a patterns CSV (columns 'feature', 'smarts').")
+    return {col: patterns[col] for col in columns}
+
+
+def compile_patterns(patterns):
+    """
+    Parse SMARTS patterns once, in pattern order.
+
+    Raises:
+    -------
+    ValueError
+        If a pattern is not valid SMARTS
+    """
+    Chem = _import_rdkit()
+    compiled = []
+    for feature, smarts in patterns.items():
+        query = Chem.MolFromSmarts(smarts)
+        if query is None:
+            raise ValueError(f"Invalid SMARTS for {feature}: {smarts}")
+        compiled.append(query)
+    return compiled
+
+
+def _init_worker(patterns, cache):
+    global _compiled, _worker_cache
+    _compiled = compile_patterns(patterns)
+    _worker_cache = cache
+
+
+def featurize_chunk(smiles):
+    """
+    Canonical SMILES and feature flags of a list of SMILES (in a worker).
+
+    Returns:
+    --------
+    list
+        Canonical SMILES (None where the SMILES could not be parsed)
+    numpy.ndarray
+        Feature flags (len(smiles) x n_features, uint8; zeros for unparsed rows)
+    int
+        Molecules whose features came from the cache
+    """
+    Chem = _import_rdkit()
+    canonical = []
+    flags = np.zeros((len(smiles), len(_compiled)), dtype=np.uint8)
+    seen = {}
+    hits = 0
+    for i, text in enumerate(smiles):
+        mol = Chem.MolFromSmiles(text) if isinstance(text, str) and text else None
+        if mol is None:
+            canonical.append(None)
+            continue
+        key = Chem.MolToSmiles(mol)
+        canonical.append(key)
+        if key in _worker_cache or key in seen:
+            # Same molecule as a cached one or an earlier row of the chunk
+            flags[i] = _worker_cache[key] if key in _worker_cache else flags[seen[key]]
+            hits += 1
+            continue
+        seen[key] = i
+        flags[i] = [mol.HasSubstructMatch(query) for query in _compiled]
+    return canonical, flags, hits
+
+
+def read_cache(cache_path, columns):
+    """Canonical SMILES -> feature flags from a cache .npz, or {} if missing, unreadable or for other columns."""
+    if cache_path is None or not os.path.exists(cache_path):
+        return {}
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            if data['columns'].tolist() != list(columns):
+                return {}
+            return dict(zip(data['smiles'].tolist(), data['flags']))
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def write_cache(cache, cache_path, columns):
+    """Write the cache .npz, replacing any existing file atomically."""
+    flags = np.array(list(cache.values()), dtype=np.uint8).reshape(-1, len(columns))
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, smiles=np.array(list(cache.keys()), dtype=str), flags=flags,
+                 columns=np.array(columns, dtype=str))
+    os.replace(tmp_path, cache_path)
+
+
+def _input_chunks(input_path, chunk_size):
+    for chunk in pd.read_csv(input_path, chunksize=chunk_size, dtype=str):
+        if 'smiles' not in chunk.columns:
+            raise ValueError(f"{input_path} has no 'smiles' column")
+        yield chunk
+
+
+@timed
+def featurize_file(input_path, columns, patterns_path=None, chunk_size=1000, workers=1, cache_path=None):
+    """
+    Featurize every SMILES of a CSV file.
+
+    Parameters:
+    -----------
+    input_path : str
+        CSV with a 'smiles' column and optionally 'name' and 'cas'
+    columns : list
+        Feature columns to produce (normally those of the chemical library)
+    patterns_path : str, optional
+        Patterns CSV (see load_patterns)
+    chunk_size : int, default=1000
+        Molecules per task sent to a worker
+    workers : int, default=1
+        Worker processes (1 featurizes in this process)
+    cache_path : str, optional
+        Cache .npz of canonical SMILES -> features, read before and updated after the run
+
+    Returns:
+    --------
+    pandas.DataFrame
+        cas, name, smiles (canonical) and the feature columns, one row per
+        parsed input molecule, in input order
+    dict
+        Report with 'molecules', 'failed', 'cache_hits', 'seconds' and 'molecules_per_sec'
+    """
+    patterns = load_patterns(columns, patterns_path)
+    compile_patterns(patterns)  # Fail on bad SMARTS before starting workers
+    cache = read_cache(cache_path, columns)
+    start_time = time.perf_counter()
+
+    frames = []
+    failed = 0
+    hits = 0
+
+    def collect(chunk, result):
+        nonlocal failed, hits
+        canonical, flags, chunk_hits = result
+        hits += chunk_hits
+        parsed = np.array([key is not None for key in canonical], dtype=bool)
+        failed += int((~parsed).sum())
+        frame = pd.DataFrame(flags[parsed], columns=columns)
+        kept = chunk[parsed]
+        frame.insert(0, 'smiles', [key for key in canonical if key is not None])
+        frame.insert(0, 'name', kept['name'].to_numpy() if 'name' in kept else frame['smiles'].to_numpy())
+        frame.insert(0, 'cas', kept['cas'].to_numpy() if 'cas' in kept else "")
+        cache.update(zip(frame['smiles'], flags[parsed]))
+        frames.append(frame)
+
+    chunks = _input_chunks(input_path, chunk_size)
+    if workers <= 1:
+        _init_worker(patterns, cache)
+        for chunk in chunks:
+            collect(chunk, featurize_chunk(chunk['smiles'].tolist()))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(patterns, cache)) as executor:
+            # Keep a bounded number of chunks in flight so the input streams
+            pending = []
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(featurize_chunk, chunk['smiles'].tolist())))
+                if len(pending) >= 2 * workers:
+                    chunk, future = pending.pop(0)
+                    collect(chunk, future.result())
+            for chunk, future in pending:
+                collect(chunk, future.result())
+
+    seconds = time.perf_counter() - start_time
+    if frames:
+        features_df = pd.concat(frames, ignore_index=True)
+    else:
+        features_df = pd.DataFrame(columns=['cas', 'name', 'smiles'] + list(columns))
+    if cache_path is not None:
+        write_cache(cache, cache_path, columns)
+
+    molecules = len(features_df) + failed
+    return features_df, {
+        'molecules': molecules,
+        'failed': failed,
+        'cache_hits': hits,
+        'seconds': seconds,
+        'molecules_per_sec': molecules / seconds if seconds > 0 else float('inf')
+    }
+
+
+@timed
+def check_patterns(cas_path, columns, patterns_path=None, max_examples=5):
+    """
+    Featurize the smiles of a chemical file and compare with its stored flags.
+
+    Parameters:
+    -----------
+    cas_path : str
+        Chemical file with a 'smiles' column and the feature columns
+    columns : list
+        Feature columns to check (each needs a pattern, see load_patterns)
+    patterns_path : str, optional
+        Patterns CSV (see load_patterns)
+    max_examples : int, default=5
+        Mismatching chemical names kept per column
+
+    Returns:
+    --------
+    dict
+        Report with 'chemicals', 'unparsed' (names of rows whose SMILES did
+        not parse), 'mismatches' (column -> number of differing parsed rows)
+        and 'examples' (column -> up to max_examples of their names)
+    """
+    if not os.path.exists(cas_path):
+        raise FileNotFoundError(f"Required file not found: {cas_path}")
+    library_df = pd.read_csv(cas_path)
+    if 'smiles' not in library_df.columns:
+        raise ValueError(f"{cas_path} has no 'smiles' column")
+
+    _init_worker(load_patterns(columns, patterns_path), {})
+    canonical, flags, _ = featurize_chunk(library_df['smiles'].tolist())
+    parsed = np.array([key is not None for key in canonical], dtype=bool)
+    names = library_df['name'].to_numpy() if 'name' in library_df else library_df.index.to_numpy()
+    stored = library_df[columns].fillna(0).to_numpy() != 0
+
+    differs = (flags.astype(bool) != stored) & parsed[:, None]
+    return {
+        'chemicals': len(library_df),
+        'unparsed': names[~parsed].tolist(),
+        'mismatches': {col: int(differs[:, j].sum()) for j, col in enumerate(columns)},
+        'examples': {col: names[differs[:, j]][:max_examples].tolist() for j, col in enumerate(columns)}
+    }
+
+
+def append_to_library(features_df, cas_path):
+    """
+    Append featurized chemicals to a chemical file, replacing it atomically.
+
+    Chemicals whose name is already in the file are skipped.
+
+    Returns:
+    --------
+    int
+        Number of chemicals added
+    """
+    library_df = pd.read_csv(cas_path)
+    new_df = features_df[~features_df['name'].isin(library_df['name'])]
+    combined = pd.concat([library_df, new_df[library_df.columns]], ignore_index=True)
+    tmp_path = f"{cas_path}.{os.getpid()}.tmp"
+    combined.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, cas_path)
+    return len(new_df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Featurize SMILES into the Group/Fragment columns of the chemical library.")
+    parser.add_argument("input", nargs="?", help="CSV with a 'smiles' column (and optionally 'name', 'cas')")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the chemical file")
+    parser.add_argument("--patterns", help="CSV of 'feature','smarts' for the fragments and other groups")
+    subset = parser.add_mutually_exclusive_group()
+    subset.add_argument("--columns", nargs="+", help="Featurize only these feature columns")
+    subset.add_argument("--available", action="store_true",
+                        help="Featurize only the feature columns that have a pattern")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the patterns with the flags of the chemical file's own rows, then exit")
+    parser.add_argument("--output", help="Write the featurized chemicals to this CSV")
+    parser.add_argument("--append", action="store_true",
+                        help="Append to the chemical file and rebuild the fingerprint store")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Molecules per worker task")
+    parser.add_argument("--cache", help="Cache .npz of canonical SMILES (default: next to the chemical file)")
+    args = parser.parse_args(argv)
+    if args.input is None and not args.check:
+        parser.error("an input CSV is required unless --check is given")
+    if args.append and (args.columns or args.available):
+        parser.error("--append needs every feature column of the chemical file")
+
+    cas_path = os.path.join(args.data_dir, CAS_FILENAME)
+    cache_path = args.cache or f"{os.path.splitext(cas_path)[0]}.featurize_cache.npz"
+    try:
+        columns = feature_columns(pd.read_csv(cas_path, nrows=0))
+        if args.columns:
+            unknown = [col for col in args.columns if col not in columns]
+            if unknown:
+                parser.error(f"not feature columns of {cas_path}: {', '.join(unknown)}")
+            columns = [col for col in columns if col in args.columns]
+        elif args.available or args.check:
+            columns = available_columns(columns, args.patterns)
+        if args.check:
+            return _print_check(check_patterns(cas_path, columns, patterns_path=args.patterns))
+        features_df, report = featurize_file(
+            args.input, columns, patterns_path=args.patterns, chunk_size=args.chunk_size,
+            workers=args.workers, cache_path=cache_path
+        )
+    except (ValueError, FileNotFoundError, ImportError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"Featurized {report['molecules']} molecules ({report['failed']} unparseable, "
+          f"{report['cache_hits']} from cache) in {report['seconds']:.2f} s "
+          f"= {report['molecules_per_sec']:,.0f} molecules/sec")
+    if args.output:
+        features_df.to_csv(args.output, index=False)
+        print(f"Wrote {len(features_df)} rows to {args.output}")
+    if args.append:
+        from src.response_explorer.fingerprints import load_fingerprint_store
+
+        added = append_to_library(features_df, cas_path)
+        load_fingerprint_store(args.data_dir)
+        print(f"Added {added} chemicals to {cas_path} and rebuilt its fingerprint store")
+    return 0
+
+
+def _print_check(report):
+    """Print a check_patterns report; the exit status is 1 if any row differs."""
+    parsed = report['chemicals'] - len(report['unparsed'])
+    for col, count in report['mismatches'].items():
+        examples = f" (e.g. {', '.join(map(str, report['examples'][col]))})" if count else ""
+        print(f"{col}: {count} of {parsed} rows differ{examples}")
+    if report['unparsed']:
+        print(f"Unparseable SMILES: {', '.join(map(str, report['unparsed']))}")
+    differing = sum(report['mismatches'].values())
+    print(f"{len(report['mismatches'])} columns checked, {differing} differing flags")
+    return 1 if differing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
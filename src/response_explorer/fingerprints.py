@@ -0,0 +1,326 @@
+"""
+Bit-packed chemical fingerprints with popcount Tanimoto and Dice scoring.
+
+The Group/Fragment features are presence flags. As float64 they take 8 bytes
+per bit; packed into uint64 words (np.packbits), a chemical with F features
+takes 8 * ceil(F / 64) bytes. Scoring ANDs the query's words with every
+chemical's words and counts the set bits (np.bitwise_count, or a byte lookup
+table before NumPy 2.0), so a scan touches only the packed words.
+
+A receptor is matched by thresholding its max-scaled predicted profile
+(features at or above the threshold are 'on') and scoring that fingerprint
+with Tanimoto or Dice.
+
+The store is saved next to the chemical file as a .npy of packed words,
+which is memory-mapped on load, plus a small .npz of names, bit counts and
+columns. Like the other persisted files, it is rebuilt when the chemical
+file changes.
+
+Command line usage (from the repository root):
+    python -m src.response_explorer.fingerprints --data-dir data
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.response_explorer.analysis import find_common_columns, top_k_indices
+from src.perf import timed
+
+CAS_FILENAME = "cas_features_filtered.csv"
+PREDICTED_FILENAME = "propagated_labels_complete.csv"
+WORDS_SUFFIX = ".fp.npy"
+META_SUFFIX = ".fp.npz"
+METRICS = ("tanimoto", "dice")
+DEFAULT_THRESHOLD = 0.5
+# Set bits of every byte value, for popcount without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _popcount_table(words):
+    """Set bits of every uint64 element, eight byte lookups each."""
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    byte_counts = _BYTE_POPCOUNT[words.view(np.uint8)]
+    return byte_counts.reshape(words.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+# np.bitwise_count needs NumPy 2.0
+popcount = getattr(np, "bitwise_count", _popcount_table)
+
+
+def pack_fingerprints(values):
+    """
+    Pack presence flags into uint64 words, one row per chemical.
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Feature matrix (n_chemicals x n_features); any non-zero value is a set bit
+
+    Returns:
+    --------
+    numpy.ndarray
+        uint64 words (n_chemicals x ceil(n_features / 64))
+    """
+    bits = np.asarray(values) != 0
+    if bits.ndim == 1:
+        return pack_fingerprints(bits[None, :])[0]
+    n_words = max(1, -(-bits.shape[1] // 64))
+    packed = np.packbits(bits, axis=1, bitorder='little')
+    # Pad every row to whole words before reinterpreting the bytes
+    padded = np.zeros((len(bits), n_words * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view(np.uint64)
+
+
+def bit_counts(words):
+    """Number of set bits in every row of packed words."""
+    return popcount(words).sum(axis=-1, dtype=np.int64)
+
+
+def similarity_scores(query_words, words, counts, metric="tanimoto", block_size=262144):
+    """
+    Tanimoto or Dice similarity between one fingerprint and every stored fingerprint.
+
+    An empty query or chemical fingerprint gets a similarity of 0.
+
+    Parameters:
+    -----------
+    query_words : numpy.ndarray
+        Packed query fingerprint (n_words,)
+    words : numpy.ndarray
+        Packed fingerprints (n_chemicals x n_words), possibly memory-mapped
+    counts : numpy.ndarray
+        Set bits per stored fingerprint
+    metric : str, default="tanimoto"
+        'tanimoto' (|A & B| / |A | B|) or 'dice' (2 |A & B| / (|A| + |B|))
+    block_size : int, default=262144
+        Chemicals scored at a time, bounding the temporaries on large stores
+
+    Returns:
+    --------
+    numpy.ndarray
+        Similarity of each chemical to the query
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+    query_count = int(bit_counts(query_words))
+
+    common = np.empty(len(words), dtype=np.int64)
+    for start in range(0, len(words), block_size):
+        block = words[start:start + block_size]
+        # One word column at a time: summing a (n, n_words) popcount over its short axis is slow
+        block_common = popcount(block[:, 0] & query_words[0]).astype(np.uint16)
+        for word in range(1, block.shape[1]):
+            block_common += popcount(block[:, word] & query_words[word])
+        common[start:start + len(block)] = block_common
+
+    if metric == "tanimoto":
+        denominator = counts + (query_count - common)
+        numerator = common
+    else:
+        denominator = counts + query_count
+        numerator = 2 * common
+    # The denominator is only 0 when both fingerprints are empty, and then so is the numerator
+    return numerator / np.maximum(denominator, 1)
+
+
+def threshold_profile(receptor_vec_scaled, threshold=DEFAULT_THRESHOLD):
+    """Packed fingerprint of the features a max-scaled receptor profile reaches."""
+    return pack_fingerprints(np.asarray(receptor_vec_scaled) >= threshold)
+
+
+@timed
+def fingerprint_top_k(receptor_vec_scaled, store, k, metric="tanimoto", threshold=DEFAULT_THRESHOLD):
+    """
+    Top-k chemicals for a receptor profile by fingerprint similarity.
+
+    Parameters:
+    -----------
+    receptor_vec_scaled : numpy.ndarray
+        Max-scaled receptor profile over store['columns']
+    store : dict
+        Output of build_fingerprint_store or load_fingerprint_store
+    k : int
+        Number of chemicals to return
+    metric : str, default="tanimoto"
+        'tanimoto' or 'dice'
+    threshold : float, default=0.5
+        Features at or above this scaled response form the query fingerprint
+
+    Returns:
+    --------
+    numpy.ndarray
+        Chemical rows, best first
+    numpy.ndarray
+        Their similarities
+    """
+    scores = similarity_scores(threshold_profile(receptor_vec_scaled, threshold),
+                               store['words'], store['counts'], metric=metric)
+    top_idx = top_k_indices(scores, k)
+    return top_idx, scores[top_idx]
+
+
+@timed
+def build_fingerprint_store(cas_df, common_cols, block_size=262144):
+    """
+    Pack the feature columns of a chemical table.
+
+    Parameters:
+    -----------
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features, indexed by or with a 'name' column
+    common_cols : list
+        Feature columns to pack, in bit order
+    block_size : int, default=262144
+        Chemicals packed at a time
+
+    Returns:
+    --------
+    dict
+        Dictionary containing:
+        - 'words': packed fingerprints (n_chemicals x n_words uint64)
+        - 'counts': set bits per chemical
+        - 'names', 'cas_numbers': row labels, as in prepare_chemical_library
+        - 'columns': the packed feature columns
+    """
+    chem_df = cas_df if cas_df.index.name == 'name' else cas_df.set_index('name')
+    features = chem_df[common_cols]
+    words = np.empty((len(chem_df), max(1, -(-len(common_cols) // 64))), dtype=np.uint64)
+    for start in range(0, len(chem_df), block_size):
+        block = features.iloc[start:start + block_size].fillna(0).to_numpy()
+        words[start:start + len(block)] = pack_fingerprints(block)
+
+    # Fixed-width strings, so the metadata loads without pickle
+    if 'cas' in chem_df.columns:
+        cas_numbers = np.array(chem_df['cas'].fillna("").astype(str).tolist(), dtype=str)
+    else:
+        cas_numbers = np.full(len(chem_df), "")
+    return {
+        'words': words,
+        'counts': bit_counts(words),
+        'names': np.array(chem_df.index.astype(str).tolist(), dtype=str),
+        'cas_numbers': cas_numbers,
+        'columns': np.array(common_cols, dtype=str)
+    }
+
+
+def get_store_paths(cas_path):
+    """Paths of the packed words (.npy) and metadata (.npz) for a chemical feature file."""
+    base, _ = os.path.splitext(cas_path)
+    return f"{base}{WORDS_SUFFIX}", f"{base}{META_SUFFIX}"
+
+
+def _source_stamp(file_path):
+    stat = os.stat(file_path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def save_fingerprint_store(store, words_path, meta_path):
+    """
+    Write a fingerprint store, replacing any existing files atomically.
+
+    The metadata is written last and records the shape of the words, so a
+    reader never pairs new metadata with old words.
+
+    Parameters:
+    -----------
+    store : dict
+        Output of build_fingerprint_store (plus 'source_stamp')
+    words_path, meta_path : str
+        Destination .npy and .npz files
+    """
+    tmp_path = f"{words_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, store['words'])
+    os.replace(tmp_path, words_path)
+
+    meta = {key: value for key, value in store.items() if key != 'words'}
+    meta['shape'] = np.array(store['words'].shape, dtype=np.int64)
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **meta)
+    os.replace(tmp_path, meta_path)
+
+
+def _read_store(words_path, meta_path):
+    """Memory-map a persisted store, or return None if it is missing or unreadable."""
+    if not (os.path.exists(words_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with np.load(meta_path, allow_pickle=False) as data:
+            store = {key: data[key] for key in data.files}
+        store['words'] = np.load(words_path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if tuple(store['words'].shape) != tuple(store.get('shape', ())):
+        return None
+    return store
+
+
+@timed
+def load_fingerprint_store(data_dir="data", store_dir=None):
+    """
+    Memory-map the fingerprint store of a chemical library, building it if needed.
+
+    The store covers the feature columns shared with the receptor predictions,
+    in the row order of the chemical file, like compare_receptor_to_chemicals.
+
+    Parameters:
+    -----------
+    data_dir : str
+        Path to the directory containing the data files
+    store_dir : str, optional
+        Where the store is persisted (defaults to next to the chemical file)
+
+    Returns:
+    --------
+    dict
+        Output of build_fingerprint_store plus 'source_stamp'; 'words' is
+        memory-mapped when the store could be written to disk
+    """
+    cas_path = os.path.join(data_dir, CAS_FILENAME)
+    predicted_path = os.path.join(data_dir, PREDICTED_FILENAME)
+    for filepath in (cas_path, predicted_path):
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Required file not found: {filepath}")
+    words_path, meta_path = get_store_paths(cas_path)
+    if store_dir is not None:
+        words_path = os.path.join(store_dir, os.path.basename(words_path))
+        meta_path = os.path.join(store_dir, os.path.basename(meta_path))
+    source_stamp = _source_stamp(cas_path)
+
+    store = _read_store(words_path, meta_path)
+    if store is not None and np.array_equal(store.get('source_stamp'), source_stamp):
+        return store
+
+    cas_df = pd.read_csv(cas_path)
+    # Only the header of the predictions is needed
+    common_cols = find_common_columns(pd.read_csv(predicted_path, index_col=0, nrows=0), cas_df)
+    store = build_fingerprint_store(cas_df, common_cols)
+    store['source_stamp'] = source_stamp
+    try:
+        save_fingerprint_store(store, words_path, meta_path)
+    except OSError:
+        return store  # Read-only data directory: keep the store in memory only
+    return _read_store(words_path, meta_path) or store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the packed fingerprint store of the chemical library.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the data files")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    store = load_fingerprint_store(args.data_dir)
+    n_chemicals, n_words = store['words'].shape
+    n_features = len(store['columns'])
+    print(f"Packed {n_chemicals} chemicals x {n_features} features into {n_words} words each "
+          f"({store['words'].nbytes} bytes vs {n_chemicals * n_features * 8} as float64) "
+          f"in {time.perf_counter() - start_time:.2f} s -> {get_store_paths(os.path.join(args.data_dir, CAS_FILENAME))[0]}")
+
+
+if __name__ == "__main__":
+    main()
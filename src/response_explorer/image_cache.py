@@ -0,0 +1,162 @@
+import base64
+import io
+import os
+import re
+
+from src.data_cache import get_data_cache
+from src.perf import timed
+
+GROUPS_DIR = "images/groups_highdef"
+FRAGMENTS_DIR = "images/fragments_highdef"
+# Thumbnails live under the app's static folder so Streamlit can serve them as files
+STATIC_DIR = "static"
+THUMBNAIL_DIR = os.path.join(STATIC_DIR, "thumbnails")
+
+# Matches "Group12" in "11_Group12_Amide.png" or "Fragment7" in "07_Fragment7.png"
+_FEATURE_PATTERN = re.compile(r"(Group|Fragment)(\d+)(?=[_.])")
+
+
+@timed
+def build_image_manifest(groups_dir=GROUPS_DIR, fragments_dir=FRAGMENTS_DIR):
+    """
+    Map every GroupN / FragmentN feature column to its image file.
+
+    Parameters:
+    -----------
+    groups_dir : str
+        Directory containing the functional group images
+    fragments_dir : str
+        Directory containing the MCS fragment images
+
+    Returns:
+    --------
+    dict
+        Feature name (e.g. 'Group12', 'Fragment7') -> image path
+    """
+    manifest = {}
+    for directory in (groups_dir, fragments_dir):
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            match = _FEATURE_PATTERN.search(filename)
+            if match:
+                manifest.setdefault(match.group(1) + match.group(2), os.path.join(directory, filename))
+    return manifest
+
+
+def get_image_manifest(groups_dir=GROUPS_DIR, fragments_dir=FRAGMENTS_DIR):
+    """
+    Cached build_image_manifest.
+
+    The cache key includes the directory mtimes, which change when files are
+    added, removed or renamed. Renders only stat the directories; they do not list them.
+    """
+    directories = tuple(d for d in (groups_dir, fragments_dir) if os.path.isdir(d))
+    return get_data_cache().get_or_build(
+        'image_manifest', directories, (groups_dir, fragments_dir),
+        lambda: build_image_manifest(groups_dir, fragments_dir)
+    )
+
+
+def _thumbnail_path(image_path, width, fmt):
+    """Disk location of a thumbnail, unique per source path, width and format."""
+    stem = os.path.splitext(os.path.normpath(image_path))[0].replace(os.sep, "__")
+    return os.path.join(THUMBNAIL_DIR, f"{stem}_w{width}.{fmt}")
+
+
+def _static_url(cache_path, image_path):
+    """
+    URL of a thumbnail under Streamlit's static file serving.
+
+    The source mtime is added as a query string. A changed image gets a new URL,
+    so browsers never show a stale copy. An unchanged image keeps its URL and
+    can be reused from the browser cache (responses carry ETag/Last-Modified).
+    """
+    if cache_path is None:
+        return None
+    relative = os.path.relpath(cache_path, STATIC_DIR).replace(os.sep, "/")
+    if relative.startswith(".."):
+        return None
+    return f"app/static/{relative}?v={os.stat(image_path).st_mtime_ns}"
+
+
+@timed
+def _encode_thumbnail(image_path, width, fmt):
+    """Resize an image to at most `width` pixels wide and encode it as PNG or WebP bytes."""
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            image.save(buffer, format="WEBP", quality=90, method=4)
+        else:
+            image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _load_or_create_thumbnail(image_path, width, fmt):
+    """
+    Read a thumbnail from the disk cache, or create it when missing or older than the source.
+
+    Returns the encoded bytes and the disk path (None if it could not be written).
+    """
+    cache_path = _thumbnail_path(image_path, width, fmt)
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(image_path):
+            with open(cache_path, "rb") as f:
+                return f.read(), cache_path
+    except OSError:
+        pass
+
+    data = _encode_thumbnail(image_path, width, fmt)
+    try:
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return data, None  # Read-only static directory: keep the thumbnail in memory only
+    return data, cache_path
+
+
+@timed
+def get_thumbnail(image_path, width, fmt="png"):
+    """
+    Get a resized, pre-encoded thumbnail of an image.
+
+    Thumbnails are kept in memory (shared across sessions) and on disk
+    (shared across processes and restarts). Both are invalidated when the
+    source image's mtime changes.
+
+    Parameters:
+    -----------
+    image_path : str
+        Source image
+    width : int
+        Maximum width in pixels (images are never upscaled)
+    fmt : str
+        'png' or 'webp'
+
+    Returns:
+    --------
+    dict
+        'bytes': encoded image, 'base64': base64 string, 'mime': MIME type,
+        'url': static-serving URL (None if the thumbnail is only in memory)
+    """
+    if fmt not in ("png", "webp"):
+        raise ValueError(f"Unsupported thumbnail format '{fmt}'")
+
+    def build():
+        data, cache_path = _load_or_create_thumbnail(image_path, width, fmt)
+        return {
+            'bytes': data,
+            'base64': base64.b64encode(data).decode(),
+            'mime': f"image/{fmt}",
+            'url': _static_url(cache_path, image_path)
+        }
+
+    return get_data_cache().get_or_build('thumbnail', (image_path,), (width, fmt), build)
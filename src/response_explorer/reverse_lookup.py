@@ -0,0 +1,282 @@
+"""
+Reverse lookup: which receptors are predicted to respond to a given chemical.
+
+A top-k receptor list is precomputed for every chemical with the same cosine
+scoring as compare_receptor_to_chemicals. It is persisted next to the data
+files. When an input file changes, the index is brought up to date
+incrementally: chemicals whose features are unchanged keep their rows, and
+newly added receptors are merged into them. Queries are a dictionary lookup
+plus an array slice.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.response_explorer.analysis import find_common_columns, prepare_chemical_library
+from src.response_explorer.batch_scoring import (
+    chunked_top_k, normalize_rows, receptor_unit_vectors, select_top_k
+)
+from src.perf import timed
+
+INDEX_FILENAME = "reverse_index.npz"
+PREDICTED_FILENAME = "propagated_labels_complete.csv"
+CAS_FILENAME = "cas_features_filtered.csv"
+
+
+def _row_hashes(values):
+    """Short content hash of every row, used to detect changed receptors and chemicals."""
+    values = np.ascontiguousarray(values, dtype=float)
+    return np.array([hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in values])
+
+
+def _source_stamps(data_dir):
+    """(mtime_ns, size) of both input files, flattened into one int64 array."""
+    stamps = []
+    for filename in (PREDICTED_FILENAME, CAS_FILENAME):
+        stat = os.stat(os.path.join(data_dir, filename))
+        stamps += [stat.st_mtime_ns, stat.st_size]
+    return np.array(stamps, dtype=np.int64)
+
+
+def _reusable_receptors(previous, receptor_ids, receptor_hashes):
+    """
+    Map the receptors of a previous index onto the current receptor order.
+
+    Returns the current position of every previous receptor, or None if any
+    previous receptor was removed or changed (which requires a full rebuild).
+    """
+    position = {rid: i for i, rid in enumerate(receptor_ids)}
+    mapping = np.empty(len(previous['receptor_ids']), dtype=int)
+    for i, (rid, row_hash) in enumerate(zip(previous['receptor_ids'], previous['receptor_hashes'])):
+        j = position.get(rid)
+        if j is None or receptor_hashes[j] != row_hash:
+            return None
+        mapping[i] = j
+    return mapping
+
+
+@timed
+def build_reverse_index(predicted_df, cas_df, top_k=50, previous=None,
+                        chunk_size=4096, workers=1):
+    """
+    Build the chemical -> top receptors index.
+
+    Parameters:
+    -----------
+    predicted_df : pandas.DataFrame
+        DataFrame containing the complete propagated predictions
+    cas_df : pandas.DataFrame
+        DataFrame containing chemical features
+    top_k : int, default=50
+        Number of receptors stored per chemical
+    previous : dict, optional
+        An earlier index to update incrementally
+    chunk_size : int, default=4096
+        Number of receptors per matrix product
+    workers : int, default=1
+        Number of threads used for the matrix products
+
+    Returns:
+    --------
+    dict
+        The reverse index (see load_reverse_index)
+    """
+    common_cols = find_common_columns(predicted_df, cas_df)
+    if not common_cols:
+        raise ValueError("No matching columns found between receptor and chemical data.")
+
+    library = prepare_chemical_library(cas_df, common_cols)
+    chemical_unit = normalize_rows(library['values'])
+    receptor_unit = receptor_unit_vectors(predicted_df, common_cols)
+
+    receptor_ids = np.asarray(predicted_df.index.astype(str), dtype=str)
+    receptor_hashes = _row_hashes(receptor_unit)
+    chemical_names = library['names'].astype(str)
+    chemical_hashes = _row_hashes(library['values'])
+    k = max(0, min(top_k, len(receptor_ids)))
+
+    top_scores = np.zeros((len(chemical_names), k))
+    top_indices = np.zeros((len(chemical_names), k), dtype=int)
+    todo = np.arange(len(chemical_names))
+
+    # Reuse rows of unchanged chemicals when only receptors were added
+    mapping = None
+    if (previous is not None and int(previous['top_k']) == top_k
+            and list(previous['common_cols']) == common_cols):
+        mapping = _reusable_receptors(previous, receptor_ids, receptor_hashes)
+    if mapping is not None:
+        previous_rows = {
+            (name, row_hash): i
+            for i, (name, row_hash) in enumerate(zip(previous['chemical_names'],
+                                                     previous['chemical_hashes']))
+        }
+        reuse = np.array([previous_rows.get(key, -1)
+                          for key in zip(chemical_names, chemical_hashes)], dtype=int)
+        kept = np.flatnonzero(reuse >= 0)
+        todo = np.flatnonzero(reuse < 0)
+
+        kept_scores = previous['top_scores'][reuse[kept]]
+        kept_indices = mapping[previous['top_indices'][reuse[kept]]]
+
+        # Score kept chemicals against the newly added receptors only
+        added = np.setdiff1d(np.arange(len(receptor_ids)), mapping)
+        if len(added) and len(kept):
+            new_scores, new_indices = chunked_top_k(
+                chemical_unit[kept], receptor_unit[added], k,
+                chunk_size=chunk_size, workers=workers
+            )
+            kept_scores, kept_indices = select_top_k(
+                np.hstack([kept_scores, new_scores]),
+                np.hstack([kept_indices, added[new_indices]]),
+                k
+            )
+        top_scores[kept] = kept_scores
+        top_indices[kept] = kept_indices
+
+    # Full scoring for new or changed chemicals
+    if len(todo):
+        top_scores[todo], top_indices[todo] = chunked_top_k(
+            chemical_unit[todo], receptor_unit, k, chunk_size=chunk_size, workers=workers
+        )
+
+    return {
+        'top_k': top_k,
+        'common_cols': np.array(common_cols),
+        'receptor_ids': receptor_ids,
+        'receptor_hashes': receptor_hashes,
+        'chemical_names': chemical_names,
+        'cas_numbers': np.array(['' if cas is None else str(cas) for cas in library['cas_numbers']]),
+        'chemical_hashes': chemical_hashes,
+        'top_scores': top_scores,
+        'top_indices': top_indices
+    }
+
+
+def save_reverse_index(index, index_path):
+    """
+    Write a reverse index to an .npz file, replacing any existing file atomically.
+
+    Parameters:
+    -----------
+    index : dict
+        Output of build_reverse_index
+    index_path : str
+        Destination .npz file
+    """
+    arrays = {key: value for key, value in index.items() if key != 'lookup'}
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, index_path)
+
+
+def _read_index(index_path):
+    """Load a persisted index, or return None if it is missing or unreadable."""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with np.load(index_path, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+
+
+def _attach_lookup(index):
+    """Add an O(1) CAS number / chemical name -> row mapping to the index."""
+    lookup = {}
+    for i, (name, cas) in enumerate(zip(index['chemical_names'], index['cas_numbers'])):
+        lookup.setdefault(name, i)
+        if cas:
+            lookup.setdefault(cas, i)
+    index['lookup'] = lookup
+    return index
+
+
+@timed
+def load_reverse_index(data_dir="data", top_k=50, index_path=None, workers=1):
+    """
+    Load the reverse index, rebuilding it if either input file has changed.
+
+    Parameters:
+    -----------
+    data_dir : str
+        Path to the directory containing the data files
+    top_k : int, default=50
+        Number of receptors stored per chemical
+    index_path : str, optional
+        Where the index is persisted (defaults to data_dir/reverse_index.npz)
+    workers : int, default=1
+        Number of threads used when the index has to be rebuilt
+
+    Returns:
+    --------
+    dict
+        Dictionary containing:
+        - 'receptor_ids', 'chemical_names', 'cas_numbers': label arrays
+        - 'top_indices', 'top_scores': receptor positions and similarities per chemical
+        - 'lookup': CAS number or chemical name -> row
+        - hashes and source stamps used for incremental rebuilds
+    """
+    if index_path is None:
+        index_path = os.path.join(data_dir, INDEX_FILENAME)
+
+    for filename in (PREDICTED_FILENAME, CAS_FILENAME):
+        filepath = os.path.join(data_dir, filename)
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Required file not found: {filepath}")
+    stamps = _source_stamps(data_dir)
+
+    previous = _read_index(index_path)
+    if (previous is not None and int(previous['top_k']) == top_k
+            and np.array_equal(previous.get('source_stamps'), stamps)):
+        return _attach_lookup(previous)
+
+    predicted_df = pd.read_csv(os.path.join(data_dir, PREDICTED_FILENAME), index_col=0)
+    cas_df = pd.read_csv(os.path.join(data_dir, CAS_FILENAME))
+    index = build_reverse_index(predicted_df, cas_df, top_k=top_k,
+                                previous=previous, workers=workers)
+    index['source_stamps'] = stamps
+
+    try:
+        save_reverse_index(index, index_path)
+    except OSError:
+        pass  # Read-only data directory: keep the index in memory only
+
+    return _attach_lookup(index)
+
+
+@timed
+def query_receptors_for_chemical(index, chemical, top_n=10):
+    """
+    Get the receptors predicted to respond most strongly to a chemical.
+
+    Parameters:
+    -----------
+    index : dict
+        Output of load_reverse_index
+    chemical : str
+        CAS number or chemical name
+    top_n : int, default=10
+        Number of receptors to return (at most the indexed top_k)
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Receptors sorted by similarity with columns Receptor and Similarity
+
+    Raises:
+    -------
+    ValueError
+        If the chemical is not in the index
+    """
+    row = index['lookup'].get(chemical)
+    if row is None:
+        raise ValueError(f"Chemical '{chemical}' not found in the chemical library")
+
+    top_n = max(0, top_n)
+    return pd.DataFrame({
+        'Receptor': index['receptor_ids'][index['top_indices'][row, :top_n]],
+        'Similarity': index['top_scores'][row, :top_n]
+    })
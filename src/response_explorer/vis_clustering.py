@@ -1,14 +1,14 @@
 import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-import numpy as np
 import scipy.cluster.hierarchy as sch
 from scipy.spatial.distance import pdist
-import streamlit as st
 
+from src.response_explorer.chemical_tree import induced_linkage
+from src.perf import timed
 
 
-def create_clustering_visualization(results_data):
+
+@timed
+def create_clustering_visualization(results_data, tree=None):
     """
     Create a hierarchical clustering visualization of the top chemical matches.
     
@@ -16,13 +16,18 @@ def create_clustering_visualization(results_data):
     -----------
     results_data : dict
         Dictionary containing analysis results
+    tree : dict, optional
+        Global chemical tree (see chemical_tree.load_chemical_tree). The
+        dendrogram is then the subtree of the whole library induced by the
+        top chemicals, and a strip shows where they sit in the library.
+        Without it the top chemicals are clustered on their own.
         
     Returns:
     --------
     matplotlib.figure.Figure
         The clustering figure
     """
-    if not results_data or results_data.get('actual_top_n', 0) <= 0:
+    if not results_data or results_data.get('actual_top_n', 0) < 2:
         return None
     
     receptor_name = results_data['receptor_name']
@@ -31,31 +36,30 @@ def create_clustering_visualization(results_data):
     top_chems = results_data['top_chems']
     actual_top_n = results_data['actual_top_n']
     
-    # Extract feature values for top chemicals
-    top_chem_matrix = pd.DataFrame(
-        [chemical_matrix.loc[name].values for name in top_chems],
-        index=top_chems,
-        columns=common_cols
-    )
-    
     # Create figure with appropriate size for just the dendrogram
     # Adjust width based on number of chemicals
     fig_width = max(12, actual_top_n * 0.5)
     fig_height = 8
-    fig = plt.figure(figsize=(fig_width, fig_height))
     
-    # Get current axes
-    ax = plt.gca()
-    
-    # Compute distance matrix and linkage for hierarchical clustering
-    distances = pdist(top_chem_matrix, metric='cosine')
-    linkage_matrix = sch.linkage(distances, method='ward')
+    if tree is not None and all(name in tree['positions'] for name in top_chems):
+        # Subtree of the precomputed library dendrogram, no per-receptor clustering
+        linkage_matrix = induced_linkage(tree, top_chems)
+        fig, (ax, strip_ax) = plt.subplots(
+            2, 1, figsize=(fig_width, fig_height), gridspec_kw={'height_ratios': [12, 1]}
+        )
+    else:
+        # Compute distance matrix and linkage for the top chemicals only
+        top_chem_matrix = chemical_matrix.loc[top_chems, common_cols]
+        distances = pdist(top_chem_matrix, metric='cosine')
+        linkage_matrix = sch.linkage(distances, method='ward')
+        fig, ax = plt.subplots(figsize=(fig_width, fig_height))
+        strip_ax = None
     
     # Plot vertical dendrogram WITH labels at the top
     dendrogram = sch.dendrogram(
         linkage_matrix,
         orientation='top',
-        labels=top_chem_matrix.index,
+        labels=top_chems,
         leaf_font_size=10,
         ax=ax
     )
@@ -68,14 +72,28 @@ def create_clustering_visualization(results_data):
     ax.tick_params(axis='both', which='both', length=0)
     
     # Set labels and title
-    plt.title(f'Chemical Clustering for {receptor_name}')
-    plt.xlabel('')  # Remove x-label as it's now redundant
-    plt.ylabel('')  # Remove y-label for cleaner look
+    ax.set_title(f'Chemical Clustering for {receptor_name}')
+    ax.set_xlabel('')  # Remove x-label as it's now redundant
+    ax.set_ylabel('')  # Remove y-label for cleaner look
     
     # Make labels diagonal for better readability
-    plt.xticks(rotation=45, ha='right')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    
+    if strip_ax is not None:
+        # Positions of the matches along the leaf order of the whole library
+        ranks = tree['leaf_rank'][[tree['positions'][name] for name in top_chems]]
+        n_chemicals = len(tree['names'])
+        strip_ax.axhspan(0, 1, color='#e1e4e8')
+        strip_ax.vlines(ranks, 0, 1, color='tab:red', linewidth=2)
+        strip_ax.set_xlim(-0.5, n_chemicals - 0.5)
+        strip_ax.set_ylim(0, 1)
+        strip_ax.set_yticks([])
+        strip_ax.set_xticks([])
+        for spine in strip_ax.spines.values():
+            spine.set_visible(False)
+        strip_ax.set_xlabel(f'Matches in the library dendrogram ({n_chemicals} chemicals)')
     
     # Adjust the position of the dendrogram to connect with labels
-    plt.subplots_adjust(bottom=0.2)
+    fig.tight_layout()
     
     return fig
\ No newline at end of file
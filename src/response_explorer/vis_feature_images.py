@@ -1,9 +1,74 @@
 import os
-import streamlit as st
-import pandas as pd
-from PIL import Image
-import base64
 
+from src.response_explorer.image_cache import get_image_manifest, get_thumbnail
+from src.perf import timed
+
+# Tiles are shown 200px wide; thumbnails are encoded at 2x for high-DPI screens
+TILE_WIDTH = 200
+
+IMAGE_DELIVERY_MODES = ("static", "media", "inline")
+
+
+def get_image_delivery():
+    """
+    How images are sent to the browser.
+
+    - 'static': <img> pointing at Streamlit's static file serving (browser-cacheable,
+      needs server.enableStaticServing)
+    - 'media': st.image with the cached thumbnail bytes (served from /media)
+    - 'inline': base64 data URI inside the HTML delta (re-sent on every rerun)
+
+    Set AROMA_IMAGE_DELIVERY to force a mode. By default 'static' is used when
+    static serving is enabled, and 'media' otherwise.
+    """
+    mode = os.environ.get("AROMA_IMAGE_DELIVERY")
+    if mode:
+        if mode not in IMAGE_DELIVERY_MODES:
+            raise ValueError(f"AROMA_IMAGE_DELIVERY must be one of {IMAGE_DELIVERY_MODES}")
+        return mode
+    import streamlit as st
+
+    return "static" if st.get_option("server.enableStaticServing") else "media"
+
+
+def image_html(src, width, style="image-rendering: high-quality;"):
+    """Centered <img> markup used by the 'static' and 'inline' delivery modes."""
+    return f"""
+    <div style="text-align: center;">
+        <img src="{src}" width="{width}" style="{style}">
+    </div>
+    """
+
+
+@timed
+def display_image(image_path, width, style="image-rendering: high-quality;"):
+    """
+    Display an image at the given width using the configured delivery mode.
+
+    Parameters:
+    -----------
+    image_path : str
+        Source image (a 2x-width thumbnail of it is sent)
+    width : int
+        Display width in pixels
+    style : str
+        Inline CSS for the <img> tag in 'static' and 'inline' modes
+    """
+    import streamlit as st
+
+    thumbnail = get_thumbnail(image_path, 2 * width)
+    mode = get_image_delivery()
+    if mode == "static" and thumbnail['url'] is None:
+        mode = "media"  # Thumbnail could not be written to the static folder
+
+    if mode == "media":
+        st.image(thumbnail['bytes'], width=width)
+        return
+
+    src = thumbnail['url'] if mode == "static" else f"data:{thumbnail['mime']};base64,{thumbnail['base64']}"
+    st.markdown(image_html(src, width, style), unsafe_allow_html=True)
+
+@timed
 def display_top_features_images(receptor_name, predicted_df, n_features=10):
     """
     Display the top n feature images for a selected receptor.
@@ -17,6 +82,8 @@ def display_top_features_images(receptor_name, predicted_df, n_features=10):
     n_features : int
         Number of top features to display
     """
+    import streamlit as st
+
     # Check if receptor exists in the dataframe
     if receptor_name not in predicted_df.index:
         st.error(f"Receptor {receptor_name} not found in dataset")
@@ -31,9 +98,8 @@ def display_top_features_images(receptor_name, predicted_df, n_features=10):
     # Get the top n features
     top_features = sorted_features.head(n_features)
     
-    # Paths to image directories
-    fragments_dir = "images/fragments_highdef"
-    groups_dir = "images/groups_highdef"
+    # Feature name -> image file, built once and cached across sessions
+    manifest = get_image_manifest()
     
     # Title for the section
     st.subheader(f"Top {n_features} Chemical Features for {receptor_name}")
@@ -45,11 +111,6 @@ def display_top_features_images(receptor_name, predicted_df, n_features=10):
     # Create tabs for Groups and Fragments
     group_tab, fragment_tab = st.tabs(["Functional Groups", "MCS Fragments"])
     
-    # Helper function to get image as base64
-    def get_image_as_base64(image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode()
-    
     # Process groups first
     with group_tab:
         group_features = [f for f in top_features.index if f.startswith("Group")]
@@ -64,26 +125,13 @@ def display_top_features_images(receptor_name, predicted_df, n_features=10):
                     if i+j < len(group_features):
                         feature = group_features[i+j]
                         value = top_features[feature]
-                        group_num = feature.replace("Group", "")
-                        
-                        # Look for image file containing the group name, not just starting with it
-                        img_path = None
-                        for img_file in os.listdir(groups_dir):
-                            if f"Group{group_num}_" in img_file or f"Group{group_num}." in img_file:
-                                img_path = os.path.join(groups_dir, img_file)
-                                break
+                        img_path = manifest.get(feature)
                         
-                        if img_path and os.path.exists(img_path):
+                        if img_path is not None:
                             with cols[j]:
-                                # Use HTML for better image quality
                                 st.markdown(f"**{feature}**")
                                 st.markdown(f"Value: **{value:.5f}**")
-                                st.markdown(f"""
-                                <div style="text-align: center;">
-                                    <img src="data:image/png;base64,{get_image_as_base64(img_path)}" 
-                                         width="200" style="image-rendering: high-quality;">
-                                </div>
-                                """, unsafe_allow_html=True)
+                                display_image(img_path, TILE_WIDTH)
                         else:
                             with cols[j]:
                                 st.markdown(f"**{feature}**")
@@ -104,26 +152,13 @@ def display_top_features_images(receptor_name, predicted_df, n_features=10):
                     if i+j < len(fragment_features):
                         feature = fragment_features[i+j]
                         value = top_features[feature]
-                        frag_num = feature.replace("Fragment", "")
-                        
-                        # Look for image file containing the fragment name, not just starting with it
-                        img_path = None
-                        for img_file in os.listdir(fragments_dir):
-                            if f"Fragment{frag_num}" in img_file:
-                                img_path = os.path.join(fragments_dir, img_file)
-                                break
+                        img_path = manifest.get(feature)
                         
-                        if img_path and os.path.exists(img_path):
+                        if img_path is not None:
                             with cols[j]:
-                                # Use HTML for better image quality
                                 st.markdown(f"**{feature}**")
                                 st.markdown(f"Value: **{value:.5f}**")
-                                st.markdown(f"""
-                                <div style="text-align: center;">
-                                    <img src="data:image/png;base64,{get_image_as_base64(img_path)}" 
-                                         width="200" style="image-rendering: high-quality;">
-                                </div>
-                                """, unsafe_allow_html=True)
+                                display_image(img_path, TILE_WIDTH)
                         else:
                             with cols[j]:
                                 st.markdown(f"**{feature}**")
@@ -1,8 +1,10 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-import streamlit as st
 
+from src.perf import timed
+
+@timed
 def create_line_chart_visualization(results_data, raw_data=None):
     """
     Create a line chart showing the receptor's feature profile with both raw and normalized values.
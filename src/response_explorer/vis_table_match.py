@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
-import streamlit as st
 
+from src.perf import timed
+
+@timed
 def format_results_table(results_data):
     """
     Format the results dataframe for display as a table.
@@ -47,6 +49,7 @@ def format_results_table(results_data):
     
     return results_df, table_info
 
+@timed
 def display_results_table(results_df, table_info):
     """
     Display the results table in Streamlit.
@@ -62,6 +65,8 @@ def display_results_table(results_df, table_info):
     --------
     None
     """
+    import streamlit as st
+
     # Display warnings if present
     if table_info.get('warning'):
         st.warning(table_info['warning'])